@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import struct
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from typing import Callable, Optional
+
+from copy_engine import CopyEngine, get_device_size
+from verify_engine import drop_page_cache, parallel_verify, verify_digests
+from filesystems import get_used_ranges
+from inventory import DiskInventory
+from hashing import HASH_METHODS
+from progress import format_bytes
+from log_handler import log_info, log_warning
+
+RESULTS_VERSION = 1
+PATTERNS = ("zeros", "random", "mixed", "filesystem")
+DEFAULT_SIZE = "256M"
+DEFAULT_BLOCK_SIZES = "1M,4M,8M"
+DEFAULT_DEPTHS = "2,4"
+DEFAULT_WORKER_COUNTS = "1,4"
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 10.0
+FILL_BLOCK = 1024 * 1024
+PARTITION_START = 1024 * 1024
+
+def parse_size(text: str) -> int:
+    """« 512K », « 4M », « 1G » ou un nombre d'octets."""
+    text = text.strip().upper().rstrip("IB")
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def _random_block(rng: random.Random) -> bytes:
+    return rng.randbytes(FILL_BLOCK)
+
+def fill_fixture(path: str, size: int, pattern: str, seed: int) -> bool:
+    """Crée une source de test reproductible. Renvoie False si le motif ne peut pas être produit sur cette machine."""
+    rng = random.Random(seed)
+    if pattern == "filesystem":
+        return _filesystem_fixture(path, size, rng)
+    with open(path, "wb") as f:
+        f.truncate(size)
+        if pattern == "zeros":
+            return True
+        text = b"".join(f"ligne {i} du fichier de test\n".encode() for i in range(40000))[:FILL_BLOCK]
+        for offset in range(0, size, FILL_BLOCK):
+            if pattern == "random":
+                block = _random_block(rng)
+            else:
+                # Mélange déterministe : un tiers de zéros, un tiers de texte compressible, un tiers d'aléatoire.
+                kind = rng.randrange(3)
+                if kind == 0:
+                    continue
+                block = text if kind == 1 else _random_block(rng)
+            f.seek(offset)
+            f.write(block[:size - offset])
+    return True
+
+def _filesystem_fixture(path: str, size: int, rng: random.Random) -> bool:
+    """Disque MBR à une partition ext4 remplie au tiers par mkfs.ext4 -d, sans montage ni droits root."""
+    if shutil.which("mkfs.ext4") is None:
+        log_warning("mkfs.ext4 introuvable : motif « filesystem » ignoré")
+        return False
+    content = tempfile.mkdtemp(prefix="cloneur_bench_fs_")
+    try:
+        for i in range(max(1, size // 3 // (4 * FILL_BLOCK))):
+            with open(os.path.join(content, f"fichier_{i:04d}.bin"), "wb") as f:
+                for _ in range(4):
+                    f.write(_random_block(rng))
+        with open(path, "wb") as f:
+            f.truncate(size)
+            sectors = (size - PARTITION_START) // 512
+            entry = struct.pack("<B3sB3sII", 0, b"\0\0\0", 0x83, b"\0\0\0", PARTITION_START // 512, sectors)
+            f.seek(446)
+            f.write(entry + bytes(48) + b"\x55\xaa")
+        subprocess.run(["mkfs.ext4", "-q", "-F", "-d", content, "-E", f"offset={PARTITION_START}",
+                        path, f"{(size - PARTITION_START) // 1024}k"],
+                       check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return True
+    except subprocess.CalledProcessError as e:
+        log_warning(f"mkfs.ext4 a échoué, motif « filesystem » ignoré : {e.stderr.decode(errors='replace').strip()}")
+        return False
+    finally:
+        shutil.rmtree(content, ignore_errors=True)
+
+def attach_loop(path: str) -> str:
+    output = subprocess.run(["losetup", "--find", "--show", "--direct-io=on", path], check=True,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True).stdout
+    return output.strip()
+
+def detach_loop(device: str) -> None:
+    subprocess.run(["losetup", "--detach", device], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+def drop_caches(*paths: str) -> None:
+    """Écrit puis évince du cache les fichiers de test, pour que chaque mesure atteigne le support."""
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            drop_page_cache(fd)
+        finally:
+            os.close(fd)
+
+def measure(fn: Callable[[], int], repeat: int, paths: list[str]) -> tuple[int, list[float]]:
+    timings = []
+    processed = 0
+    for _ in range(repeat):
+        drop_caches(*paths)
+        start = time.perf_counter()
+        processed = fn()
+        timings.append(time.perf_counter() - start)
+    return processed, timings
+
+def _result(name: str, scenario: str, pattern: Optional[str], params: dict, processed: int,
+            timings: list[float], unit: str = "o/s") -> dict:
+    median = statistics.median(timings)
+    rate = processed / median if median > 0 else 0.0
+    return {"name": name, "scenario": scenario, "pattern": pattern, "params": params, "processed": processed,
+            "timings": timings, "median": median, "rate": rate, "unit": unit}
+
+def _describe(result: dict) -> str:
+    if result['unit'] == "o/s":
+        return f"{format_bytes(result['rate'])}/s"
+    return f"{result['rate']:.2f} {result['unit']}"
+
+def run_pattern(pattern: str, source: str, dest: str, args) -> list[dict]:
+    results = []
+    block_sizes = [parse_size(value) for value in args.block_sizes.split(",")]
+    depths = [int(value) for value in args.depths.split(",")]
+    worker_counts = [int(value) for value in args.workers.split(",")]
+    queue_depths = [int(value) for value in args.queue_depths.split(",") if value]
+    ranges = get_used_ranges(source) if pattern == "filesystem" else None
+    for block_size in block_sizes:
+        for depth in depths:
+            def copy() -> int:
+                return CopyEngine(source, dest, block_size=block_size, buffer_count=depth,
+                                  direct=args.direct).run()['bytes_copied']
+            processed, timings = measure(copy, args.repeat, [source, dest])
+            results.append(_result(f"copy/{pattern}/bs={block_size}/depth={depth}", "copy", pattern,
+                                   {"block_size": block_size, "depth": depth, "direct": args.direct},
+                                   processed, timings))
+    for block_size in block_sizes:
+        for queue_depth in queue_depths:
+            def copy_deep() -> int:
+                return CopyEngine(source, dest, block_size=block_size, direct=args.direct, io_backend="deep",
+                                  queue_depth=queue_depth).run()['bytes_copied']
+            processed, timings = measure(copy_deep, args.repeat, [source, dest])
+            results.append(_result(f"copy_deep/{pattern}/bs={block_size}/qd={queue_depth}", "copy_deep", pattern,
+                                   {"block_size": block_size, "queue_depth": queue_depth, "direct": args.direct},
+                                   processed, timings))
+    block_size = block_sizes[-1]
+    digests: list[tuple[int, int, bytes]] = []
+    def copy_hashed() -> int:
+        stats = CopyEngine(source, dest, block_size=block_size, hash_chunks=True, direct=args.direct).run()
+        digests[:] = stats['digests']
+        return stats['bytes_copied']
+    processed, timings = measure(copy_hashed, args.repeat, [source, dest])
+    results.append(_result(f"copy_hash/{pattern}/bs={block_size}", "copy_hash", pattern,
+                           {"block_size": block_size}, processed, timings))
+    if ranges is not None:
+        def smart_copy() -> int:
+            return CopyEngine(source, dest, block_size=block_size, ranges=ranges).run()['bytes_copied']
+        processed, timings = measure(smart_copy, args.repeat, [source, dest])
+        used = sum(length for _, length in ranges)
+        results.append(_result(f"smart/{pattern}/bs={block_size}", "smart", pattern,
+                               {"block_size": block_size, "used_bytes": used}, get_device_size(source),
+                               timings))
+    for workers in worker_counts:
+        for method in ("compare",) + HASH_METHODS:
+            def verify() -> int:
+                return parallel_verify(source, dest, workers=workers, method=method)['checked']
+            processed, timings = measure(verify, args.repeat, [source, dest])
+            results.append(_result(f"verify/{pattern}/{method}/workers={workers}", "verify", pattern,
+                                   {"method": method, "workers": workers}, processed, timings))
+        def verify_inline() -> int:
+            verify_digests(dest, digests, workers=workers)
+            return sum(length for _, length, _ in digests)
+        processed, timings = measure(verify_inline, args.repeat, [dest])
+        results.append(_result(f"verify_inline/{pattern}/workers={workers}", "verify_inline", pattern,
+                               {"workers": workers}, processed, timings))
+    return results
+
+def run_inventory(repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        DiskInventory().refresh()
+        timings.append(time.perf_counter() - start)
+    return _result("inventory/refresh", "inventory", None, {}, 1, timings, unit="inventaires/s")
+
+def run_benchmarks(args) -> dict:
+    size = parse_size(args.size)
+    patterns = args.patterns.split(",")
+    unknown = set(patterns) - set(PATTERNS)
+    if unknown:
+        raise ValueError(f"Motif(s) inconnu(s) : {', '.join(sorted(unknown))} (choix : {', '.join(PATTERNS)})")
+    workdir = tempfile.mkdtemp(prefix="cloneur_bench_", dir=args.dir)
+    loops: list[str] = []
+    results = []
+    try:
+        for pattern in patterns:
+            source = os.path.join(workdir, f"source_{pattern}.img")
+            dest = os.path.join(workdir, f"dest_{pattern}.img")
+            if not fill_fixture(source, size, pattern, args.seed):
+                continue
+            with open(dest, "wb") as f:
+                f.truncate(size)
+            if args.loop:
+                source, dest = attach_loop(source), attach_loop(dest)
+                loops.extend([source, dest])
+            log_info(f"Banc d’essai « {pattern} » : {format_bytes(size)} sur {source}")
+            for result in run_pattern(pattern, source, dest, args):
+                print(f"{result['name']:<48} {_describe(result):>14}  (médiane {result['median']:.3f} s)")
+                results.append(result)
+            for loop in loops:
+                detach_loop(loop)
+            loops.clear()
+            os.remove(os.path.join(workdir, f"source_{pattern}.img"))
+            os.remove(os.path.join(workdir, f"dest_{pattern}.img"))
+        if not args.no_inventory:
+            result = run_inventory(args.repeat)
+            print(f"{result['name']:<48} {_describe(result):>14}")
+            results.append(result)
+    finally:
+        for loop in loops:
+            detach_loop(loop)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {"version": RESULTS_VERSION, "created": time.time(), "size": size, "seed": args.seed,
+            "repeat": args.repeat, "loop": args.loop, "dir": args.dir or tempfile.gettempdir(),
+            "host": {"kernel": platform.release(), "machine": platform.machine(), "cpus": os.cpu_count(),
+                     "python": platform.python_version()},
+            "results": results}
+
+def compare_results(base: dict, new: dict, tolerance: float) -> tuple[list[dict], list[dict]]:
+    """Compare deux séries de mesures par nom. Une mesure régresse si son débit baisse de plus de `tolerance` %."""
+    base_by_name = {result['name']: result for result in base['results']}
+    rows, regressions = [], []
+    for result in new['results']:
+        previous = base_by_name.get(result['name'])
+        if previous is None or not previous['rate']:
+            continue
+        change = (result['rate'] - previous['rate']) * 100 / previous['rate']
+        row = {"name": result['name'], "base": previous, "new": result, "change": change}
+        rows.append(row)
+        if change < -tolerance:
+            regressions.append(row)
+    return rows, regressions
+
+def load_results(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        results = json.load(f)
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError(f"{path} : version de résultats non prise en charge")
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Banc d’essai des moteurs de copie, de vérification et d’inventaire")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="mesure les débits sur des périphériques de test locaux")
+    run_parser.add_argument("--output", "-o", help="fichier JSON de résultats")
+    run_parser.add_argument("--size", default=DEFAULT_SIZE, help="taille de chaque périphérique de test")
+    run_parser.add_argument("--patterns", default=",".join(PATTERNS), help=f"motifs de remplissage ({', '.join(PATTERNS)})")
+    run_parser.add_argument("--block-sizes", default=DEFAULT_BLOCK_SIZES, help="tailles de bloc de copie")
+    run_parser.add_argument("--depths", default=DEFAULT_DEPTHS, help="nombres de tampons en vol pour la copie")
+    run_parser.add_argument("--queue-depths", default="",
+                            help="profondeurs de file pour la copie en file profonde (aucune par défaut)")
+    run_parser.add_argument("--workers", default=DEFAULT_WORKER_COUNTS, help="nombres de threads de vérification")
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="mesures par cas (médiane retenue)")
+    run_parser.add_argument("--seed", type=int, default=0, help="graine des données aléatoires")
+    run_parser.add_argument("--dir", help="dossier des fichiers de test (ex. /dev/shm pour tmpfs)")
+    run_parser.add_argument("--loop", action="store_true", help="attache les fichiers à des périphériques loop (root)")
+    run_parser.add_argument("--direct", action="store_true", help="copie en O_DIRECT")
+    run_parser.add_argument("--no-inventory", action="store_true", help="ne mesure pas l’inventaire des disques")
+    compare_parser = commands.add_parser("compare", help="compare deux fichiers de résultats")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                                help="baisse de débit tolérée en pourcentage")
+    args = parser.parse_args()
+    if args.command == "run":
+        report = run_benchmarks(args)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=1)
+            print(f"Résultats enregistrés dans {args.output}")
+        sys.exit(0)
+    rows, regressions = compare_results(load_results(args.base), load_results(args.new), args.tolerance)
+    for row in rows:
+        flag = "  RÉGRESSION" if row in regressions else ""
+        print(f"{row['name']:<48} {_describe(row['base']):>14} -> {_describe(row['new']):>14} "
+              f"({row['change']:+.1f} %){flag}")
+    print(f"{len(rows)} mesure(s) comparée(s), {len(regressions)} régression(s) au-delà de {args.tolerance:.0f} %")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
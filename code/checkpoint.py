@@ -0,0 +1,131 @@
+import os
+import re
+import json
+import time
+import threading
+
+from log_handler import log_info, log_warning
+from copy_engine import merge_ranges
+
+JOURNAL_DIR = os.environ.get("CLONEUR_JOURNAL_DIR", "/var/lib/cloneur_leger/journaux")
+JOURNAL_VERSION = 1
+DEFAULT_COMMIT_INTERVAL = 10.0
+
+def subtract_ranges(ranges: list[tuple[int, int]], done: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Retourne les portions de `ranges` qui ne sont pas couvertes par `done` (plages fusionnées et triées)."""
+    done = merge_ranges(done)
+    missing = []
+    for offset, length in merge_ranges(ranges):
+        position = offset
+        end = offset + length
+        for done_offset, done_length in done:
+            done_end = done_offset + done_length
+            if done_end <= position or done_offset >= end:
+                continue
+            if done_offset > position:
+                missing.append((position, done_offset - position))
+            position = max(position, done_end)
+        if position < end:
+            missing.append((position, end - position))
+    return missing
+
+def serial_is_reliable(serial: str) -> bool:
+    return bool(serial) and not serial.startswith("INCONNU_")
+
+def journal_path(source_serial: str, dest_serial: str) -> str:
+    safe = lambda value: re.sub(r"[^A-Za-z0-9._-]", "_", value)
+    return os.path.join(JOURNAL_DIR, f"{safe(source_serial)}__{safe(dest_serial)}.journal")
+
+class CheckpointJournal:
+    """Journal durable des plages déjà copiées pour un couple source/destination identifié par leurs numéros de série.
+    Le fichier contient un en-tête JSON puis une ligne « offset longueur » par plage validée ; une plage n'y est
+    ajoutée qu'après synchronisation de la destination, une ligne tronquée par une coupure est ignorée à la relecture."""
+
+    def __init__(self, source_serial: str, dest_serial: str, source_size: int) -> None:
+        self.source_serial = source_serial
+        self.dest_serial = dest_serial
+        self.source_size = source_size
+        self.path = journal_path(source_serial, dest_serial)
+        self.done: list[tuple[int, int]] = []
+        self._pending: list[tuple[int, int]] = []
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self) -> list[tuple[int, int]]:
+        """Relit les plages validées d'une copie précédente ; un journal d'une autre taille de source est ignoré."""
+        self.done = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                lines = f.read().split("\n")
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            log_warning(f"Journal de reprise illisible {self.path} : {e}")
+            return []
+        if header.get("version") != JOURNAL_VERSION or header.get("source_size") != self.source_size:
+            log_warning(f"Journal de reprise {self.path} ne correspond pas à la source actuelle, ignoré")
+            return []
+        ranges = []
+        # La dernière ligne n'est prise en compte que si elle est complète (terminée par un saut de ligne).
+        for line in lines[:-1]:
+            try:
+                offset, length = (int(value) for value in line.split())
+            except ValueError:
+                continue
+            ranges.append((offset, length))
+        self.done = merge_ranges(ranges)
+        return self.done
+
+    def bytes_done(self) -> int:
+        return sum(length for _, length in self.done)
+
+    def open(self, resume: bool) -> None:
+        """Ouvre le journal en ajout (reprise) ou le recrée avec un nouvel en-tête."""
+        os.makedirs(JOURNAL_DIR, exist_ok=True)
+        if not resume or not os.path.exists(self.path):
+            self.done = []
+            header = {"version": JOURNAL_VERSION, "source_serial": self.source_serial,
+                      "dest_serial": self.dest_serial, "source_size": self.source_size, "created": time.time()}
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json.dumps(header) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        else:
+            # Retire une éventuelle ligne tronquée avant d'ajouter de nouvelles plages.
+            with open(self.path, "rb+") as f:
+                content = f.read()
+                if not content.endswith(b"\n"):
+                    f.truncate(content.rfind(b"\n") + 1)
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def record(self, offset: int, length: int) -> None:
+        """Note une plage écrite ; elle ne sera validée qu'au prochain `commit`, après synchronisation de la destination."""
+        with self._lock:
+            self._pending.append((offset, length))
+
+    def commit(self) -> None:
+        with self._lock:
+            pending, self._pending = merge_ranges(self._pending), []
+        if not pending or self._file is None:
+            return
+        self._file.write("".join(f"{offset} {length}\n" for offset, length in pending))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.done = merge_ranges(self.done + pending)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self) -> None:
+        """Supprime le journal une fois la copie menée à son terme."""
+        self.close()
+        try:
+            os.remove(self.path)
+            log_info(f"Journal de reprise supprimé : {self.path}")
+        except FileNotFoundError:
+            pass
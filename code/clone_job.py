@@ -0,0 +1,840 @@
+import os
+import stat
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from subprocess import CalledProcessError, TimeoutExpired
+from typing import Callable, Optional
+
+from utils import run_command_with_progress, parse_dd_progress
+from inventory import DiskInventory
+from copy_engine import CopyEngine, DEFAULT_QUEUE_DEPTH, IO_BACKENDS, align_ranges, get_device_size, merge_ranges
+from checkpoint import CheckpointJournal, serial_is_reliable, subtract_ranges
+from clone_manifests import save_clone_manifest, load_clone_manifest, remove_clone_manifest, known_digests
+from progress import ProgressTracker, format_bytes
+from verify_engine import CONFIDENCE, DEFAULT_WORKERS, VERIFY_METHODS, describe_sampling, fixed_regions, parallel_verify, sample_digests, sample_verify, sampling_confidence, verify_digests
+from filesystems import get_used_ranges
+from partitions import read_partition_table, select_partitions, required_size, write_partition_table
+from tuning import choose_io_params
+from io_limits import IO_PRIORITIES, RateLimiter, set_cgroup_limit, set_io_priority
+from metrics import JobMetrics, export_metrics, metrics_key, write_textfile
+from history import describe_finding, record_job
+from rescue import RescueEngine, bad_map_path
+from image import IMAGE_EXTENSION, create_image, restore_image, check_image, read_index, image_digests, is_image
+from image_store import capture, restore_manifest, check_manifest, read_manifest, manifest_digests, is_manifest
+from log_handler import log_error
+
+CLONE_METHODS = ("full", "smart", "rescue", "incremental", "partitions")
+COPY_ENGINES = ("native", "dd")
+METRICS_INTERVAL = 10.0
+IO_MODES = ("auto",) + IO_BACKENDS
+
+def is_image_path(path: str) -> bool:
+    """Vrai pour un fichier image (existant ou à créer) plutôt qu'un disque."""
+    if os.path.exists(path) and stat.S_ISBLK(os.stat(path).st_mode):
+        return False
+    return path.endswith(IMAGE_EXTENSION) or is_manifest(path) or is_image(path)
+
+def open_journals(inventory: DiskInventory, source: str, dests: list[str]) -> dict[str, CheckpointJournal]:
+    """Associe à chaque destination identifiable le journal de reprise du couple source/destination."""
+    source_serial = inventory.serial(source)
+    if not serial_is_reliable(source_serial):
+        return {}
+    source_size = get_device_size(source)
+    journals = {}
+    for device in dests:
+        dest_serial = inventory.serial(device)
+        if serial_is_reliable(dest_serial):
+            journals[device] = CheckpointJournal(source_serial, dest_serial, source_size)
+    return journals
+
+def find_resumable(inventory: DiskInventory, source: str, dests: list[str]) -> dict[str, int]:
+    try:
+        journals = open_journals(inventory, source, dests)
+    except (OSError, IOError) as e:
+        log_error(f"Impossible de rechercher un clonage à reprendre : {e}")
+        return {}
+    resumable = {}
+    for device, journal in journals.items():
+        journal.load()
+        if journal.bytes_done():
+            resumable[device] = journal.bytes_done()
+    return resumable
+
+class CloneJob:
+    """Un clonage, une restauration, une création d'image ou une vérification, indépendamment de l'interface.
+    L'avancement est signalé par `event_callback(événement)`, un dict dont la clé "event" vaut "log", "status",
+    "progress", "target" ou "alert" ; `stop_flag()` interrompt l'opération lorsqu'il renvoie True."""
+
+    def __init__(self, source: str, dests: list[str], method: str = "full", verify: bool = True,
+                 verify_only: bool = False, image_dest: bool = False, copy_engine: str = "native",
+                 direct: bool = False, skip_zeros: bool = True, block_size: Optional[int] = None,
+                 buffer_count: Optional[int] = None, calibrate: bool = False, io_backend: str = "auto",
+                 queue_depth: int = DEFAULT_QUEUE_DEPTH, partitions: Optional[list[int]] = None,
+                 io_priority: str = "normal", rate_limit: float = 0,
+                 verify_workers: int = DEFAULT_WORKERS, verify_method: str = "compare", verify_samples: int = 0,
+                 resume: bool = False,
+                 inventory: Optional[DiskInventory] = None,
+                 event_callback: Optional[Callable[[dict], None]] = None,
+                 stop_flag: Optional[Callable[[], bool]] = None) -> None:
+        if method not in CLONE_METHODS:
+            raise ValueError(f"Méthode de clonage inconnue : {method}")
+        if copy_engine not in COPY_ENGINES:
+            raise ValueError(f"Moteur de copie inconnu : {copy_engine}")
+        if io_backend not in IO_MODES:
+            raise ValueError(f"Moteur d’E/S inconnu : {io_backend}")
+        if verify_method not in VERIFY_METHODS:
+            raise ValueError(f"Méthode de vérification inconnue : {verify_method}")
+        if io_priority not in IO_PRIORITIES:
+            raise ValueError(f"Priorité d’E/S inconnue : {io_priority}")
+        if rate_limit < 0:
+            raise ValueError(f"Plafond de débit invalide : {rate_limit}")
+        if verify_samples < 0:
+            raise ValueError(f"Nombre d’échantillons invalide : {verify_samples}")
+        if not source or not dests:
+            raise ValueError("Il faut une source et au moins une destination !")
+        if source in dests:
+            raise ValueError("La source et la destination ne peuvent pas être le même disque !")
+        if block_size is not None and (block_size <= 0 or block_size % 4096):
+            raise ValueError(f"Taille de bloc invalide : {block_size} (multiple de 4096 attendu)")
+        self.source = source
+        self.dests = list(dests)
+        self.source_image = source if os.path.isfile(source) and (is_image(source) or is_manifest(source)) else None
+        self.dest_image = self.dests[0] if image_dest else None
+        if image_dest and len(self.dests) != 1:
+            raise ValueError("Une image ne peut être écrite que vers un seul fichier !")
+        if self.source_image and self.dest_image:
+            raise ValueError("La source et la destination ne peuvent pas être toutes deux des images !")
+        if self.dest_image and method == "rescue":
+            raise ValueError("Le mode sauvetage ne peut écrire que vers un disque !")
+        if method == "partitions" and (self.source_image or self.dest_image):
+            raise ValueError("Le clonage par partitions ne s’applique qu’entre disques !")
+        if method == "partitions" and not partitions and not verify_only:
+            raise ValueError("Aucune partition sélectionnée pour le clonage par partitions !")
+        self.method = method
+        self.partitions = sorted(set(partitions or []))
+        self.verify = verify or verify_only
+        self.verify_only = verify_only
+        self.copy_engine = copy_engine
+        self.direct = direct
+        self.skip_zeros = skip_zeros
+        # None : choisis d'après les attributs des périphériques au lancement de la copie (voir tuning).
+        self.block_size = block_size
+        self.buffer_count = buffer_count
+        self.used_block_size: Optional[int] = None
+        self.calibrate = calibrate
+        self.io_backend = io_backend
+        self.queue_depth = max(1, queue_depth)
+        # Priorité et plafond (Mo/s, 0 : aucun) : le plafond reste modifiable pendant l'opération (set_rate_limit).
+        self.io_priority = io_priority
+        self.limiter = RateLimiter(rate_limit)
+        self.io_active = False
+        self.limited_devices: list[str] = []
+        self.metrics = JobMetrics(f"{source} -> {', '.join(self.dests)}")
+        self.metrics_key = metrics_key(source, self.dests)
+        self.metrics_exported = 0.0
+        self.metrics_path: Optional[str] = None
+        self.verify_workers = max(1, verify_workers)
+        self.verify_method = verify_method
+        # 0 : vérification complète ; sinon nombre de tranches tirées au hasard (voir sample_verify).
+        self.verify_samples = verify_samples
+        self.resume = resume
+        self.inventory = inventory or DiskInventory()
+        self.event_callback = event_callback
+        self.stop_flag = stop_flag or (lambda: False)
+        self.results: dict[str, dict] = {}
+        self.digests: Optional[list[tuple]] = None
+        self.ranges: Optional[list[tuple]] = None
+        self.mismatches: dict[str, list[tuple]] = {}
+
+    def emit(self, event: str, **fields) -> None:
+        if self.event_callback is not None:
+            self.event_callback({"event": event, **fields})
+
+    def log(self, message: str) -> None:
+        self.emit("log", message=message)
+
+    def running(self) -> bool:
+        return not self.stop_flag()
+
+    def run(self) -> dict:
+        """Exécute l'opération et renvoie {status, targets, failed, duration, metrics} ; status vaut "ok", "failed"
+        ou "stopped", metrics est le fichier JSON des mesures. Les erreurs d'E/S, de commande ou de permission sont
+        levées comme par les moteurs."""
+        self.apply_io_controls()
+        try:
+            start = time.monotonic()
+            verify = self.verify
+            if self.method == "incremental" and not verify:
+                # Le manifeste ignore ce qui a changé sur la destination depuis : seule la relecture le détecte.
+                self.log("Vérification activée d’office en mode incrémental")
+                verify = True
+            if self.method == "incremental" and self.verify_samples and not self.verify_only:
+                # La réparation des destinations a besoin de tous les blocs différents, pas d'un échantillon.
+                self.log("Vérification complète imposée en mode incrémental")
+                self.verify_samples = 0
+            self.results = {device: {"status": "ok"} for device in self.dests}
+            if self.source_image:
+                # Les empreintes de l'index permettent de vérifier les disques restaurés sans relire l'image.
+                if is_manifest(self.source):
+                    self.digests = manifest_digests(read_manifest(self.source))
+                else:
+                    self.digests = image_digests(read_index(self.source))
+            if self.dest_image:
+                if not self.verify_only:
+                    self.log(f"Démarrage de la création d’image : {self.source} -> {self.dest_image}")
+                    self.image_clone(self.source, self.dest_image)
+                if verify and self.running():
+                    self.verify_image_file(self.dest_image)
+                verify = False
+            elif self.source_image:
+                if not self.verify_only:
+                    self.log(f"Démarrage de la restauration : {self.source} -> {', '.join(self.dests)}")
+                    self.restore_clone(self.source, self.dests)
+            elif not self.verify_only:
+                self.log(f"Démarrage de l’opération de clonage : {self.source} -> {', '.join(self.dests)}")
+                self.emit("status", message="Initialisation de l’opération de clonage ...")
+                if self.method == "full":
+                    self.full_clone(self.source, self.dests)
+                elif self.method == "rescue":
+                    self.rescue_clone(self.source, self.dests)
+                elif self.method == "incremental":
+                    self.incremental_clone(self.source, self.dests)
+                elif self.method == "partitions":
+                    self.partition_clone(self.source, self.dests)
+                else:
+                    self.smart_clone(self.source, self.dests)
+            if verify and self.method == "rescue" and not self.verify_only and not self.source_image:
+                # Relire une source défaillante l'userait davantage et échouerait sur les secteurs perdus.
+                self.log("Vérification ignorée après un sauvetage : la source ne doit pas être relue")
+                verify = False
+            if verify and self.verify_only and self.method == "partitions" and self.partitions:
+                self.ranges = self.partition_ranges(self.source)
+            if verify and self.running():
+                self.verify_clone(self.source, self.dests)
+                if self.method == "incremental" and not self.verify_only and self.running():
+                    self.repair_targets(self.source)
+            failed = [device for device, result in self.results.items() if result['status'] != "ok"]
+            status = "stopped" if not self.running() else "failed" if failed else "ok"
+            result = {"status": status, "targets": self.results, "failed": failed,
+                      "duration": time.monotonic() - start, "metrics": self.report_metrics(status)}
+            for finding in record_job(self, result):
+                self.log(f"ATTENTION : débit en baisse - {describe_finding(finding)}")
+            return result
+        finally:
+            self.release_io_controls()
+            if self.metrics.finished is None:
+                self.report_metrics("stopped" if not self.running() else "error")
+
+    def report_metrics(self, status: str) -> Optional[str]:
+        """Consigne l'étape limitante de chaque phase et exporte les mesures (JSON et Prometheus)."""
+        self.metrics.finish(status)
+        for phase in self.metrics.phases():
+            self.log(self.metrics.summary(phase))
+        self.metrics_path = export_metrics(self.metrics, self.metrics_key)
+        return self.metrics_path
+
+    def apply_io_controls(self) -> None:
+        """Priorité d'E/S du thread de l'opération (héritée par les threads des moteurs et par dd) et, avec un
+        plafond, limites io.max du cgroup v2 sur les disques de l'opération lorsque le système les propose."""
+        if self.io_priority != "normal" and set_io_priority(self.io_priority):
+            self.log(f"Priorité d’E/S : {self.io_priority}")
+        self.io_active = True
+        if self.limiter.rate > 0:
+            self.apply_rate_limit()
+
+    def apply_rate_limit(self) -> None:
+        rate = self.limiter.rate_mbps
+        if rate <= 0:
+            self.clear_cgroup_limit()
+            self.log("Débit des E/S non plafonné")
+            return
+        self.limited_devices = set_cgroup_limit([self.source] + self.dests, rate)
+        where = f" (io.max du cgroup sur {', '.join(self.limited_devices)})" if self.limited_devices else ""
+        self.log(f"Débit des E/S plafonné à {rate:g} Mo/s{where}")
+        if not self.limited_devices and (self.copy_engine == "dd" or self.method == "rescue"
+                                         or self.source_image or self.dest_image):
+            self.log("Note : sans cgroup v2, le plafond ne s’applique qu’aux copies et vérifications du moteur natif")
+
+    def set_rate_limit(self, rate_mbps: float) -> None:
+        """Modifie le plafond de débit (Mo/s, 0 : aucun), y compris pendant l'opération."""
+        if rate_mbps < 0:
+            raise ValueError(f"Plafond de débit invalide : {rate_mbps}")
+        self.limiter.set_rate(rate_mbps)
+        if self.io_active:
+            self.apply_rate_limit()
+
+    def release_io_controls(self) -> None:
+        self.io_active = False
+        self.clear_cgroup_limit()
+
+    def clear_cgroup_limit(self) -> None:
+        if self.limited_devices:
+            set_cgroup_limit(self.limited_devices, 0)
+            self.limited_devices = []
+
+    def track_progress(self, label: str):
+        """Crée un suivi de progression réel (octets, débit, temps restant) signalé par des événements "progress"."""
+        tracker = ProgressTracker(0, label)
+        def progress_callback(bytes_done: int, total: int) -> None:
+            self.emit("progress", label=label, **tracker.update(bytes_done, total))
+            now = time.monotonic()
+            if now - self.metrics_exported >= METRICS_INTERVAL:
+                # node_exporter lit aussi les mesures en cours d'opération.
+                self.metrics_exported = now
+                write_textfile(self.metrics, self.metrics_key)
+        return tracker, progress_callback
+
+    def finish_progress(self, tracker: ProgressTracker) -> None:
+        snapshot = tracker.finish()
+        snapshot['percent'] = 100.0
+        self.emit("progress", label=tracker.label, **snapshot)
+
+    def set_target(self, device: str, percent: Optional[float] = None, status: Optional[str] = None) -> None:
+        self.emit("target", device=device, percent=percent, status=status)
+
+    def io_params(self, source: str, dests: list[str]) -> tuple[int, int]:
+        """Taille de bloc et nombre de tampons en vol : ceux imposés par l'appelant, sinon choisis pour ce couple de
+        périphériques (l'ajustement est consigné dans le journal)."""
+        if self.block_size is not None and self.buffer_count is not None:
+            self.used_block_size = self.block_size
+            return self.block_size, self.buffer_count
+        if self.calibrate:
+            self.log(f"Calibrage des E/S : lecture d’essai de {source}...")
+        params = choose_io_params(source, dests, calibrate=self.calibrate)
+        block_size = self.block_size or params['block_size']
+        buffer_count = self.buffer_count or params['buffer_count']
+        self.used_block_size = block_size
+        self.log(f"Paramètres d’E/S : blocs de {format_bytes(block_size)}, {buffer_count} tampon(s) en vol "
+                 f"({params['reason']})")
+        return block_size, buffer_count
+
+    def io_mode(self, devices: list[str]) -> str:
+        """Moteur d'E/S effectif : en mode "auto", la file profonde n'est retenue que si tous les périphériques sont
+        des SSD (une file profonde n'apporte rien à un disque mécanique, dont la tête sert une requête à la fois)."""
+        if self.io_backend != "auto":
+            return self.io_backend
+        for device in devices:
+            try:
+                if not stat.S_ISBLK(os.stat(device).st_mode) or not self.inventory.is_ssd(device):
+                    return "sync"
+            except OSError:
+                return "sync"
+        return "deep"
+
+    def full_clone(self, source: str, dests: list[str]) -> None:
+        self.log("Démarrage du clonage complet (bit-à-bit)...")
+        self.emit("status", message="Clonage complet en cours...")
+        if self.copy_engine == "dd" and len(dests) == 1 and not self.resume:
+            self.dd_clone(source, dests[0])
+        else:
+            if self.copy_engine == "dd":
+                self.log("Note : dd ne gère ni plusieurs destinations ni la reprise, utilisation du moteur natif...")
+            self.native_clone(source, dests)
+
+    def zero_skip_targets(self, dests: list[str]) -> set[str]:
+        """Destinations SSD où les blocs nuls sont libérés par discard plutôt qu'écrits."""
+        skip_zeros = set()
+        if self.skip_zeros:
+            for device in dests:
+                if self.inventory.is_ssd(device):
+                    skip_zeros.add(device)
+                else:
+                    self.log(f"Destination mécanique {device} : les blocs nuls seront écrits normalement")
+        return skip_zeros
+
+    def native_clone(self, source: str, dests: list[str], ranges: Optional[list[tuple]] = None,
+                     known: Optional[dict[str, dict]] = None, block_size: Optional[int] = None,
+                     dest_size: Optional[int] = None) -> None:
+        tracker, progress_callback = self.track_progress("Copie")
+        def target_callback(device: str, bytes_done: int, total: int, status: str) -> None:
+            labels = {"active": "Copie en cours", "ok": "Copie terminée", "failed": "ÉCHEC", "dropped": "ABANDONNÉE (bloquée)"}
+            self.set_target(device, bytes_done * 100 / total if total else 0, labels.get(status, status))
+        skip_zeros = self.zero_skip_targets(dests)
+        source_size = get_device_size(source)
+        requested = ranges if ranges is not None else [(0, source_size)]
+        self.ranges = align_ranges(requested, source_size)
+        journals = open_journals(self.inventory, source, dests)
+        missing = []
+        for device in dests:
+            journal = journals.get(device)
+            if journal is not None and self.resume and journal.load():
+                self.log(f"Reprise sur {device} : {format_bytes(journal.bytes_done())} déjà copiés")
+                missing.extend(subtract_ranges(requested, journal.done))
+            else:
+                missing.extend(requested)
+        resumed = any(journal.done for journal in journals.values())
+        if resumed:
+            missing_bytes = sum(length for _, length in merge_ranges(missing))
+            self.log(f"Reprise du clonage : {format_bytes(missing_bytes)} restant à copier")
+        for journal in journals.values():
+            journal.open(resume=bool(journal.done))
+        # Les empreintes ne couvriraient que la partie reprise : la vérification relira alors la source.
+        # Un échantillonnage relit la source : inutile d'empreinter tous les blocs pendant la copie.
+        hash_chunks = (self.verify and not self.verify_samples or known is not None) and not resumed
+        tuned_block_size, buffer_count = self.io_params(source, dests)
+        block_size = block_size or tuned_block_size
+        self.used_block_size = block_size
+        io_backend = self.io_mode([source] + dests)
+        if io_backend == "deep":
+            self.log(f"File profonde : jusqu’à {self.queue_depth} requêtes en vol par périphérique")
+        engine = CopyEngine(source, dests, block_size=block_size, buffer_count=buffer_count, direct=self.direct,
+                            io_backend=io_backend, queue_depth=self.queue_depth, limiter=self.limiter,
+                            metrics=self.metrics,
+                            progress_callback=progress_callback, stop_flag=self.stop_flag,
+                            ranges=missing if resumed or ranges is not None else None,
+                            skip_zeros=skip_zeros, hash_chunks=hash_chunks,
+                            target_callback=target_callback, journals=journals, known_digests=known,
+                            dest_size=dest_size)
+        try:
+            stats = engine.run()
+            for device, journal in journals.items():
+                if stats['targets'][device]['status'] == "ok":
+                    journal.remove()
+            if hash_chunks:
+                self.digests = stats['digests']
+            self.results = stats['targets']
+            self.finish_progress(tracker)
+            rate = stats['bytes_copied'] / stats['duration'] if stats['duration'] else 0
+            self.log(f"Copie terminée ({format_bytes(stats['bytes_copied'])} en {stats['duration']:.0f} s, "
+                     f"moy. {format_bytes(rate)}/s)")
+            for device, result in stats['targets'].items():
+                if result['status'] != "ok":
+                    self.log(f"ATTENTION : destination {device} abandonnée ({result['status']}) : {result['error']}")
+                elif result['bytes_unchanged']:
+                    self.log(f"{device} : {format_bytes(result['bytes_unchanged'])} inchangés non réécrits, "
+                             f"{format_bytes(result['bytes_written'] - result['bytes_unchanged'])} mis à jour")
+            if hash_chunks and self.method != "partitions":
+                self.save_clone_manifests(source, [device for device, result in stats['targets'].items()
+                                                   if result['status'] == "ok"],
+                                          source_size, "full" if ranges is None else "smart", stats['digests'])
+            if stats['bytes_zero']:
+                self.log(f"{stats['bytes_zero'] / 1e9:.2f} Go de blocs nuls libérés par discard au lieu d’être écrits")
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Périphérique introuvable : {str(e)}")
+        except PermissionError as e:
+            raise PermissionError(f"Permission refusée lors du clonage complet : {str(e)}")
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors du clonage complet : {str(e)}")
+        except MemoryError as e:
+            raise MemoryError(f"Impossible d’allouer les tampons de copie : {str(e)}")
+        finally:
+            for journal in journals.values():
+                journal.close()
+
+    def save_clone_manifests(self, source: str, dests: list[str], source_size: int, mode: str,
+                             digests: list[tuple]) -> None:
+        """Conserve, par numéro de série de destination, les empreintes de ce qui vient d'être écrit."""
+        source_serial = self.inventory.serial(source)
+        for device in dests:
+            dest_serial = self.inventory.serial(device)
+            if not serial_is_reliable(dest_serial):
+                continue
+            try:
+                save_clone_manifest(dest_serial, source_serial, source_size, mode, digests)
+            except (OSError, IOError) as e:
+                self.log(f"Impossible d’enregistrer le manifeste de {device} : {str(e)}")
+
+    def incremental_clone(self, source: str, dests: list[str]) -> None:
+        self.log("Démarrage du rafraîchissement incrémental (seuls les blocs modifiés sont écrits)...")
+        self.emit("status", message="Rafraîchissement incrémental en cours...")
+        source_size = get_device_size(source)
+        known = {}
+        modes = set()
+        chunk_size = None
+        for device in dests:
+            dest_serial = self.inventory.serial(device)
+            manifest = load_clone_manifest(dest_serial) if serial_is_reliable(dest_serial) else None
+            if manifest is None or manifest['source_size'] != source_size:
+                self.log(f"Aucun manifeste utilisable pour {device} : tous ses blocs seront écrits")
+                modes.add("full")
+                continue
+            # Les empreintes ne se comparent qu'à découpage identique : la taille de bloc suit le premier manifeste.
+            manifest_chunk = max((length for _, length, _ in manifest['chunks']), default=None)
+            if chunk_size is not None and manifest_chunk not in (None, chunk_size):
+                self.log(f"Manifeste de {device} découpé autrement : tous ses blocs seront écrits")
+                modes.add("full")
+                continue
+            chunk_size = chunk_size or manifest_chunk
+            known[device] = known_digests(manifest)
+            modes.add(manifest['mode'])
+            self.log(f"Manifeste du {time.strftime('%Y-%m-%d %H:%M', time.localtime(manifest['created']))} "
+                     f"trouvé pour {device} ({len(manifest['chunks'])} blocs)")
+        ranges = None
+        if modes == {"smart"}:
+            try:
+                ranges = get_used_ranges(source)
+            except (OSError, IOError) as e:
+                raise IOError(f"Erreur d’E/S lors de l’analyse de la table de partitions : {str(e)}")
+        self.native_clone(source, dests, ranges, known=known, block_size=chunk_size)
+
+    def repair_targets(self, source: str) -> None:
+        """Réécrit les blocs qui diffèrent encore après un rafraîchissement incrémental : ce sont ceux modifiés sur
+        la destination depuis le dernier clonage, que le manifeste ne pouvait pas connaître."""
+        for device, mismatches in self.mismatches.items():
+            if not mismatches or not self.running():
+                continue
+            self.log(f"{device} : {len(mismatches)} bloc(s) modifié(s) sur la destination, réécriture depuis la source")
+            tracker, progress_callback = self.track_progress("Réparation")
+            engine = CopyEngine(source, device, ranges=mismatches, hash_chunks=True, direct=self.direct,
+                                io_backend=self.io_mode([source, device]), queue_depth=self.queue_depth,
+                                limiter=self.limiter, metrics=self.metrics, progress_callback=progress_callback,
+                                stop_flag=self.stop_flag)
+            try:
+                stats = engine.run()
+                report = verify_digests(device, stats['digests'], workers=self.verify_workers,
+                                        stop_flag=self.stop_flag, io_backend=self.io_mode([device]),
+                                        queue_depth=self.queue_depth, limiter=self.limiter, metrics=self.metrics)
+            except (OSError, IOError) as e:
+                raise IOError(f"Erreur d’E/S lors de la réparation de {device} : {str(e)}")
+            tracker.finish()
+            if report['mismatches']:
+                self.log(f"ATTENTION : {device} diffère encore après réécriture")
+                remove_clone_manifest(self.inventory.serial(device))
+            else:
+                self.results[device] = {"status": "ok"}
+                self.set_target(device, 100, "Vérifiée après réparation")
+                self.log(f"{device} réparé et vérifié")
+
+    def dd_clone(self, source: str, dest: str) -> None:
+        cmd = [
+            "dd",
+            f"if={source}",
+            f"of={dest}",
+            f"bs={self.io_params(source, [dest])[0]}",
+            "conv=fdatasync",
+            "status=progress"
+        ]
+        total = get_device_size(source)
+        tracker, progress_callback = self.track_progress("Copie dd")
+        def output_callback(line: str) -> None:
+            bytes_done = parse_dd_progress(line)
+            if bytes_done is not None:
+                progress_callback(bytes_done, total)
+        try:
+            run_command_with_progress(cmd, None, self.stop_flag, output_callback)
+            self.finish_progress(tracker)
+            self.log("Clonage complet terminé avec succès")
+        except (CalledProcessError, subprocess.SubprocessError) as e:
+            raise subprocess.SubprocessError(f"Commande de clonage complet échouée : {str(e)}")
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors du clonage complet : {str(e)}")
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Commande dd introuvable : {str(e)}")
+        except PermissionError as e:
+            raise PermissionError(f"Permission refusée lors du clonage complet : {str(e)}")
+        except TimeoutExpired as e:
+            raise TimeoutExpired(cmd, None, f"Délai dépassé lors du clonage complet : {str(e)}")
+
+    def smart_clone(self, source: str, dests: list[str]) -> None:
+        self.log("Démarrage du clonage intelligent (copie consciente du système de fichiers)...")
+        self.emit("status", message="Clonage intelligent en cours...")
+        try:
+            ranges = get_used_ranges(source)
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors de l’analyse de la table de partitions : {str(e)}")
+        if ranges is None:
+            self.log("Aucune table de partitions reconnue, utilisation du clonage complet...")
+            self.full_clone(source, dests)
+            return
+        used = sum(length for _, length in ranges)
+        self.log(f"Clonage intelligent : {used / 1e9:.2f} Go à copier en {len(ranges)} plage(s)")
+        if self.copy_engine == "dd":
+            self.log("Note : dd ne peut pas copier par plages, utilisation du moteur natif...")
+        self.native_clone(source, dests, ranges)
+
+    def partition_table(self, source: str) -> dict:
+        try:
+            table = read_partition_table(source)
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors de l’analyse de la table de partitions : {str(e)}")
+        if table is None:
+            raise IOError(f"Aucune table de partitions reconnue sur {source}")
+        return table
+
+    def partition_ranges(self, source: str) -> list[tuple[int, int]]:
+        """Étendues des partitions choisies : seules zones comparées lors d'une vérification sans clonage."""
+        try:
+            selected = select_partitions(self.partition_table(source), self.partitions)
+        except ValueError as e:
+            raise IOError(str(e))
+        return [(part['start'], part['size']) for part in selected]
+
+    def partition_clone(self, source: str, dests: list[str]) -> None:
+        """Ne copie que les partitions choisies, puis la zone d'amorçage et une table réduite à ces partitions :
+        l'espace non alloué est ignoré et une destination plus petite convient si les partitions y tiennent."""
+        self.log(f"Démarrage du clonage par partitions ({', '.join(map(str, self.partitions))})...")
+        self.emit("status", message="Clonage par partitions en cours...")
+        table = self.partition_table(source)
+        try:
+            selected = select_partitions(table, self.partitions)
+            needed = required_size(table, self.partitions)
+        except ValueError as e:
+            raise IOError(str(e))
+        for device in dests:
+            if not os.path.exists(device) or not stat.S_ISBLK(os.stat(device).st_mode):
+                continue
+            size = get_device_size(device)
+            if size < needed:
+                raise IOError(f"Les partitions choisies ({format_bytes(needed)}) ne tiennent pas sur {device} "
+                              f"({format_bytes(size)})")
+        ranges = [(part['start'], part['size']) for part in selected]
+        for part in selected:
+            self.log(f"Partition {part['number']} ({part['name'] or part['type']}) : {format_bytes(part['size'])}")
+        copied = sum(part['size'] for part in selected)
+        self.log(f"Clonage par partitions : {format_bytes(copied)} à copier sur {format_bytes(table['disk_size'])} "
+                 f"({table['scheme'].upper()})")
+        if self.copy_engine == "dd":
+            self.log("Note : dd ne peut pas copier par plages, utilisation du moteur natif...")
+        # Une destination fichier ne reçoit que la place des partitions choisies, et non toute la taille de la source.
+        self.native_clone(source, dests, ranges, dest_size=needed)
+        if not self.running():
+            return
+        for device in dests:
+            if self.results[device]['status'] != "ok":
+                continue
+            try:
+                report = write_partition_table(source, device, self.partitions)
+            except (OSError, IOError, ValueError) as e:
+                raise IOError(f"Erreur lors de l’écriture de la table de partitions sur {device} : {str(e)}")
+            # Un manifeste antérieur décrirait encore tout le disque : le rafraîchissement incrémental repartira de zéro.
+            dest_serial = self.inventory.serial(device)
+            if serial_is_reliable(dest_serial):
+                remove_clone_manifest(dest_serial)
+            self.log(f"Table {report['scheme'].upper()} écrite sur {device} "
+                     f"(partitions {', '.join(map(str, report['partitions']))})")
+            numbering = ", ".join(f"{number} → {new}" for number, new in sorted(report['numbering'].items()))
+            if any(number != new for number, new in report['numbering'].items()):
+                self.log(f"ATTENTION : numérotation changée sur {device} ({numbering}) : adapter fstab et les "
+                         f"entrées d’amorçage qui désignent les partitions par nom de périphérique")
+            else:
+                self.log(f"Numérotation sur {device} : {numbering}")
+
+    def image_clone(self, source: str, image_path: str) -> None:
+        ranges = None
+        if self.method == "smart":
+            try:
+                ranges = get_used_ranges(source)
+            except (OSError, IOError) as e:
+                raise IOError(f"Erreur d’E/S lors de l’analyse de la table de partitions : {str(e)}")
+            if ranges is None:
+                self.log("Aucune table de partitions reconnue, image de tout le disque...")
+        self.emit("status", message="Création de l’image en cours...")
+        tracker, progress_callback = self.track_progress("Image")
+        try:
+            if is_manifest(image_path):
+                report = capture(source, image_path, ranges=ranges, progress_callback=progress_callback,
+                                 stop_flag=self.stop_flag)
+                report['image_size'] = report['bytes_stored']
+                report['ratio'] = report['bytes_stored'] / report['bytes_read'] if report['bytes_read'] else 0.0
+                self.log(f"Magasin : {report['chunks_new']} bloc(s) nouveau(x), "
+                         f"{report['chunks_reused']} déjà présent(s), {report['chunks_zero']} nul(s)")
+            else:
+                report = create_image(source, image_path, ranges=ranges, progress_callback=progress_callback,
+                                      stop_flag=self.stop_flag)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Périphérique ou dossier introuvable : {str(e)}")
+        except PermissionError as e:
+            raise PermissionError(f"Permission refusée lors de la création de l’image : {str(e)}")
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors de la création de l’image : {str(e)}")
+        except MemoryError as e:
+            raise MemoryError(f"Impossible d’allouer les tampons de compression : {str(e)}")
+        self.finish_progress(tracker)
+        self.log(f"Image créée : {format_bytes(report['bytes_read'])} lus, {format_bytes(report['image_size'])} "
+                 f"écrits ({report['ratio'] * 100:.1f} %, {report['codec']}) en {report['duration']:.0f} s")
+
+    def restore_clone(self, image_path: str, dests: list[str]) -> None:
+        self.emit("status", message="Restauration de l’image en cours...")
+        tracker, progress_callback = self.track_progress("Restauration")
+        try:
+            restore = restore_manifest if is_manifest(image_path) else restore_image
+            report = restore(image_path, dests, skip_zeros=self.zero_skip_targets(dests),
+                             progress_callback=progress_callback, stop_flag=self.stop_flag)
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Image ou périphérique introuvable : {str(e)}")
+        except PermissionError as e:
+            raise PermissionError(f"Permission refusée lors de la restauration : {str(e)}")
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors de la restauration : {str(e)}")
+        self.finish_progress(tracker)
+        self.log(f"Restauration terminée : {format_bytes(report['bytes_restored'])} en {report['duration']:.0f} s")
+        for device in dests:
+            self.set_target(device, 100, "Restauration terminée")
+
+    def verify_image_file(self, image_path: str) -> None:
+        self.log(f"Contrôle de l’image {image_path} (décompression et comparaison aux empreintes)...")
+        self.emit("status", message="Contrôle de l’image en cours...")
+        tracker, progress_callback = self.track_progress("Contrôle de l’image")
+        try:
+            check = check_manifest if is_manifest(image_path) else check_image
+            report = check(image_path, workers=self.verify_workers,
+                           progress_callback=progress_callback, stop_flag=self.stop_flag)
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors du contrôle de l’image : {str(e)}")
+        tracker.finish()
+        if report['mismatches']:
+            self.results[image_path] = {"status": "verify_failed", "error": "image corrompue"}
+            self.log(f"ATTENTION : {len(report['mismatches'])} bloc(s) corrompu(s) dans l’image")
+            for offset, length in report['mismatches'][:20]:
+                self.log(f"  Bloc corrompu : offset {offset}, {length} octets")
+        else:
+            self.log("Contrôle de l’image terminé : tous les blocs sont intacts")
+
+    def rescue_clone(self, source: str, dests: list[str]) -> None:
+        self.log("Démarrage du sauvetage (lecture tolérante aux secteurs défectueux)...")
+        self.emit("status", message="Sauvetage en cours...")
+        tracker, progress_callback = self.track_progress("Sauvetage")
+        map_path = bad_map_path(self.inventory.serial(source))
+        engine = RescueEngine(source, dests, direct=True, progress_callback=progress_callback,
+                              stop_flag=self.stop_flag, map_path=map_path)
+        try:
+            report = engine.run()
+        except FileNotFoundError as e:
+            raise FileNotFoundError(f"Périphérique introuvable : {str(e)}")
+        except PermissionError as e:
+            raise PermissionError(f"Permission refusée lors du sauvetage : {str(e)}")
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors du sauvetage : {str(e)}")
+        self.finish_progress(tracker)
+        self.log(f"Sauvetage terminé : {format_bytes(report['bytes_rescued'])} récupérés, "
+                 f"{format_bytes(report['bytes_lost'])} illisibles ({report['bytes_lost']} octets "
+                 f"en {len(report['bad_ranges'])} zone(s), {report['read_errors']} erreur(s) de lecture)")
+        if report['bytes_lost']:
+            self.log(f"Carte des secteurs illisibles : {map_path}")
+            for offset, length in report['bad_ranges'][:20]:
+                self.log(f"  Zone illisible : offset {offset}, {length} octets")
+            if len(report['bad_ranges']) > 20:
+                self.log(f"  ... et {len(report['bad_ranges']) - 20} autre(s) zone(s)")
+            self.emit("alert", level="warning", title="Secteurs illisibles",
+                      message=f"{report['bytes_lost']} octets n’ont pas pu être lus sur la source.\n\n"
+                              f"Ils ont été remplis avec un motif reconnaissable sur la destination.\n"
+                              f"Carte des zones perdues : {map_path}")
+
+    def verify_clone(self, source: str, dests: list[str]) -> None:
+        if not self.running():
+            return
+        self.log("Démarrage de la vérification du clone...")
+        self.emit("status", message="Vérification du clone en cours...")
+        self.emit("progress", label="Vérification", percent=0.0)
+        targets = [device for device in dests if self.results.get(device, {}).get('status') == "ok"]
+        progress = {device: (0, 0) for device in targets}
+        tracker, overall_callback = self.track_progress("Vérification")
+        def make_progress_callback(device: str):
+            def progress_callback(bytes_done: int, total: int) -> None:
+                progress[device] = (bytes_done, total)
+                if total:
+                    self.set_target(device, bytes_done * 100 / total, "Vérification en cours")
+                values = list(progress.values())
+                overall_callback(sum(done for done, _ in values), sum(size for _, size in values))
+            return progress_callback
+        def verify_target(device: str) -> bool:
+            if self.digests is not None:
+                return self.verify_inline(device, self.digests, make_progress_callback(device))
+            if self.verify_samples:
+                return self.verify_sampled(source, device, make_progress_callback(device))
+            return self.verify_parallel(source, device, make_progress_callback(device))
+        with ThreadPoolExecutor(max_workers=max(1, len(targets))) as executor:
+            outcomes = dict(zip(targets, executor.map(verify_target, targets)))
+        self.finish_progress(tracker)
+        failed = [device for device, identical in outcomes.items() if not identical]
+        kind = "Vérifiée par échantillons" if self.verify_samples else "Vérifiée"
+        for device, identical in outcomes.items():
+            self.set_target(device, 100, f"{kind} : identique" if identical else f"{kind} : DIFFÉRENTE")
+            if not identical:
+                self.results[device].update(status="verify_failed", error="les disques diffèrent")
+        if failed:
+            self.log(f"ATTENTION : Échec de la vérification pour : {', '.join(failed)}")
+
+    def verify_parallel(self, source: str, dest: str, progress_callback) -> bool:
+        self.log(f"Comparaison parallèle de la source et de {dest} ({self.verify_method}, {self.verify_workers} thread(s))")
+        try:
+            report = parallel_verify(source, dest, workers=self.verify_workers, method=self.verify_method,
+                                     ranges=self.ranges, progress_callback=progress_callback,
+                                     stop_flag=self.stop_flag, io_backend=self.io_mode([source, dest]),
+                                     queue_depth=self.queue_depth, limiter=self.limiter, metrics=self.metrics)
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors de la vérification de {dest} : {str(e)}")
+        mismatches = report['mismatches']
+        if mismatches:
+            self.log(f"ATTENTION : Échec de la vérification de {dest} - {len(mismatches)} tranche(s) diffèrent")
+            for result in mismatches[:20]:
+                chunks = ", ".join(str(offset) for offset in result['mismatched_chunks'][:5])
+                self.log(f"  Tranche différente : offset {result['offset']}, {result['length']} octets"
+                         f"{' (tronquée)' if result['truncated'] else ''} - blocs : {chunks}")
+            if len(mismatches) > 20:
+                self.log(f"  ... et {len(mismatches) - 20} autre(s) tranche(s)")
+            return False
+        self.log(f"Vérification de {dest} terminée avec succès - les disques sont identiques")
+        return True
+
+    def verify_sampled(self, source: str, dest: str, progress_callback) -> bool:
+        self.log(f"Vérification par échantillonnage de {dest} : {self.verify_samples} tranche(s) tirée(s) au hasard, "
+                 f"extrémités du disque et table de partitions")
+        try:
+            report = sample_verify(source, dest, samples=self.verify_samples, ranges=self.ranges,
+                                   workers=self.verify_workers, method=self.verify_method,
+                                   progress_callback=progress_callback, stop_flag=self.stop_flag,
+                                   io_backend=self.io_mode([source, dest]), queue_depth=self.queue_depth,
+                                   limiter=self.limiter, metrics=self.metrics)
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors de la vérification de {dest} : {str(e)}")
+        self.record_sampling(dest, report)
+        mismatches = report['mismatches']
+        if mismatches:
+            self.log(f"ATTENTION : Échec de la vérification de {dest} - {len(mismatches)} tranche(s) échantillonnée(s) "
+                     f"diffèrent")
+            for result in mismatches[:20]:
+                self.log(f"  Tranche différente : offset {result['offset']}, {result['length']} octets"
+                         f"{' (tronquée)' if result['truncated'] else ''}")
+            return False
+        self.log(f"Vérification par échantillonnage de {dest} : aucune différence - {describe_sampling(report)}")
+        return True
+
+    def record_sampling(self, dest: str, report: dict) -> None:
+        """Couverture et confiance d'un échantillonnage, jointes au résultat de la destination."""
+        self.results.setdefault(dest, {"status": "ok"})['sampling'] = {
+            key: report[key] for key in ("samples", "population", "checked", "coverage", "confidence", "undetected",
+                                         "seed")}
+
+    def verify_inline(self, dest: str, digests: list[tuple], progress_callback) -> bool:
+        total = sum(length for _, length, _ in digests)
+        population = len(digests)
+        if self.verify_samples:
+            # La source est une image : les tables de partitions sont lues sur le disque restauré.
+            try:
+                fixed = fixed_regions(dest, get_device_size(dest))
+            except OSError as e:
+                raise IOError(f"Erreur d’E/S lors de la vérification de {dest} : {str(e)}")
+            digests, seed = sample_digests(digests, self.verify_samples, fixed=fixed)
+            self.log(f"Relecture de {len(digests)} bloc(s) de {dest} tirés au hasard et comparaison à leurs empreintes")
+        else:
+            self.log(f"Relecture de {dest} et comparaison aux empreintes calculées pendant la copie")
+        try:
+            report = verify_digests(dest, digests, workers=self.verify_workers,
+                                    progress_callback=progress_callback, stop_flag=self.stop_flag,
+                                    io_backend=self.io_mode([dest]), queue_depth=self.queue_depth,
+                                    limiter=self.limiter, metrics=self.metrics)
+        except (OSError, IOError) as e:
+            raise IOError(f"Erreur d’E/S lors de la vérification de {dest} : {str(e)}")
+        mismatches = report['mismatches']
+        self.mismatches[dest] = mismatches
+        if self.verify_samples:
+            # Le premier et le dernier bloc sont toujours relus : ils ne comptent pas dans le tirage.
+            sampling = {"samples": min(self.verify_samples, population), "population": population, "seed": seed,
+                        "checked": report['checked'], "coverage": report['checked'] / total if total else 1.0,
+                        "confidence": CONFIDENCE,
+                        "undetected": sampling_confidence(min(self.verify_samples, population), population)}
+            self.record_sampling(dest, sampling)
+            if not mismatches:
+                self.log(f"Vérification par échantillonnage de {dest} : aucune différence - {describe_sampling(sampling)}")
+                return True
+        if mismatches:
+            self.log(f"ATTENTION : Échec de la vérification de {dest} - {len(mismatches)} bloc(s) diffèrent")
+            for offset, length in mismatches[:20]:
+                self.log(f"  Bloc différent : offset {offset}, {length} octets")
+            if len(mismatches) > 20:
+                self.log(f"  ... et {len(mismatches) - 20} autre(s) bloc(s)")
+            return False
+        self.log(f"Vérification de {dest} terminée avec succès - les disques sont identiques")
+        return True
@@ -0,0 +1,54 @@
+import os
+import re
+import json
+import time
+from typing import Optional
+
+from log_handler import log_info, log_warning
+
+MANIFEST_DIR = os.environ.get("CLONEUR_MANIFEST_DIR", "/var/lib/cloneur_leger/manifestes")
+MANIFEST_VERSION = 1
+
+def manifest_path(dest_serial: str) -> str:
+    return os.path.join(MANIFEST_DIR, re.sub(r"[^A-Za-z0-9._-]", "_", dest_serial) + ".json")
+
+def save_clone_manifest(dest_serial: str, source_serial: str, source_size: int, mode: str,
+                        digests: list[tuple[int, int, bytes]]) -> str:
+    """Enregistre les empreintes par bloc de ce qui vient d'être écrit sur une destination, identifiée par son numéro
+    de série. `mode` vaut "full" ou "smart" selon que tout le disque ou seulement les zones utilisées ont été copiés."""
+    os.makedirs(MANIFEST_DIR, exist_ok=True)
+    path = manifest_path(dest_serial)
+    manifest = {"version": MANIFEST_VERSION, "dest_serial": dest_serial, "source_serial": source_serial,
+                "source_size": source_size, "mode": mode, "created": time.time(),
+                "chunks": [[offset, length, digest.hex()] for offset, length, digest in sorted(digests)]}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    log_info(f"Manifeste de clonage enregistré pour {dest_serial} : {len(digests)} bloc(s)")
+    return path
+
+def load_clone_manifest(dest_serial: str) -> Optional[dict]:
+    try:
+        with open(manifest_path(dest_serial), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        log_warning(f"Manifeste de clonage illisible pour {dest_serial} : {e}")
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    return manifest
+
+def remove_clone_manifest(dest_serial: str) -> None:
+    try:
+        os.remove(manifest_path(dest_serial))
+    except FileNotFoundError:
+        pass
+
+def known_digests(manifest: dict) -> dict[int, tuple[int, bytes]]:
+    """Index {offset: (longueur, empreinte)} attendu par CopyEngine(known_digests=...)."""
+    return {offset: (length, bytes.fromhex(digest)) for offset, length, digest in manifest["chunks"]}
@@ -0,0 +1,571 @@
+import os
+import mmap
+import stat
+import fcntl
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Optional
+
+from log_handler import log_info, log_warning
+from zero_blocks import ZeroWriter, zero_segments
+from hashing import chunk_digest, zero_digest
+from io_limits import RateLimiter, ThrottledIO
+from metrics import JobMetrics, MeasuredIO
+
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+DEFAULT_BUFFER_COUNT = 4
+DEFAULT_STALL_TIMEOUT = 60.0
+DEFAULT_CHECKPOINT_INTERVAL = 10.0
+DEFAULT_QUEUE_DEPTH = 16
+MIN_REQUEST_SIZE = 128 * 1024
+ALIGNMENT = 4096
+IO_BACKENDS = ("sync", "deep")
+
+def align_up(value: int, alignment: int = ALIGNMENT) -> int:
+    return (value + alignment - 1) // alignment * alignment
+
+def merge_ranges(ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Trie et fusionne des plages (offset, longueur) qui se chevauchent ou se touchent."""
+    merged: list[list[int]] = []
+    for offset, length in sorted(r for r in ranges if r[1] > 0):
+        if merged and offset <= merged[-1][0] + merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], offset + length - merged[-1][0])
+        else:
+            merged.append([offset, length])
+    return [(offset, length) for offset, length in merged]
+
+def align_ranges(ranges: list[tuple[int, int]], limit: int) -> list[tuple[int, int]]:
+    """Étend les plages aux frontières d'alignement, les borne à la taille du périphérique et les fusionne."""
+    aligned = []
+    for offset, length in ranges:
+        start = offset // ALIGNMENT * ALIGNMENT
+        end = min(align_up(offset + length), limit)
+        if start < end:
+            aligned.append((start, end - start))
+    return merge_ranges(aligned)
+
+def get_device_size(path: str) -> int:
+    """Retourne la taille en octets d'un périphérique bloc ou d'un fichier."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        return os.lseek(fd, 0, os.SEEK_END)
+    finally:
+        os.close(fd)
+
+def open_device(path: str, flags: int, direct: bool = False) -> tuple[int, bool]:
+    """Ouvre un périphérique, avec O_DIRECT si demandé et supporté. Retourne (fd, direct_actif)."""
+    if direct and hasattr(os, "O_DIRECT"):
+        try:
+            return os.open(path, flags | os.O_DIRECT), True
+        except OSError as e:
+            log_warning(f"O_DIRECT indisponible pour {path} ({e}), utilisation du cache de pages")
+    return os.open(path, flags), False
+
+def clear_direct(fd: int) -> None:
+    """Désactive O_DIRECT sur un descripteur (nécessaire pour une fin de copie non alignée)."""
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+
+def read_full(fd: int, view: memoryview, offset: int) -> int:
+    """Lit jusqu'à remplir le tampon ou atteindre la fin du périphérique."""
+    total = 0
+    while total < len(view):
+        n = os.preadv(fd, [view[total:]], offset + total)
+        if n == 0:
+            break
+        total += n
+    return total
+
+def write_full(fd: int, view: memoryview, offset: int) -> None:
+    """Écrit l'intégralité du tampon, en reprenant après les écritures partielles."""
+    total = 0
+    while total < len(view):
+        n = os.pwritev(fd, [view[total:]], offset + total)
+        if n == 0:
+            raise IOError(f"Écriture impossible à l’offset {offset + total}")
+        total += n
+
+class SyncIO:
+    """Une requête à la fois : chaque tampon est lu ou écrit par un seul appel système (ou sa reprise)."""
+
+    depth = 1
+
+    def read(self, fd: int, view: memoryview, offset: int) -> int:
+        return read_full(fd, view, offset)
+
+    def write(self, fd: int, view: memoryview, offset: int) -> None:
+        write_full(fd, view, offset)
+
+    def close(self) -> None:
+        pass
+
+class DeepQueueIO:
+    """File profonde : chaque tampon est découpé en requêtes alignées confiées à un pool de `depth` threads, de sorte
+    que jusqu'à `depth` pread/pwrite soient en vol sur le périphérique (les appels système libèrent le GIL).
+    Un SSD NVMe ne délivre son débit qu'avec de nombreuses requêtes simultanées."""
+
+    def __init__(self, depth: int = DEFAULT_QUEUE_DEPTH) -> None:
+        self.depth = max(1, depth)
+        self.executor = ThreadPoolExecutor(max_workers=self.depth, thread_name_prefix="deep-io")
+
+    def _pieces(self, length: int) -> list[tuple[int, int]]:
+        size = max(MIN_REQUEST_SIZE, align_up(-(-length // self.depth)))
+        return [(start, min(size, length - start)) for start in range(0, length, size)]
+
+    def read(self, fd: int, view: memoryview, offset: int) -> int:
+        pieces = self._pieces(len(view))
+        futures = [self.executor.submit(read_full, fd, view[start:start + length], offset + start)
+                   for start, length in pieces]
+        # Toutes les requêtes sont attendues avant de rendre le tampon, même si l'une d'elles a échoué.
+        wait(futures)
+        total = 0
+        for (_, length), future in zip(pieces, futures):
+            n = future.result()
+            total += n
+            if n < length:
+                # Fin du périphérique : les requêtes suivantes n'ont rien lu.
+                break
+        return total
+
+    def write(self, fd: int, view: memoryview, offset: int) -> None:
+        futures = [self.executor.submit(write_full, fd, view[start:start + length], offset + start)
+                   for start, length in self._pieces(len(view))]
+        wait(futures)
+        for future in futures:
+            future.result()
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+def make_io(backend: str = "sync", depth: int = DEFAULT_QUEUE_DEPTH, limiter: Optional[RateLimiter] = None,
+            stop_flag: Optional[Callable[[], bool]] = None, metrics: Optional[JobMetrics] = None,
+            phase: str = "copy"):
+    """Moteur d'E/S d'un flux (source ou destination) : "sync" ou "deep" (file profonde de `depth` requêtes),
+    dont les lectures respectent le plafond de `limiter` et dont les requêtes sont chronométrées dans `metrics`."""
+    if backend not in IO_BACKENDS:
+        raise ValueError(f"Moteur d’E/S inconnu : {backend}")
+    io = DeepQueueIO(depth) if backend == "deep" else SyncIO()
+    if metrics is not None:
+        # Chronométrée sous le plafond : l'attente imposée par celui-ci n'est pas comptée comme latence.
+        io = MeasuredIO(io, metrics, phase)
+    return ThrottledIO(io, limiter, stop_flag, metrics, phase) if limiter is not None else io
+
+class CopyTarget:
+    """État d'une destination de copie : descripteur, file d'attente dédiée, thread écrivain et résultat."""
+
+    def __init__(self, path: str, fd: int, direct: bool, queue_size: int,
+                 zero_writer: Optional[ZeroWriter], journal=None) -> None:
+        self.path = path
+        self.fd = fd
+        self.direct = direct
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.zero_writer = zero_writer
+        self.journal = journal
+        self.last_checkpoint = time.monotonic()
+        self.status = "active"
+        self.error: Optional[BaseException] = None
+        self.bytes_written = 0
+        self.bytes_unchanged = 0
+        self.thread: Optional[threading.Thread] = None
+        self.io = SyncIO()
+
+    @property
+    def active(self) -> bool:
+        return self.status == "active"
+
+    def result(self) -> dict:
+        return {"status": self.status, "bytes_written": self.bytes_written,
+                "bytes_unchanged": self.bytes_unchanged, "error": str(self.error) if self.error else None}
+
+class CopyEngine:
+    """Moteur de copie natif : un thread lecteur alimente un thread écrivain par destination via un pool de
+    tampons alignés et réutilisés. La source n'est lue qu'une fois quel que soit le nombre de destinations ;
+    une destination en erreur ou bloquée plus de `stall_timeout` secondes est abandonnée sans ralentir les autres.
+    Si `hash_chunks` est actif, un thread intermédiaire calcule l'empreinte de chaque bloc source au passage.
+    `skip_zeros` vaut True (toutes les destinations) ou l'ensemble des destinations où les blocs nuls sont libérés
+    par discard au lieu d'être écrits.
+    `journals` associe à une destination un journal de reprise (`record`/`commit`) : les plages écrites y sont
+    validées toutes les `checkpoint_interval` secondes, après synchronisation de la destination.
+    `known_digests` associe à une destination les empreintes {offset: (longueur, empreinte)} de ce qu'elle contient
+    déjà : avec `hash_chunks`, les blocs source identiques ne lui sont pas réécrits.
+    `limiter` (RateLimiter) plafonne le débit de lecture de la source ; il peut être modifié pendant la copie.
+    `metrics` (JobMetrics) reçoit le temps passé par étape et la latence des requêtes, en phase "copy".
+    Une destination fichier est étendue à `dest_size` octets (par défaut la taille de la source)."""
+
+    def __init__(self, source: str, dest, block_size: int = DEFAULT_BLOCK_SIZE,
+                 buffer_count: int = DEFAULT_BUFFER_COUNT, direct: bool = False,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 stop_flag: Optional[Callable[[], bool]] = None,
+                 ranges: Optional[list[tuple[int, int]]] = None, skip_zeros=False,
+                 hash_chunks: bool = False,
+                 target_callback: Optional[Callable[[str, int, int, str], None]] = None,
+                 stall_timeout: float = DEFAULT_STALL_TIMEOUT, journals: Optional[dict] = None,
+                 checkpoint_interval: float = DEFAULT_CHECKPOINT_INTERVAL,
+                 known_digests: Optional[dict] = None, io_backend: str = "sync",
+                 queue_depth: int = DEFAULT_QUEUE_DEPTH, limiter: Optional[RateLimiter] = None,
+                 metrics: Optional[JobMetrics] = None, dest_size: Optional[int] = None) -> None:
+        if io_backend not in IO_BACKENDS:
+            raise ValueError(f"Moteur d’E/S inconnu : {io_backend}")
+        if block_size <= 0 or block_size % ALIGNMENT:
+            raise ValueError(f"La taille de bloc doit être un multiple de {ALIGNMENT} octets")
+        self.source = source
+        self.dests = [dest] if isinstance(dest, str) else list(dest)
+        if not self.dests:
+            raise ValueError("Aucune destination de copie")
+        self.block_size = block_size
+        self.buffer_count = max(2, buffer_count)
+        self.direct = direct
+        self.progress_callback = progress_callback
+        self.target_callback = target_callback
+        self.stop_flag = stop_flag
+        self.ranges = ranges
+        self.dest_size = dest_size
+        if isinstance(skip_zeros, bool):
+            self.zero_dests = set(self.dests) if skip_zeros else set()
+        else:
+            self.zero_dests = set(skip_zeros)
+        self.hash_chunks = hash_chunks
+        self.stall_timeout = stall_timeout
+        self.journals = journals or {}
+        self.checkpoint_interval = checkpoint_interval
+        self.known_digests = known_digests or {}
+        self.io_backend = io_backend
+        self.queue_depth = max(1, queue_depth)
+        self.limiter = limiter
+        self.metrics = metrics
+        if self.known_digests and not hash_chunks:
+            raise ValueError("La copie incrémentale nécessite le calcul des empreintes (hash_chunks)")
+        self.digests: list[tuple[int, int, bytes]] = []
+        self.targets: list[CopyTarget] = []
+        self.total = 0
+        self.bytes_copied = 0
+        self.bytes_zero = 0
+        self._error: Optional[BaseException] = None
+        self._cancelled = threading.Event()
+        self._refs: list[int] = []
+        self._refs_lock = threading.Lock()
+        self._free: queue.Queue = queue.Queue()
+
+    def _should_stop(self) -> bool:
+        if self._cancelled.is_set() or self._error is not None:
+            return True
+        if self.stop_flag and self.stop_flag():
+            self._cancelled.set()
+            return True
+        return False
+
+    def _get(self, q: queue.Queue):
+        while True:
+            try:
+                return q.get(timeout=0.5)
+            except queue.Empty:
+                if self._should_stop():
+                    return None
+
+    def _release(self, index: int) -> None:
+        with self._refs_lock:
+            self._refs[index] -= 1
+            released = self._refs[index] == 0
+        if released:
+            self._free.put(index)
+
+    def _drop(self, target: CopyTarget, status: str, error: Optional[BaseException] = None) -> None:
+        """Abandonne une destination et rend les tampons qu'elle retenait encore dans sa file."""
+        if not target.active:
+            return
+        target.status = status
+        target.error = error
+        log_warning(f"Destination {target.path} abandonnée ({status}) : {error}")
+        self._notify(target)
+        self._drain(target)
+        if not any(t.active for t in self.targets):
+            self._error = error or IOError("Toutes les destinations ont été abandonnées")
+
+    def _drain(self, target: CopyTarget) -> None:
+        while True:
+            try:
+                item = target.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self._release(item[2])
+
+    def _notify(self, target: CopyTarget) -> None:
+        if self.target_callback:
+            self.target_callback(target.path, target.bytes_written, self.total, target.status)
+
+    def _dispatch(self, item: tuple) -> bool:
+        """Transmet un bloc à toutes les destinations actives ; abandonne celles qui restent bloquées."""
+        active = [t for t in self.targets if t.active]
+        if not active:
+            return False
+        with self._refs_lock:
+            self._refs[item[2]] = len(active)
+        for target in active:
+            waited = 0.0
+            while True:
+                if not target.active:
+                    self._release(item[2])
+                    break
+                try:
+                    target.queue.put(item, timeout=0.5)
+                    # L'abandon a pu survenir pendant le dépôt : on rend alors le tampon nous-mêmes.
+                    if not target.active:
+                        self._drain(target)
+                    break
+                except queue.Full:
+                    waited += 0.5
+                    if self._should_stop():
+                        self._release(item[2])
+                        break
+                    if waited >= self.stall_timeout:
+                        self._drop(target, "dropped", TimeoutError(
+                            f"aucune écriture depuis {self.stall_timeout:.0f} s"))
+        return True
+
+    def _finish_dispatch(self) -> None:
+        for target in self.targets:
+            while target.active:
+                try:
+                    target.queue.put(None, timeout=0.5)
+                    break
+                except queue.Full:
+                    if self._should_stop():
+                        break
+
+    def _reader(self, fd: int, ranges: list, buffers: list, out: Optional[queue.Queue], io) -> None:
+        try:
+            for start, range_length in ranges:
+                offset = start
+                end = start + range_length
+                while offset < end:
+                    # Des tampons libres restent disponibles après un arrêt : _get ne le verrait qu'à vide.
+                    if self._should_stop():
+                        return
+                    waited = time.perf_counter()
+                    index = self._get(self._free)
+                    if self.metrics is not None:
+                        # Pas de tampon libre : les écrivains (ou le calcul des empreintes) ne suivent pas.
+                        self.metrics.add_stage("copy", "buffer_wait", time.perf_counter() - waited)
+                    if index is None:
+                        return
+                    length = min(self.block_size, align_up(end - offset))
+                    n = io.read(fd, buffers[index][:length], offset)
+                    n = min(n, end - offset)
+                    if n == 0:
+                        raise IOError(f"Fin inattendue de la source {self.source} à l’offset {offset}")
+                    if self.metrics is not None:
+                        self.metrics.add_bytes("copy", n)
+                    segments = zero_segments(buffers[index][:n]) if self.zero_dests else None
+                    item = (offset, n, index, segments, None)
+                    if out is not None:
+                        out.put(item)
+                    elif not self._dispatch(item):
+                        return
+                    offset += n
+        except BaseException as e:
+            self._error = e
+        finally:
+            if out is not None:
+                out.put(None)
+            else:
+                self._finish_dispatch()
+
+    def _hasher(self, buffers: list, hashed: queue.Queue) -> None:
+        try:
+            while True:
+                item = self._get(hashed)
+                if item is None:
+                    break
+                offset, n, index, segments, _ = item
+                start = time.perf_counter()
+                if segments is not None and len(segments) == 1 and segments[0][2]:
+                    digest = zero_digest(n)
+                else:
+                    digest = chunk_digest(buffers[index][:n])
+                if self.metrics is not None:
+                    self.metrics.add_stage("copy", "hash", time.perf_counter() - start)
+                self.digests.append((offset, n, digest))
+                if not self._dispatch((offset, n, index, segments, digest)):
+                    break
+        except BaseException as e:
+            self._error = e
+        finally:
+            self._finish_dispatch()
+
+    def _checkpoint(self, target: CopyTarget) -> None:
+        """Synchronise la destination puis valide dans le journal les plages écrites depuis le dernier point."""
+        if target.zero_writer is not None:
+            target.zero_writer.flush()
+        self._sync(target.fd)
+        target.journal.commit()
+        target.last_checkpoint = time.monotonic()
+
+    def _sync(self, fd: int) -> None:
+        start = time.perf_counter()
+        os.fdatasync(fd)
+        if self.metrics is not None:
+            self.metrics.add_stage("copy", "fsync", time.perf_counter() - start)
+
+    def _write_chunk(self, target: CopyTarget, view: memoryview, offset: int) -> None:
+        if target.direct and len(view) % ALIGNMENT:
+            clear_direct(target.fd)
+            target.direct = False
+        target.io.write(target.fd, view, offset)
+
+    def _writer(self, target: CopyTarget, buffers: list) -> None:
+        fd = target.fd
+        zero_writer = target.zero_writer
+        known = self.known_digests.get(target.path)
+        try:
+            while target.active:
+                waited = time.perf_counter()
+                item = self._get(target.queue)
+                if self.metrics is not None:
+                    # File vide : la lecture (ou le calcul des empreintes) ne suit pas.
+                    self.metrics.add_stage("copy", "queue_wait", time.perf_counter() - waited)
+                if item is None:
+                    break
+                offset, n, index, segments, digest = item
+                try:
+                    if not target.active:
+                        continue
+                    if known is not None and known.get(offset) == (n, digest):
+                        target.bytes_unchanged += n
+                    elif segments is None or zero_writer is None:
+                        self._write_chunk(target, buffers[index][:n], offset)
+                    else:
+                        for start, length, zero in segments:
+                            if zero:
+                                zero_writer.zero(offset + start, length)
+                            else:
+                                zero_writer.flush()
+                                self._write_chunk(target, buffers[index][start:start + length], offset + start)
+                    target.bytes_written += n
+                finally:
+                    self._release(index)
+                if target.journal is not None:
+                    target.journal.record(offset, n)
+                    if time.monotonic() - target.last_checkpoint >= self.checkpoint_interval:
+                        self._checkpoint(target)
+                self._notify(target)
+                self._update_progress()
+                if self._should_stop():
+                    break
+            if target.active and target.journal is not None:
+                # Même après une annulation, ce qui a été écrit est validé pour permettre la reprise.
+                self._checkpoint(target)
+            elif target.active and self._error is None and not self._cancelled.is_set():
+                if zero_writer is not None:
+                    zero_writer.flush()
+                self._sync(fd)
+        except Exception as e:
+            if len(self.targets) == 1:
+                self._error = e
+                self._cancelled.set()
+            else:
+                self._drop(target, "failed", e)
+
+    def _update_progress(self) -> None:
+        active = [t.bytes_written for t in self.targets if t.active]
+        self.bytes_copied = min(active) if active else 0
+        if self.progress_callback:
+            self.progress_callback(self.bytes_copied, self.total)
+
+    def _open_targets(self, source_size: int, required: int) -> None:
+        """Ouvre les destinations ; un disque plus petit que la source suffit si les plages copiées y tiennent."""
+        for path in self.dests:
+            fd, direct = open_device(path, os.O_WRONLY | os.O_CREAT, self.direct)
+            try:
+                dest_size = os.lseek(fd, 0, os.SEEK_END)
+                is_block = stat.S_ISBLK(os.fstat(fd).st_mode)
+                if is_block and dest_size < required:
+                    raise IOError(f"La destination {path} ({dest_size} octets) est plus petite que la zone à copier ({required} octets)")
+                zero_writer = None
+                journal = self.journals.get(path)
+                if path in self.zero_dests:
+                    zero_writer = ZeroWriter(fd, path)
+                    # En reprise ou en incrémental, un discard global effacerait les blocs déjà en place.
+                    if (journal is None or not journal.done) and path not in self.known_digests:
+                        zero_writer.discard_all(min(source_size, dest_size) if is_block else source_size)
+            except BaseException:
+                os.close(fd)
+                raise
+            target = CopyTarget(path, fd, direct, self.buffer_count, zero_writer, journal)
+            target.io = make_io(self.io_backend, self.queue_depth, metrics=self.metrics)
+            self.targets.append(target)
+
+    def run(self) -> dict:
+        """Copie la source (ou seulement les plages demandées) sur chaque destination et retourne les statistiques."""
+        source_size = get_device_size(self.source)
+        if self.ranges is None:
+            ranges = [(0, source_size)]
+        else:
+            ranges = align_ranges(self.ranges, source_size)
+        self.total = sum(length for _, length in ranges)
+        src_fd, src_direct = open_device(self.source, os.O_RDONLY, self.direct)
+        src_io = make_io(self.io_backend, self.queue_depth, self.limiter, self._should_stop, self.metrics)
+        try:
+            self._open_targets(source_size, max((offset + length for offset, length in ranges), default=0))
+            if self.metrics is not None:
+                self.metrics.set_streams("copy", "write", len(self.targets))
+            log_info(f"Copie native : {self.source} -> {', '.join(self.dests)}, {self.total} octets en {len(ranges)} plage(s), "
+                     f"blocs de {self.block_size // 1024} Kio x {self.buffer_count}, "
+                     f"E/S {self.io_backend} (profondeur {src_io.depth}), "
+                     f"O_DIRECT lecture={src_direct} écriture={[t.direct for t in self.targets]}")
+            # Un tampon de plus par destination : un écrivain bloqué dans un appel système n'affame pas le pool.
+            buffer_total = self.buffer_count + len(self.targets)
+            buffers = [memoryview(mmap.mmap(-1, self.block_size)) for _ in range(buffer_total)]
+            self._refs = [0] * buffer_total
+            for index in range(buffer_total):
+                self._free.put(index)
+            start = time.monotonic()
+            threads = []
+            if self.hash_chunks:
+                hashed: queue.Queue = queue.Queue()
+                threads.append(threading.Thread(target=self._reader, args=(src_fd, ranges, buffers, hashed, src_io), daemon=True))
+                threads.append(threading.Thread(target=self._hasher, args=(buffers, hashed), daemon=True))
+            else:
+                threads.append(threading.Thread(target=self._reader, args=(src_fd, ranges, buffers, None, src_io), daemon=True))
+            for target in self.targets:
+                target.thread = threading.Thread(target=self._writer, args=(target, buffers), daemon=True)
+            for thread in threads:
+                thread.start()
+            for target in self.targets:
+                target.thread.start()
+            for target in self.targets:
+                while target.thread.is_alive():
+                    target.thread.join(timeout=0.5)
+                    if not target.active:
+                        break
+            self._cancelled.set()
+            for thread in threads:
+                thread.join()
+            duration = time.monotonic() - start
+            if self._error is not None:
+                raise self._error
+            if self.stop_flag and self.stop_flag():
+                raise KeyboardInterrupt("Opération annulée par l’utilisateur")
+            for target in self.targets:
+                if not target.active:
+                    continue
+                target.status = "ok"
+                file_size = source_size if self.dest_size is None else self.dest_size
+                if stat.S_ISREG(os.fstat(target.fd).st_mode) and os.fstat(target.fd).st_size < file_size:
+                    os.ftruncate(target.fd, file_size)
+                if target.zero_writer is not None:
+                    self.bytes_zero = max(self.bytes_zero, target.zero_writer.bytes_skipped)
+                    log_info(f"Blocs nuls non écrits sur {target.path} : {target.zero_writer.bytes_skipped} octets")
+                self._notify(target)
+            return {"bytes_copied": max(t.bytes_written for t in self.targets), "total": self.total,
+                    "duration": duration, "bytes_zero": self.bytes_zero, "digests": self.digests,
+                    "targets": {t.path: t.result() for t in self.targets}}
+        finally:
+            src_io.close()
+            os.close(src_fd)
+            for target in self.targets:
+                if target.thread is None or not target.thread.is_alive():
+                    target.io.close()
+                    os.close(target.fd)
@@ -0,0 +1,286 @@
+import os
+import re
+import struct
+from typing import Optional
+
+from log_handler import log_info, log_warning
+from partitions import read_partition_table
+from copy_engine import merge_ranges
+
+EXT_MAGIC = 0xEF53
+EXT_INCOMPAT_META_BG = 0x10
+EXT_INCOMPAT_64BIT = 0x80
+EXT_RO_COMPAT_SPARSE_SUPER = 0x1
+EXT_COMPAT_SPARSE_SUPER2 = 0x200
+EXT_BG_BLOCK_UNINIT = 0x2
+
+NONZERO_BYTES = re.compile(rb"[^\x00]+")
+ZERO_WORDS = re.compile(rb"(?:\x00\x00\x00\x00)+")
+ZERO_HALFWORDS = re.compile(rb"(?:\x00\x00)+")
+
+def _bitmap_ranges(bitmap: bytes, unit: int, base: int = 0) -> list[tuple[int, int]]:
+    """Convertit un bitmap d'allocation en plages, à la granularité de l'octet (8 unités, par excès)."""
+    return [(base + m.start() * 8 * unit, (m.end() - m.start()) * 8 * unit)
+            for m in NONZERO_BYTES.finditer(bitmap)]
+
+def _table_used_ranges(table: bytes, entry_size: int, first_entry: int, count: int,
+                       unit: int, base: int) -> list[tuple[int, int]]:
+    """Plages occupées d'après une FAT : toute entrée non nulle est considérée comme utilisée."""
+    pattern = ZERO_WORDS if entry_size == 4 else ZERO_HALFWORDS
+    end_entry = first_entry + count
+    used = []
+    cursor = first_entry
+    for m in pattern.finditer(table, first_entry * entry_size, end_entry * entry_size):
+        free_start = -(-m.start() // entry_size)
+        free_end = m.end() // entry_size
+        if free_end <= free_start:
+            continue
+        if free_start > cursor:
+            used.append((cursor, free_start - cursor))
+        cursor = max(cursor, free_end)
+    if cursor < end_entry:
+        used.append((cursor, end_entry - cursor))
+    return [(base + (entry - first_entry) * unit, n * unit) for entry, n in used]
+
+def _ext_has_backup(group: int, sparse_super: bool, sparse_super2: Optional[tuple[int, int]]) -> bool:
+    if group == 0:
+        return True
+    if sparse_super2 is not None:
+        return group in sparse_super2
+    if not sparse_super or group == 1:
+        return True
+    for base in (3, 5, 7):
+        n = base
+        while n < group:
+            n *= base
+        if n == group:
+            return True
+    return False
+
+def ext_used_ranges(fd: int, offset: int, size: int) -> Optional[list[tuple[int, int]]]:
+    """Plages allouées d'un système de fichiers ext2/3/4 (bitmaps de blocs, métadonnées et tables d'inodes)."""
+    sb = os.pread(fd, 1024, offset + 1024)
+    if len(sb) < 1024 or struct.unpack_from("<H", sb, 0x38)[0] != EXT_MAGIC:
+        return None
+    blocks_lo, = struct.unpack_from("<I", sb, 0x04)
+    first_data_block, log_block_size = struct.unpack_from("<II", sb, 0x14)
+    blocks_per_group, = struct.unpack_from("<I", sb, 0x20)
+    inodes_per_group, = struct.unpack_from("<I", sb, 0x28)
+    inode_size, = struct.unpack_from("<H", sb, 0x58)
+    compat, incompat, ro_compat = struct.unpack_from("<III", sb, 0x5C)
+    reserved_gdt, = struct.unpack_from("<H", sb, 0xCE)
+    if incompat & EXT_INCOMPAT_META_BG:
+        log_warning("ext4 avec meta_bg non pris en charge, copie brute de la partition")
+        return None
+    block_size = 1024 << log_block_size
+    blocks_count = blocks_lo
+    desc_size = 32
+    if incompat & EXT_INCOMPAT_64BIT:
+        blocks_count |= struct.unpack_from("<I", sb, 0x150)[0] << 32
+        desc_size = struct.unpack_from("<H", sb, 0xFE)[0] or 64
+    sparse_super2 = None
+    if compat & EXT_COMPAT_SPARSE_SUPER2:
+        sparse_super2 = struct.unpack_from("<II", sb, 0x24C)
+    if blocks_count * block_size > size or not blocks_per_group:
+        return None
+    group_count = -(-(blocks_count - first_data_block) // blocks_per_group)
+    gdt_blocks = -(-(group_count * desc_size) // block_size)
+    gdt = os.pread(fd, gdt_blocks * block_size, offset + (first_data_block + 1) * block_size)
+    itable_blocks = -(-(inodes_per_group * inode_size) // block_size)
+
+    used = [(0, (first_data_block + 1 + gdt_blocks + reserved_gdt) * block_size)]
+    for group in range(group_count):
+        desc = gdt[group * desc_size:(group + 1) * desc_size]
+        block_bitmap, inode_bitmap, inode_table = struct.unpack_from("<III", desc, 0)
+        flags, = struct.unpack_from("<H", desc, 0x12)
+        if desc_size >= 64:
+            hi = struct.unpack_from("<III", desc, 0x20)
+            block_bitmap |= hi[0] << 32
+            inode_bitmap |= hi[1] << 32
+            inode_table |= hi[2] << 32
+        group_start = first_data_block + group * blocks_per_group
+        group_blocks = min(blocks_per_group, blocks_count - group_start)
+        used.append((block_bitmap * block_size, block_size))
+        used.append((inode_bitmap * block_size, block_size))
+        used.append((inode_table * block_size, itable_blocks * block_size))
+        if flags & EXT_BG_BLOCK_UNINIT:
+            if _ext_has_backup(group, bool(ro_compat & EXT_RO_COMPAT_SPARSE_SUPER), sparse_super2):
+                used.append((group_start * block_size, (1 + gdt_blocks + reserved_gdt) * block_size))
+            continue
+        bitmap = os.pread(fd, block_size, offset + block_bitmap * block_size)
+        bitmap = bitmap[:-(-group_blocks // 8)]
+        used.extend(_bitmap_ranges(bitmap, block_size, group_start * block_size))
+    return used
+
+def fat_used_ranges(fd: int, offset: int, size: int) -> Optional[list[tuple[int, int]]]:
+    """Plages allouées d'un système de fichiers FAT16 ou FAT32 (zone réservée, FAT, racine et clusters utilisés)."""
+    boot = os.pread(fd, 512, offset)
+    if len(boot) < 512 or boot[510:512] != b"\x55\xaa":
+        return None
+    bytes_per_sector, sectors_per_cluster, reserved_sectors, num_fats, root_entries, total16 = \
+        struct.unpack_from("<HBHBHH", boot, 11)
+    fat_size16, = struct.unpack_from("<H", boot, 22)
+    total32, fat_size32 = struct.unpack_from("<II", boot, 32)
+    if bytes_per_sector not in (512, 1024, 2048, 4096) or not sectors_per_cluster or not num_fats:
+        return None
+    fat_size = fat_size16 or fat_size32
+    total_sectors = total16 or total32
+    root_sectors = -(-(root_entries * 32) // bytes_per_sector)
+    data_start = reserved_sectors + num_fats * fat_size + root_sectors
+    cluster_count = (total_sectors - data_start) // sectors_per_cluster
+    if fat_size16 == 0 and boot[82:90] == b"FAT32   ":
+        entry_size = 4
+    elif boot[54:62] == b"FAT16   " or (4085 <= cluster_count < 65525):
+        entry_size = 2
+    else:
+        return None
+    if total_sectors * bytes_per_sector > size or cluster_count <= 0:
+        return None
+    cluster_size = sectors_per_cluster * bytes_per_sector
+    fat = os.pread(fd, fat_size * bytes_per_sector, offset + reserved_sectors * bytes_per_sector)
+    used = [(0, data_start * bytes_per_sector)]
+    used.extend(_table_used_ranges(fat, entry_size, 2, cluster_count, cluster_size,
+                                   data_start * bytes_per_sector))
+    return used
+
+def _ntfs_apply_fixups(record: bytearray, sector_size: int) -> bool:
+    usa_offset, usa_count = struct.unpack_from("<HH", record, 4)
+    usn = record[usa_offset:usa_offset + 2]
+    for i in range(1, usa_count):
+        end = i * sector_size
+        if end > len(record) or record[end - 2:end] != usn:
+            return False
+        record[end - 2:end] = record[usa_offset + 2 * i:usa_offset + 2 * i + 2]
+    return True
+
+def _ntfs_runlist(data: bytes, pos: int) -> list[tuple[Optional[int], int]]:
+    runs = []
+    lcn = 0
+    while pos < len(data) and data[pos]:
+        header = data[pos]
+        len_size, off_size = header & 0x0F, header >> 4
+        pos += 1
+        run_length = int.from_bytes(data[pos:pos + len_size], "little")
+        pos += len_size
+        if off_size:
+            lcn += int.from_bytes(data[pos:pos + off_size], "little", signed=True)
+            runs.append((lcn, run_length))
+        else:
+            runs.append((None, run_length))
+        pos += off_size
+    return runs
+
+def ntfs_used_ranges(fd: int, offset: int, size: int) -> Optional[list[tuple[int, int]]]:
+    """Plages allouées d'un système de fichiers NTFS d'après le fichier $Bitmap."""
+    boot = os.pread(fd, 512, offset)
+    if len(boot) < 512 or boot[3:11] != b"NTFS    ":
+        return None
+    bytes_per_sector, spc = struct.unpack_from("<HB", boot, 11)
+    total_sectors, mft_lcn = struct.unpack_from("<QQ", boot, 40)
+    clusters_per_record = struct.unpack_from("<b", boot, 64)[0]
+    sectors_per_cluster = 1 << (256 - spc) if spc > 128 else spc
+    cluster_size = bytes_per_sector * sectors_per_cluster
+    if clusters_per_record > 0:
+        record_size = clusters_per_record * cluster_size
+    else:
+        record_size = 1 << -clusters_per_record
+    record = bytearray(os.pread(fd, record_size, offset + mft_lcn * cluster_size + 6 * record_size))
+    if record[:4] != b"FILE" or not _ntfs_apply_fixups(record, 512):
+        return None
+    pos, = struct.unpack_from("<H", record, 20)
+    bitmap = None
+    while pos + 16 <= len(record):
+        attr_type, attr_len = struct.unpack_from("<II", record, pos)
+        if attr_type == 0xFFFFFFFF or attr_len == 0:
+            break
+        if attr_type == 0x80 and record[pos + 9] == 0 and record[pos + 8]:
+            runlist_offset, = struct.unpack_from("<H", record, pos + 32)
+            data_size, = struct.unpack_from("<Q", record, pos + 48)
+            chunks = []
+            for lcn, run_length in _ntfs_runlist(bytes(record[pos:pos + attr_len]), runlist_offset):
+                if lcn is None:
+                    chunks.append(bytes(run_length * cluster_size))
+                else:
+                    chunks.append(os.pread(fd, run_length * cluster_size, offset + lcn * cluster_size))
+            bitmap = b"".join(chunks)[:data_size]
+            break
+        pos += attr_len
+    if bitmap is None:
+        return None
+    cluster_count = total_sectors // sectors_per_cluster
+    bitmap = bitmap[:-(-cluster_count // 8)]
+    used = [(0, cluster_size), (size - bytes_per_sector, bytes_per_sector)]
+    used.extend(_bitmap_ranges(bitmap, cluster_size))
+    return used
+
+def detect_filesystem(fd: int, offset: int) -> Optional[str]:
+    """Identifie le contenu d'une partition à partir de ses signatures."""
+    head = os.pread(fd, 4096, offset)
+    if head[:6] == b"LUKS\xba\xbe":
+        return "luks"
+    if head[3:11] == b"-FVE-FS-":
+        return "bitlocker"
+    if head[3:11] == b"NTFS    ":
+        return "ntfs"
+    if len(head) >= 1082 and struct.unpack_from("<H", head, 1080)[0] == EXT_MAGIC:
+        return "ext"
+    if head[82:90] == b"FAT32   " or head[54:62] == b"FAT16   ":
+        return "fat"
+    if head[4086:4096] in (b"SWAPSPACE2", b"SWAP-SPACE"):
+        return "swap"
+    return None
+
+USED_RANGE_PARSERS = {
+    "ext": ext_used_ranges,
+    "fat": fat_used_ranges,
+    "ntfs": ntfs_used_ranges,
+}
+
+def partition_used_ranges(fd: int, offset: int, size: int) -> tuple[Optional[str], list[tuple[int, int]]]:
+    """Plages à copier pour une partition, relatives au début du disque. Copie brute si le contenu est inconnu."""
+    fs_type = detect_filesystem(fd, offset)
+    if fs_type == "swap":
+        return fs_type, [(offset, 4096)]
+    parser = USED_RANGE_PARSERS.get(fs_type)
+    ranges = None
+    if parser is not None:
+        try:
+            ranges = parser(fd, offset, size)
+        except (struct.error, IndexError, ValueError, OSError) as e:
+            log_warning(f"Analyse {fs_type} impossible à l’offset {offset} : {e}")
+            ranges = None
+    if ranges is None:
+        return fs_type, [(offset, size)]
+    clipped = []
+    for start, length in ranges:
+        end = min(start + length, size)
+        if start < end:
+            clipped.append((offset + start, end - start))
+    return fs_type, merge_ranges(clipped)
+
+def get_used_ranges(device: str) -> Optional[list[tuple[int, int]]]:
+    """Construit la liste des plages utilisées d'un disque : tables, zones hors partitions et blocs alloués."""
+    table = read_partition_table(device)
+    if table is None:
+        return None
+    disk_size = table["disk_size"]
+    fd = os.open(device, os.O_RDONLY)
+    try:
+        ranges = []
+        cursor = 0
+        for part in sorted(table["partitions"], key=lambda p: p["start"]):
+            if part["start"] > cursor:
+                ranges.append((cursor, part["start"] - cursor))
+            size = min(part["size"], disk_size - part["start"])
+            if size <= 0:
+                continue
+            fs_type, part_ranges = partition_used_ranges(fd, part["start"], size)
+            used = sum(length for _, length in part_ranges)
+            log_info(f"Partition {part['number']} ({fs_type or 'inconnu'}) : {used} / {size} octets à copier")
+            ranges.extend(part_ranges)
+            cursor = max(cursor, part["start"] + size)
+        if cursor < disk_size:
+            ranges.append((cursor, disk_size - cursor))
+        return merge_ranges(ranges)
+    finally:
+        os.close(fd)
@@ -0,0 +1,1061 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+import subprocess
+import queue
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+from typing import Optional, Dict, List, Set
+from subprocess import CalledProcessError, TimeoutExpired
+
+from utils import get_base_disk
+from inventory import DiskInventory
+from hotplug import HotplugWatcher
+from clone_job import CloneJob, find_resumable
+from progress import ProgressTracker, format_bytes
+from copy_engine import DEFAULT_QUEUE_DEPTH
+from verify_engine import DEFAULT_SAMPLES, DEFAULT_WORKERS, VERIFY_METHODS, describe_sampling
+from image import IMAGE_EXTENSION, DEFAULT_CODEC, read_index, is_image
+from image_store import MANIFEST_EXTENSION, read_manifest, is_manifest
+from partitions import read_partition_table
+from io_limits import IO_PRIORITIES
+from history import degradation_report, describe_device, describe_finding, describe_prediction, predict_duration, verify_level
+from scheduler import JobScheduler
+from log_handler import log_info, log_error
+
+UI_POLL_MS = 100
+MAX_LOG_LINES = 2000
+
+class DiskClonerGUI:
+    def __init__(self, root: tk.Tk) -> None:
+        self.root = root
+        self.root.title("Clonage Disque Sécurisé")
+        self.root.geometry("800x600")
+        self.root.attributes("-fullscreen", True)
+
+        self.source_disk_var = tk.StringVar()
+        self.dest_disk_var = tk.StringVar()
+        self.clone_method_var = tk.StringVar(value="full")
+        self.verify_clone_var = tk.BooleanVar(value=True)
+        self.verify_sampling_var = tk.BooleanVar(value=False)
+        self.verify_samples_var = tk.IntVar(value=DEFAULT_SAMPLES)
+        self.copy_engine_var = tk.StringVar(value="native")
+        self.direct_io_var = tk.BooleanVar(value=False)
+        self.skip_zeros_var = tk.BooleanVar(value=True)
+        self.calibrate_io_var = tk.BooleanVar(value=False)
+        self.io_backend_var = tk.StringVar(value="auto")
+        self.queue_depth_var = tk.IntVar(value=DEFAULT_QUEUE_DEPTH)
+        self.io_priority_var = tk.StringVar(value="normal")
+        self.rate_limit_var = tk.DoubleVar(value=0)
+        self.verify_workers_var = tk.IntVar(value=DEFAULT_WORKERS)
+        self.verify_method_var = tk.StringVar(value="compare")
+
+        self.inventory = DiskInventory()
+        self.ui_queue: queue.Queue = queue.Queue()
+        self.ui_lock = threading.Lock()
+        self.pending_vars: Dict[int, tuple] = {}
+        self.log_line_count = 0
+        self.hotplug: Optional[HotplugWatcher] = None
+        self.disks: List[Dict[str, str]] = []
+        self.active_disks: Set[str] = set()
+        self.is_cloning = False
+        self.current_job: Optional[CloneJob] = None
+        # Disques du clonage principal, libérés seulement à la fin de clone_disk_thread : après un arrêt demandé,
+        # la copie peut encore écrire un moment alors que is_cloning est déjà faux.
+        self.main_devices: Set[str] = set()
+        self.queue_progress: Dict[int, int] = {}
+        self.scheduler = JobScheduler(status_callback=self.on_queue_status, busy_devices=lambda: self.main_devices)
+        self.dest_devices: List[str] = []
+        self.target_rows: Dict[str, tuple] = {}
+        self.source_image: Optional[str] = None
+        self.dest_image: Optional[str] = None
+
+        if os.geteuid() != 0:
+            messagebox.showerror("Erreur", "Ce programme doit être lancé en tant que root !")
+            root.destroy()
+            sys.exit(1)
+
+        self.create_widgets()
+        self.update_log("Recherche des disques...")
+        self.show_disks(self.inventory.refresh())
+        self.hotplug = HotplugWatcher(self.on_hotplug)
+        self.hotplug.start()
+        self.root.after(UI_POLL_MS, self.process_ui_events)
+
+    def create_widgets(self) -> None:
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        title_label = ttk.Label(main_frame, text="Clonage Disque Sécurisé", font=("Arial", 16, "bold"))
+        title_label.pack(pady=10)
+
+        selection_frame = ttk.Frame(main_frame)
+        selection_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+
+        source_frame = ttk.LabelFrame(selection_frame, text="Disque Source (Cloner depuis)")
+        source_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
+
+        source_list_frame = ttk.Frame(source_frame)
+        source_list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        self.source_listbox = tk.Listbox(source_list_frame, selectmode=tk.SINGLE, height=8)
+        source_scrollbar = ttk.Scrollbar(source_list_frame, orient=tk.VERTICAL, command=self.source_listbox.yview)
+        self.source_listbox.configure(yscrollcommand=source_scrollbar.set)
+        self.source_listbox.bind('<ButtonRelease-1>', self.on_source_select)
+        self.source_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        source_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.source_info_var = tk.StringVar(value="Aucun disque source sélectionné")
+        source_info_label = ttk.Label(source_frame, textvariable=self.source_info_var,
+            wraplength=300, justify=tk.LEFT)
+        source_info_label.pack(pady=5)
+        ttk.Button(source_frame, text="Restaurer depuis une image...",
+            command=self.choose_source_image).pack(pady=2)
+
+        dest_frame = ttk.LabelFrame(selection_frame, text="Disque(s) Destination (Cloner vers, sélection multiple)")
+        dest_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5)
+
+        dest_list_frame = ttk.Frame(dest_frame)
+        dest_list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        self.dest_listbox = tk.Listbox(dest_list_frame, selectmode=tk.MULTIPLE, height=8)
+        dest_scrollbar = ttk.Scrollbar(dest_list_frame, orient=tk.VERTICAL, command=self.dest_listbox.yview)
+        self.dest_listbox.configure(yscrollcommand=dest_scrollbar.set)
+        self.dest_listbox.bind('<ButtonRelease-1>', self.on_dest_select)
+        self.dest_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        dest_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.dest_info_var = tk.StringVar(value="Aucun disque de destination sélectionné")
+        dest_info_label = ttk.Label(dest_frame, textvariable=self.dest_info_var,
+            wraplength=300, justify=tk.LEFT)
+        dest_info_label.pack(pady=5)
+        ttk.Button(dest_frame, text="Enregistrer vers une image...",
+            command=self.choose_dest_image).pack(pady=2)
+
+        self.source_warning_var = tk.StringVar()
+        source_warning_label = ttk.Label(source_frame, textvariable=self.source_warning_var,
+            foreground="red", wraplength=300)
+        source_warning_label.pack(pady=2)
+        self.dest_warning_var = tk.StringVar()
+        dest_warning_label = ttk.Label(dest_frame, textvariable=self.dest_warning_var,
+            foreground="red", wraplength=300)
+        dest_warning_label.pack(pady=2)
+
+        options_frame = ttk.LabelFrame(main_frame, text="Options de clonage")
+        options_frame.pack(fill=tk.X, pady=10)
+
+        method_frame = ttk.Frame(options_frame)
+        method_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(method_frame, text="Méthode de clonage :").pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(method_frame, text="Clonage Complet (bit-à-bit)",
+                value="full", variable=self.clone_method_var).pack(side=tk.LEFT, padx=10)
+        ttk.Radiobutton(method_frame, text="Clonage Intelligent (seulement les secteurs utilisés)",
+                value="smart", variable=self.clone_method_var).pack(side=tk.LEFT, padx=10)
+        ttk.Radiobutton(method_frame, text="Sauvetage (source avec secteurs défectueux)",
+                value="rescue", variable=self.clone_method_var).pack(side=tk.LEFT, padx=10)
+        ttk.Radiobutton(method_frame, text="Rafraîchissement incrémental (blocs modifiés seulement)",
+                value="incremental", variable=self.clone_method_var).pack(side=tk.LEFT, padx=10)
+        ttk.Radiobutton(method_frame, text="Partitions choisies (sans l’espace non alloué)",
+                value="partitions", variable=self.clone_method_var).pack(side=tk.LEFT, padx=10)
+
+        engine_frame = ttk.Frame(options_frame)
+        engine_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(engine_frame, text="Moteur de copie :").pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(engine_frame, text="Natif (lecture et écriture en parallèle)",
+                value="native", variable=self.copy_engine_var).pack(side=tk.LEFT, padx=10)
+        ttk.Radiobutton(engine_frame, text="dd (secours)",
+                value="dd", variable=self.copy_engine_var).pack(side=tk.LEFT, padx=10)
+        ttk.Checkbutton(engine_frame, text="E/S directes (O_DIRECT)",
+            variable=self.direct_io_var).pack(side=tk.LEFT, padx=10)
+        ttk.Checkbutton(engine_frame, text="Discard des blocs nuls sur SSD",
+            variable=self.skip_zeros_var).pack(side=tk.LEFT, padx=10)
+        ttk.Checkbutton(engine_frame, text="Calibrer les E/S (lecture d’essai)",
+            variable=self.calibrate_io_var).pack(side=tk.LEFT, padx=10)
+
+        io_frame = ttk.Frame(options_frame)
+        io_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(io_frame, text="Entrées/sorties :").pack(side=tk.LEFT, padx=5)
+        ttk.Radiobutton(io_frame, text="Automatique (file profonde entre SSD)",
+                value="auto", variable=self.io_backend_var).pack(side=tk.LEFT, padx=10)
+        ttk.Radiobutton(io_frame, text="Classique (une requête à la fois)",
+                value="sync", variable=self.io_backend_var).pack(side=tk.LEFT, padx=10)
+        ttk.Radiobutton(io_frame, text="File profonde (NVMe)",
+                value="deep", variable=self.io_backend_var).pack(side=tk.LEFT, padx=10)
+        ttk.Label(io_frame, text="Profondeur :").pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Spinbox(io_frame, from_=1, to=128, width=4,
+            textvariable=self.queue_depth_var).pack(side=tk.LEFT)
+
+        limits_frame = ttk.Frame(options_frame)
+        limits_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Label(limits_frame, text="Priorité d’E/S :").pack(side=tk.LEFT, padx=5)
+        ttk.Combobox(limits_frame, values=IO_PRIORITIES, width=12, state="readonly",
+            textvariable=self.io_priority_var).pack(side=tk.LEFT)
+        ttk.Label(limits_frame, text="Débit max (Mo/s, 0 = illimité) :").pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Spinbox(limits_frame, from_=0, to=10000, increment=10, width=6,
+            textvariable=self.rate_limit_var).pack(side=tk.LEFT)
+        ttk.Button(limits_frame, text="Appliquer pendant la copie",
+            command=self.apply_rate_limit).pack(side=tk.LEFT, padx=10)
+
+        verify_frame = ttk.Frame(options_frame)
+        verify_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Checkbutton(verify_frame, text="Vérifier le clone après la fin",
+            variable=self.verify_clone_var).pack(side=tk.LEFT, padx=5)
+        ttk.Checkbutton(verify_frame, text="Par échantillonnage",
+            variable=self.verify_sampling_var).pack(side=tk.LEFT, padx=5)
+        ttk.Label(verify_frame, text="Tranches de 1 Mio :").pack(side=tk.LEFT, padx=(5, 5))
+        ttk.Spinbox(verify_frame, from_=10, to=100000, increment=100, width=7,
+            textvariable=self.verify_samples_var).pack(side=tk.LEFT)
+        ttk.Label(verify_frame, text="Threads :").pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Spinbox(verify_frame, from_=1, to=64, width=4,
+            textvariable=self.verify_workers_var).pack(side=tk.LEFT)
+        ttk.Label(verify_frame, text="Comparaison :").pack(side=tk.LEFT, padx=(20, 5))
+        ttk.Combobox(verify_frame, values=VERIFY_METHODS, width=10, state="readonly",
+            textvariable=self.verify_method_var).pack(side=tk.LEFT)
+
+        control_frame = ttk.Frame(options_frame)
+        control_frame.pack(fill=tk.X, padx=10, pady=10)
+
+        ttk.Button(control_frame, text="Rafraîchir les disques",
+            command=self.refresh_disks).pack(side=tk.LEFT, padx=5)
+        self.start_button = ttk.Button(control_frame, text="Démarrer le clonage",
+            command=self.start_clone)
+        self.start_button.pack(side=tk.LEFT, padx=5)
+        self.verify_button = ttk.Button(control_frame, text="Vérifier sans cloner",
+            command=self.start_verify)
+        self.verify_button.pack(side=tk.LEFT, padx=5)
+        self.stop_button = ttk.Button(control_frame, text="Arrêter le clonage",
+            command=self.stop_clone, state=tk.DISABLED)
+        self.stop_button.pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Ajouter à la file",
+            command=self.queue_clone).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Historique des débits",
+            command=self.show_history_report).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Quitter le mode plein écran",
+            command=self.toggle_fullscreen).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(control_frame, text="Quitter",
+            command=self.exit_application).pack(side=tk.RIGHT, padx=5)
+
+        progress_frame = ttk.LabelFrame(main_frame, text="Progression")
+        progress_frame.pack(fill=tk.X, pady=10)
+        self.progress_var = tk.DoubleVar()
+        self.progress = ttk.Progressbar(progress_frame, variable=self.progress_var,
+            maximum=100, mode='determinate')
+        self.progress.pack(fill=tk.X, padx=10, pady=5)
+        self.status_var = tk.StringVar(value="Prêt")
+        status_label = ttk.Label(progress_frame, textvariable=self.status_var)
+        status_label.pack(pady=5)
+        self.rate_var = tk.StringVar(value="")
+        rate_label = ttk.Label(progress_frame, textvariable=self.rate_var)
+        rate_label.pack(pady=2)
+        self.targets_frame = ttk.Frame(progress_frame)
+        self.targets_frame.pack(fill=tk.X, padx=10)
+
+        queue_frame = ttk.LabelFrame(main_frame, text="File de travaux (en parallèle)")
+        queue_frame.pack(fill=tk.X, pady=10)
+        columns = ("travail", "source", "destinations", "etat", "progression")
+        self.queue_tree = ttk.Treeview(queue_frame, columns=columns, show="headings", height=4)
+        for column, title, width in zip(columns, ("N°", "Source", "Destination(s)", "État", "Progression"),
+                                        (40, 150, 250, 100, 90)):
+            self.queue_tree.heading(column, text=title)
+            self.queue_tree.column(column, width=width)
+        self.queue_tree.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5, pady=5)
+        ttk.Button(queue_frame, text="Annuler le travail sélectionné",
+            command=self.cancel_queued).pack(side=tk.RIGHT, padx=5)
+
+        log_frame = ttk.LabelFrame(main_frame, text="Journal")
+        log_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        self.log_text = tk.Text(log_frame, height=8, wrap=tk.WORD)
+        log_scrollbar = ttk.Scrollbar(log_frame, command=self.log_text.yview)
+        self.log_text.configure(yscrollcommand=log_scrollbar.set)
+        self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
+        log_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.root.protocol("WM_DELETE_WINDOW", self.exit_application)
+
+    def refresh_disks(self) -> None:
+        """Relance l'inventaire complet dans un thread : la fenêtre reste réactive pendant l'interrogation des disques."""
+        self.update_log("Rafraîchissement de la liste des disques...")
+        threading.Thread(target=lambda: self.ui_call(self.show_disks, self.inventory.refresh()), daemon=True).start()
+
+    def show_disks(self, disks: List[Dict[str, str]]) -> None:
+        self.source_listbox.delete(0, tk.END)
+        self.dest_listbox.delete(0, tk.END)
+        self.source_disk_var.set("")
+        self.dest_disk_var.set("")
+        self.dest_devices = []
+        self.source_image = None
+        self.dest_image = None
+
+        self.active_disks = self.inventory.active_disks()
+        if self.active_disks:
+            log_info(f"Disques actifs détectés : {self.active_disks}")
+        self.disks = [disk for disk in disks if self.insert_disk_row(tk.END, disk)]
+
+        self.update_disk_warnings()
+        self.update_source_dest_info()
+        self.update_log(f"{len(self.disks)} disque(s) trouvé(s)" if self.disks else "Aucun disque trouvé.")
+
+    def insert_disk_row(self, index, disk: Dict[str, str]) -> bool:
+        """Ajoute la ligne d'un disque à la position `index` des deux listes. Renvoie False si ses infos sont illisibles."""
+        device_name = disk['device'].replace('/dev/', '')
+        base_device = get_base_disk(device_name)
+        try:
+            disk_serial = self.inventory.serial(device_name)
+            is_device_ssd = self.inventory.is_ssd(device_name)
+            ssd_indicator = " (Électronique)" if is_device_ssd else " (Mécanique)"
+            is_active = base_device in self.active_disks
+            active_indicator = " [ACTIF - INDISPONIBLE]" if is_active else ""
+            disk_info = f"{disk_serial}{ssd_indicator} - {disk['size']}{active_indicator}"
+            self.source_listbox.insert(index, disk_info)
+            if is_active:
+                self.source_listbox.itemconfig(index, {'fg': 'red'})
+            self.dest_listbox.insert(index, disk_info)
+            if is_active:
+                self.dest_listbox.itemconfig(index, {'fg': 'red'})
+            return True
+        except (OSError, IOError) as e:
+            self.update_log(f"Erreur d'E/S lors de la récupération des infos pour {device_name} : {str(e)}")
+        except (CalledProcessError, subprocess.SubprocessError) as e:
+            self.update_log(f"Erreur de commande lors de la récupération des infos pour {device_name} : {str(e)}")
+        except (ValueError, TypeError) as e:
+            self.update_log(f"Erreur de données lors de la récupération des infos pour {device_name} : {str(e)}")
+        except FileNotFoundError as e:
+            self.update_log(f"Fichier introuvable pour {device_name} : {str(e)}")
+        except PermissionError as e:
+            self.update_log(f"Problème de permission pour {device_name} : {str(e)}")
+        return False
+
+    def update_disk_warnings(self) -> None:
+        if not self.disks:
+            self.source_warning_var.set("Aucun disque disponible")
+            self.dest_warning_var.set("Aucun disque disponible")
+        elif self.active_disks:
+            warning_msg = f"ATTENTION : Les disques système actifs ({', '.join(sorted(self.active_disks))}) ne peuvent pas être sélectionnés"
+            self.source_warning_var.set(warning_msg)
+            self.dest_warning_var.set(warning_msg)
+        else:
+            self.source_warning_var.set("")
+            self.dest_warning_var.set("")
+
+    def on_hotplug(self, action: str, name: str) -> None:
+        """Appelé depuis le thread de surveillance : met à jour l'inventaire et transmet le changement à l'interface."""
+        if action == "remove":
+            if self.inventory.forget(name):
+                self.ui_call(self.apply_disk_event, self.remove_disk_row, f"/dev/{name}")
+        else:
+            disk = self.inventory.probe(name)
+            if disk is not None:
+                self.ui_call(self.apply_disk_event, self.add_disk_row, disk)
+
+    def apply_disk_event(self, handler, payload) -> None:
+        """Applique un changement signalé en ne touchant qu'aux lignes concernées des deux listes."""
+        self.active_disks = self.inventory.active_disks()
+        handler(payload)
+        self.update_disk_warnings()
+
+    def add_disk_row(self, disk: Dict[str, str]) -> None:
+        device = disk['device']
+        index = next((i for i, d in enumerate(self.disks) if d['device'] == device), None)
+        if index is None:
+            if self.insert_disk_row(tk.END, disk):
+                self.disks.append(disk)
+                self.update_log(f"Disque branché : {device} ({disk['size']})")
+            return
+        # Disque déjà listé (changement de support ou de table de partitions) : seule sa ligne est réécrite.
+        self.source_listbox.delete(index)
+        self.dest_listbox.delete(index)
+        if not self.insert_disk_row(index, disk):
+            del self.disks[index]
+            return
+        self.disks[index] = disk
+        if device == self.source_disk_var.get():
+            self.source_listbox.selection_set(index)
+            self.update_dest_availability()
+        elif device in self.dest_devices:
+            self.dest_listbox.selection_set(index)
+
+    def remove_disk_row(self, device: str) -> None:
+        index = next((i for i, d in enumerate(self.disks) if d['device'] == device), None)
+        if index is None:
+            return
+        self.source_listbox.delete(index)
+        self.dest_listbox.delete(index)
+        del self.disks[index]
+        selected = device == self.source_disk_var.get() or device in self.dest_devices
+        if selected and self.is_cloning:
+            self.update_log(f"ATTENTION : {device} a été débranché pendant l’opération en cours")
+            return
+        self.update_log(f"Disque débranché : {device}")
+        if device == self.source_disk_var.get():
+            self.source_disk_var.set("")
+        if device in self.dest_devices:
+            self.dest_devices.remove(device)
+            self.dest_disk_var.set(", ".join(self.dest_devices))
+        if selected:
+            self.update_source_dest_info()
+
+    def on_source_select(self, event) -> None:
+        selection = self.source_listbox.curselection()
+        if selection:
+            index = selection[0]
+            if index < len(self.disks):
+                disk = self.disks[index]
+                device_name = disk['device'].replace('/dev/', '')
+                base_device = get_base_disk(device_name)
+                if base_device in self.active_disks:
+                    messagebox.showwarning("Sélection invalide", "Impossible de sélectionner un disque système actif comme source !")
+                    self.source_listbox.selection_clear(0, tk.END)
+                    return
+                self.source_image = None
+                self.source_disk_var.set(disk['device'])
+                self.update_source_dest_info()
+                self.update_dest_availability()
+
+    def on_dest_select(self, event) -> None:
+        selected = []
+        for index in self.dest_listbox.curselection():
+            if index >= len(self.disks):
+                continue
+            disk = self.disks[index]
+            device_name = disk['device'].replace('/dev/', '')
+            base_device = get_base_disk(device_name)
+            if base_device in self.active_disks:
+                messagebox.showwarning("Sélection invalide", "Impossible de sélectionner un disque système actif comme destination !")
+                self.dest_listbox.selection_clear(index)
+                continue
+            if disk['device'] == self.source_disk_var.get():
+                messagebox.showwarning("Sélection invalide", "La source et la destination ne peuvent pas être le même disque !")
+                self.dest_listbox.selection_clear(index)
+                continue
+            selected.append(disk['device'])
+        self.dest_image = None
+        self.dest_devices = selected
+        self.dest_disk_var.set(", ".join(selected))
+        self.update_source_dest_info()
+
+    def choose_source_image(self) -> None:
+        path = filedialog.askopenfilename(title="Choisir une image de disque",
+            filetypes=[("Images de disque", f"*{IMAGE_EXTENSION}"),
+                       ("Images du magasin dédupliqué", f"*{MANIFEST_EXTENSION}"), ("Tous les fichiers", "*")])
+        if not path:
+            return
+        if not is_image(path) and not is_manifest(path):
+            messagebox.showerror("Image invalide", f"{path} n’est pas une image de disque reconnue !")
+            return
+        self.source_image = path
+        self.source_disk_var.set(path)
+        self.source_listbox.selection_clear(0, tk.END)
+        self.update_source_dest_info()
+
+    def choose_dest_image(self) -> None:
+        path = filedialog.asksaveasfilename(title="Enregistrer l’image de disque",
+            defaultextension=IMAGE_EXTENSION, filetypes=[("Images de disque", f"*{IMAGE_EXTENSION}"),
+                ("Images du magasin dédupliqué (dossier partagé entre images)", f"*{MANIFEST_EXTENSION}")])
+        if not path:
+            return
+        self.dest_image = path
+        self.dest_devices = [path]
+        self.dest_disk_var.set(path)
+        self.dest_listbox.selection_clear(0, tk.END)
+        self.update_source_dest_info()
+
+    def image_entry(self, path: str) -> Optional[Dict[str, str]]:
+        """Décrit un fichier image sélectionné comme source ou destination, à la manière d'une entrée de get_disk_list."""
+        if path == self.source_image:
+            index = read_manifest(path) if is_manifest(path) else read_index(path)
+            return {"device": path, "size": format_bytes(index['source_size']), "model": "Image"}
+        if path == self.dest_image:
+            return {"device": path, "size": "fichier image", "model": "Image"}
+        return None
+
+    def describe_image(self, path: str) -> str:
+        try:
+            index = read_manifest(path) if is_manifest(path) else read_index(path)
+        except (OSError, IOError, ValueError) as e:
+            return f"Image : {path}\nIndex illisible : {str(e)}"
+        if is_manifest(path):
+            referenced = len({digest for _, _, digest in index['chunks'] if digest})
+            return (f"Image du magasin : {path}\nTaille d’origine : {format_bytes(index['source_size'])}\n"
+                    f"{referenced} bloc(s) référencé(s) ({index['codec']})")
+        stored = os.path.getsize(path)
+        return (f"Image : {path}\nTaille d’origine : {format_bytes(index['source_size'])}\n"
+                f"Taille compressée : {format_bytes(stored)} ({index['codec']}, {len(index['chunks'])} blocs)")
+
+    def update_dest_availability(self) -> None:
+        source_device = self.source_disk_var.get()
+        if not source_device:
+            return
+        for i, disk in enumerate(self.disks):
+            if disk['device'] == source_device:
+                current_text = self.dest_listbox.get(i)
+                if "[SOURCE - INDISPONIBLE]" not in current_text:
+                    new_text = current_text.replace("[ACTIF - INDISPONIBLE]", "").strip()
+                    new_text += " [SOURCE - INDISPONIBLE]"
+                    self.dest_listbox.delete(i)
+                    self.dest_listbox.insert(i, new_text)
+                    self.dest_listbox.itemconfig(i, {'fg': 'orange'})
+                if source_device in self.dest_devices:
+                    self.dest_listbox.selection_clear(i)
+                    self.dest_devices.remove(source_device)
+                    self.dest_disk_var.set(", ".join(self.dest_devices))
+                    self.update_source_dest_info()
+                break
+
+    def update_source_dest_info(self) -> None:
+        source_device = self.source_disk_var.get()
+        dest_device = self.dest_disk_var.get()
+        if source_device and source_device == self.source_image:
+            self.source_info_var.set(self.describe_image(source_device))
+        elif source_device:
+            source_disk = next((d for d in self.disks if d['device'] == source_device), None)
+            if source_disk:
+                device_name = source_device.replace('/dev/', '')
+                try:
+                    disk_serial = self.inventory.serial(device_name)
+                    is_device_ssd = self.inventory.is_ssd(device_name)
+                    disk_type = "SSD" if is_device_ssd else "HDD"
+                    info = f" Sélectionné : {disk_serial}\nType : {disk_type}\nTaille : {source_disk['size']}\nModèle : {source_disk['model']}"
+                    self.source_info_var.set(info)
+                except (OSError, IOError) as e:
+                    self.source_info_var.set(f"Sélectionné : {source_device}\nErreur d’E/S lors de la récupération des détails : {str(e)}")
+                except (CalledProcessError, subprocess.SubprocessError) as e:
+                    self.source_info_var.set(f"Sélectionné : {source_device}\nErreur de commande lors de la récupération des détails : {str(e)}")
+                except (ValueError, TypeError) as e:
+                    self.source_info_var.set(f"Sélectionné : {source_device}\nErreur de données lors de la récupération des détails : {str(e)}")
+                except FileNotFoundError as e:
+                    self.source_info_var.set(f"Sélectionné : {source_device}\nFichier introuvable : {str(e)}")
+                except PermissionError as e:
+                    self.source_info_var.set(f"Sélectionné : {source_device}\nPermission refusée : {str(e)}")
+            else:
+                self.source_info_var.set("Aucun disque source sélectionné")
+        else:
+            self.source_info_var.set("Aucun disque source sélectionné")
+        if len(self.dest_devices) > 1:
+            lines = [f"{len(self.dest_devices)} destinations sélectionnées :"]
+            for device in self.dest_devices:
+                disk = next((d for d in self.disks if d['device'] == device), None)
+                size = disk['size'] if disk else "?"
+                lines.append(f"{self.inventory.serial(device)} - {size}")
+            self.dest_info_var.set("\n".join(lines))
+        elif dest_device and dest_device == self.dest_image:
+            if is_manifest(dest_device):
+                self.dest_info_var.set(f"Image du magasin : {dest_device}\nSeuls les blocs absents du magasin seront écrits")
+            else:
+                self.dest_info_var.set(f"Fichier image : {dest_device}\nFormat : compressé par blocs ({DEFAULT_CODEC})")
+        elif dest_device:
+            dest_disk = next((d for d in self.disks if d['device'] == dest_device), None)
+            if dest_disk:
+                device_name = dest_device.replace('/dev/', '')
+                try:
+                    disk_serial = self.inventory.serial(device_name)
+                    is_device_ssd = self.inventory.is_ssd(device_name)
+                    disk_type = "SSD" if is_device_ssd else "HDD"
+                    info = f"Sélectionné : {disk_serial}\nType : {disk_type}\nTaille : {dest_disk['size']}\nModèle : {dest_disk['model']}"
+                    self.dest_info_var.set(info)
+                except (OSError, IOError) as e:
+                    self.dest_info_var.set(f"Sélectionné : {dest_device}\nErreur d’E/S lors de la récupération des détails : {str(e)}")
+                except (CalledProcessError, subprocess.SubprocessError) as e:
+                    self.dest_info_var.set(f"Sélectionné : {dest_device}\nErreur de commande lors de la récupération des détails : {str(e)}")
+                except (ValueError, TypeError) as e:
+                    self.dest_info_var.set(f"Sélectionné : {dest_device}\nErreur de données lors de la récupération des détails : {str(e)}")
+                except FileNotFoundError as e:
+                    self.dest_info_var.set(f"Sélectionné : {dest_device}\nFichier introuvable : {str(e)}")
+                except PermissionError as e:
+                    self.dest_info_var.set(f"Sélectionné : {dest_device}\nPermission refusée : {str(e)}")
+            else:
+                self.dest_info_var.set("Aucun disque de destination sélectionné")
+        else:
+            self.dest_info_var.set("Aucun disque de destination sélectionné")
+
+    def start_clone(self) -> None:
+        source_device = self.source_disk_var.get()
+        dest_devices = list(self.dest_devices)
+        job = self.prepare_clone(source_device, dest_devices)
+        if job is None:
+            return
+        self.start_main_job(job, dest_devices)
+
+    def queue_clone(self) -> None:
+        """Place le clonage sélectionné dans la file : il démarre dès que ses disques et leurs contrôleurs sont libres,
+        en parallèle du clonage principal et des autres travaux."""
+        holder: Dict[str, int] = {}
+        job = self.prepare_clone(self.source_disk_var.get(), list(self.dest_devices),
+                                 event_callback=lambda event: self.on_queue_job_event(holder.get('id'), event),
+                                 stop_flag=lambda: False)
+        if job is None:
+            return
+        holder['id'] = self.scheduler.submit(job)
+
+    def prepare_clone(self, source_device: str, dest_devices: List[str], event_callback=None,
+                      stop_flag=None) -> Optional[CloneJob]:
+        """Contrôles, confirmations et reprise éventuelle d'un clonage ; None si l'opérateur renonce."""
+        if not source_device or not dest_devices:
+            messagebox.showwarning("Sélection requise", "Veuillez sélectionner à la fois le disque source et le disque de destination !")
+            return None
+        if not self.check_devices_free([source_device] + dest_devices):
+            return None
+        partitions = None
+        if self.clone_method_var.get() == "partitions" and source_device != self.source_image:
+            partitions = self.ask_partitions(source_device)
+            if partitions is None:
+                return None
+        try:
+            job = self.create_job(source_device, dest_devices, partitions=partitions, event_callback=event_callback,
+                                  stop_flag=stop_flag)
+        except ValueError as e:
+            messagebox.showwarning("Sélection invalide", str(e))
+            return None
+        try:
+            source_disk = self.image_entry(source_device) or next((d for d in self.disks if d['device'] == source_device), None)
+        except (OSError, IOError, ValueError) as e:
+            messagebox.showerror("Image invalide", f"Impossible de lire l’index de l’image : {str(e)}")
+            return None
+        dest_disks = [self.image_entry(device) or next((d for d in self.disks if d['device'] == device), None)
+                      for device in dest_devices]
+        if not source_disk or not all(dest_disks):
+            messagebox.showerror("Erreur", "Impossible de trouver les informations du disque !")
+            return None
+        try:
+            source_serial = self.device_label(source_device)
+            dest_serials = [self.device_label(device) for device in dest_devices]
+        except (OSError, IOError, CalledProcessError, subprocess.SubprocessError,
+                FileNotFoundError, PermissionError):
+            source_serial = source_device
+            dest_serials = dest_devices
+
+        clone_method = {"full": "Clonage complet (bit-à-bit)",
+                        "smart": "Clonage intelligent (seulement les secteurs utilisés)",
+                        "rescue": "Sauvetage (secteurs défectueux tolérés)",
+                        "incremental": "Rafraîchissement incrémental (blocs modifiés seulement)",
+                        "partitions": f"Partitions {', '.join(map(str, job.partitions))} seulement"}[self.clone_method_var.get()]
+        verify_text = "avec vérification" if self.verify_clone_var.get() else "sans vérification"
+        if self.verify_clone_var.get() and job.verify_samples:
+            verify_text += f" par échantillonnage ({job.verify_samples} tranches)"
+        estimate = self.estimate_duration(job)
+        dest_lines = "\n".join(f"Destination : {serial} ({disk['size']})" for serial, disk in zip(dest_serials, dest_disks))
+        confirm_msg = (f"ATTENTION : Ceci va complètement écraser {len(dest_devices)} disque(s) de destination !\n\n"
+                       f"Source : {source_serial} ({source_disk['size']})\n"
+                       f"{dest_lines}\n\n"
+                       f"Méthode : {clone_method} {verify_text}\n"
+                       f"Durée estimée : {estimate}\n\n"
+                       f"TOUTES LES DONNÉES SUR LES DISQUES DE DESTINATION SERONT PERDUES !\n\n"
+                       f"Êtes-vous sûr de vouloir continuer ?")
+        if not messagebox.askyesno("Confirmer l’opération de clonage", confirm_msg):
+            return None
+        if not messagebox.askyesno("AVERTISSEMENT FINAL",
+                                   "Ceci est votre dernier avertissement !\n\n"
+                                   "Le(s) disque(s) de destination seront complètement écrasés.\n\n"
+                                   "Voulez-vous continuer ?"):
+            return None
+        resumable = {}
+        if job.method not in ("rescue", "incremental") and not job.source_image and not job.dest_image:
+            resumable = find_resumable(self.inventory, source_device, dest_devices)
+        if resumable:
+            details = "\n".join(f"{device} : {format_bytes(done)} déjà copiés" for device, done in resumable.items())
+            job.resume = messagebox.askyesno("Reprendre le clonage",
+                "Un clonage interrompu de cette source vers ces destinations a été trouvé :\n\n"
+                f"{details}\n\n"
+                "Voulez-vous reprendre la copie là où elle s’était arrêtée ?\n"
+                "(Non : recommencer depuis le début)")
+        return job
+
+    def estimate_duration(self, job: CloneJob) -> str:
+        """Durée prévue d'après l'historique des clonages comparables."""
+        try:
+            source = describe_device(self.inventory, job.source)
+            dests = [describe_device(self.inventory, device) for device in job.dests]
+        except (OSError, CalledProcessError, subprocess.SubprocessError):
+            return "inconnue"
+        prediction = predict_duration(source, dests, job.method, verify_level(job))
+        if prediction is None:
+            return "inconnue (aucun clonage comparable dans l’historique)"
+        return describe_prediction(prediction)
+
+    def show_history_report(self) -> None:
+        findings = degradation_report()
+        if not findings:
+            messagebox.showinfo("Historique des débits", "Aucun disque ni modèle n’a ralenti par rapport aux clonages précédents.")
+            return
+        messagebox.showwarning("Historique des débits", "Débits en baisse par rapport aux clonages précédents :\n\n"
+                               + "\n".join(describe_finding(finding) for finding in findings))
+
+    def check_devices_free(self, devices: List[str]) -> bool:
+        """Refuse un disque déjà utilisé par un travail de la file en cours d'exécution."""
+        busy = self.scheduler.running_devices()
+        used = [device for device in devices if os.path.realpath(device) in busy]
+        if used:
+            messagebox.showwarning("Disque occupé", "Ces disques sont utilisés par un travail en cours :\n\n"
+                                   + "\n".join(used))
+            return False
+        return True
+
+    def start_main_job(self, job: CloneJob, dest_devices: List[str]) -> None:
+        self.current_job = job
+        self.main_devices = {job.source} | set(job.dests)
+        self.is_cloning = True
+        self.start_button.configure(state=tk.DISABLED)
+        self.verify_button.configure(state=tk.DISABLED)
+        self.stop_button.configure(state=tk.NORMAL)
+        self.progress_var.set(0)
+        self.build_target_rows(dest_devices)
+        clone_thread = threading.Thread(target=self.clone_disk_thread, args=(job,), daemon=True)
+        clone_thread.start()
+
+    def device_label(self, device: str) -> str:
+        if device in (self.source_image, self.dest_image):
+            return device
+        return self.inventory.serial(device)
+
+    def build_target_rows(self, dest_devices: List[str]) -> None:
+        for child in self.targets_frame.winfo_children():
+            child.destroy()
+        self.target_rows = {}
+        if len(dest_devices) < 2:
+            return
+        for device in dest_devices:
+            row = ttk.Frame(self.targets_frame)
+            row.pack(fill=tk.X, pady=1)
+            ttk.Label(row, text=device, width=16).pack(side=tk.LEFT)
+            progress_var = tk.DoubleVar()
+            ttk.Progressbar(row, variable=progress_var, maximum=100,
+                mode='determinate').pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
+            status_var = tk.StringVar(value="En attente")
+            ttk.Label(row, textvariable=status_var, width=30).pack(side=tk.LEFT)
+            self.target_rows[device] = (progress_var, status_var)
+
+    def set_target_row(self, device: str, percent: Optional[float] = None, status: Optional[str] = None) -> None:
+        row = self.target_rows.get(device)
+        if row is None:
+            return
+        if percent is not None:
+            self.set_var(row[0], percent)
+        if status is not None:
+            self.set_var(row[1], status)
+
+    def start_verify(self) -> None:
+        source_device = self.source_disk_var.get()
+        dest_devices = list(self.dest_devices)
+        if not source_device or not dest_devices:
+            messagebox.showwarning("Sélection requise", "Veuillez sélectionner à la fois le disque source et le disque de destination !")
+            return
+        if not self.check_devices_free([source_device] + dest_devices):
+            return
+        try:
+            job = self.create_job(source_device, dest_devices, verify_only=True)
+        except ValueError as e:
+            messagebox.showwarning("Sélection invalide", str(e))
+            return
+        self.start_main_job(job, dest_devices)
+
+    def ask_partitions(self, source_device: str) -> Optional[List[int]]:
+        """Fenêtre de choix des partitions de la source à copier ; None si l'opérateur annule."""
+        try:
+            table = read_partition_table(source_device)
+        except OSError as e:
+            messagebox.showerror("Erreur", f"Impossible de lire la table de partitions : {str(e)}")
+            return None
+        if table is None or not table['partitions']:
+            messagebox.showwarning("Aucune partition", f"Aucune table de partitions reconnue sur {source_device}.")
+            return None
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Partitions à copier")
+        dialog.transient(self.root)
+        ttk.Label(dialog, text=f"Partitions de {source_device} ({table['scheme'].upper()}) à copier :").pack(padx=10, pady=5)
+        choices = []
+        for part in table['partitions']:
+            var = tk.BooleanVar(value=True)
+            label = f"{part['number']} : {part['name'] or part['type']} - {format_bytes(part['size'])}"
+            ttk.Checkbutton(dialog, text=label, variable=var).pack(anchor=tk.W, padx=20)
+            choices.append((part['number'], var))
+        selected: List[int] = []
+        def confirm() -> None:
+            selected.extend(number for number, var in choices if var.get())
+            dialog.destroy()
+        buttons = ttk.Frame(dialog)
+        buttons.pack(pady=10)
+        ttk.Button(buttons, text="Valider", command=confirm).pack(side=tk.LEFT, padx=5)
+        ttk.Button(buttons, text="Annuler", command=dialog.destroy).pack(side=tk.LEFT, padx=5)
+        dialog.grab_set()
+        self.root.wait_window(dialog)
+        return selected or None
+
+    def create_job(self, source_device: str, dest_devices: List[str], verify_only: bool = False,
+                   partitions: Optional[List[int]] = None, event_callback=None, stop_flag=None) -> CloneJob:
+        return CloneJob(source_device, dest_devices, method=self.clone_method_var.get(), partitions=partitions,
+                        verify=self.verify_clone_var.get(), verify_only=verify_only,
+                        image_dest=self.dest_image is not None and dest_devices == [self.dest_image],
+                        copy_engine=self.copy_engine_var.get(), direct=self.direct_io_var.get(),
+                        skip_zeros=self.skip_zeros_var.get(), calibrate=self.calibrate_io_var.get(),
+                        io_backend=self.io_backend_var.get(), queue_depth=self.queue_depth_var.get(),
+                        io_priority=self.io_priority_var.get(), rate_limit=self.rate_limit_var.get(),
+                        verify_workers=self.verify_workers_var.get(),
+                        verify_method=self.verify_method_var.get(), verify_samples=self.verify_samples(),
+                        inventory=self.inventory,
+                        event_callback=event_callback or self.on_job_event,
+                        stop_flag=stop_flag or (lambda: not self.is_cloning))
+
+    def verify_samples(self) -> int:
+        return max(1, self.verify_samples_var.get()) if self.verify_sampling_var.get() else 0
+
+    def on_queue_job_event(self, job_id: Optional[int], event: dict) -> None:
+        """Événements d'un travail de la file : journal préfixé et ligne de la file, sans toucher au clonage principal."""
+        kind = event['event']
+        if kind == "log":
+            self.update_log(f"[travail {job_id}] {event['message']}")
+        elif kind == "progress" and job_id is not None:
+            percent = int(event['percent'] or 0)
+            if self.queue_progress.get(job_id) != percent:
+                self.queue_progress[job_id] = percent
+                self.ui_call(self.set_queue_cell, job_id, "progression", f"{percent} %")
+        elif kind == "alert":
+            self.update_log(f"[travail {job_id}] {event['title']} : {event['message']}")
+
+    def on_queue_status(self, snapshot: dict) -> None:
+        self.ui_call(self.show_queue_row, snapshot)
+
+    def show_queue_row(self, snapshot: dict) -> None:
+        label = {"queued": "En attente", "running": "En cours", "ok": "Terminé", "failed": "ÉCHEC",
+                 "stopped": "Annulé", "error": "Erreur"}.get(snapshot['status'], snapshot['status'])
+        iid = str(snapshot['id'])
+        if self.queue_tree.exists(iid):
+            self.queue_tree.set(iid, "etat", label)
+            if snapshot['status'] == "ok":
+                self.queue_tree.set(iid, "progression", "100 %")
+        else:
+            self.queue_tree.insert("", tk.END, iid=iid, values=(snapshot['id'], snapshot['source'],
+                                                               ", ".join(snapshot['targets']), label, ""))
+        message = f"Travail {snapshot['id']} : {label}"
+        if snapshot['error']:
+            message += f" ({snapshot['error']})"
+        elif snapshot['result'] and snapshot['result']['failed']:
+            message += f" (destinations en échec : {', '.join(snapshot['result']['failed'])})"
+        self.update_log(message)
+
+    def set_queue_cell(self, job_id: int, column: str, value: str) -> None:
+        if self.queue_tree.exists(str(job_id)):
+            self.queue_tree.set(str(job_id), column, value)
+
+    def apply_rate_limit(self) -> None:
+        """Nouveau plafond de débit pour le clonage principal en cours et les travaux sélectionnés dans la file."""
+        try:
+            rate = self.rate_limit_var.get()
+            if rate < 0:
+                raise ValueError(rate)
+        except (tk.TclError, ValueError):
+            messagebox.showwarning("Valeur invalide", "Le débit maximal doit être un nombre positif de Mo/s.")
+            return
+        jobs = [self.current_job] if self.is_cloning and self.current_job is not None else []
+        jobs += [job for job in map(self.scheduler.job, map(int, self.queue_tree.selection())) if job is not None]
+        if not jobs:
+            self.update_log("Aucune opération en cours : le plafond s’appliquera aux prochains clonages")
+            return
+        for job in jobs:
+            job.set_rate_limit(rate)
+
+    def cancel_queued(self) -> None:
+        for iid in self.queue_tree.selection():
+            if messagebox.askyesno("Annuler le travail", f"Annuler le travail {iid} ?\n\n"
+                                   "Un clonage déjà commencé laissera ses destinations incomplètes."):
+                self.scheduler.cancel(int(iid))
+
+    def on_job_event(self, event: dict) -> None:
+        """Traduit les événements d'un CloneJob (thread de travail) en mises à jour de l'interface."""
+        kind = event['event']
+        if kind == "log":
+            self.update_log(event['message'])
+        elif kind == "status":
+            self.set_var(self.status_var, event['message'])
+        elif kind == "progress":
+            self.set_var(self.progress_var, event['percent'])
+            self.set_var(self.rate_var, ProgressTracker.describe(event) if 'instant_rate' in event else "")
+        elif kind == "target":
+            self.set_target_row(event['device'], event['percent'], event['status'])
+        elif kind == "alert":
+            show = messagebox.showerror if event['level'] == "error" else messagebox.showwarning
+            self.ui_call(show, event['title'], event['message'])
+
+    def describe_sampling(self, result: dict) -> str:
+        """Couverture et confiance des vérifications par échantillonnage, pour le message de fin."""
+        lines = [f"{device} : {describe_sampling(target['sampling'])}"
+                 for device, target in result['targets'].items() if 'sampling' in target]
+        return "\n\nVérification par échantillonnage :\n" + "\n".join(lines) if lines else ""
+
+    def clone_disk_thread(self, job: CloneJob) -> None:
+        try:
+            result = job.run()
+            failed = result['failed']
+            if self.is_cloning and job.verify_only and failed:
+                self.set_var(self.status_var, "Vérification échouée - les disques diffèrent !")
+                self.ui_call(messagebox.showwarning, "Vérification échouée", "Échec de la vérification ! Les disques ne sont pas identiques :\n\n"
+                             + "\n".join(failed))
+            elif self.is_cloning and job.verify_only:
+                self.set_var(self.status_var, "Vérification terminée - les disques sont identiques")
+                self.ui_call(messagebox.showinfo, "Succès", "Vérification terminée : les disques sont identiques."
+                             + self.describe_sampling(result))
+            elif self.is_cloning and failed:
+                self.set_var(self.status_var, f"Clonage terminé avec {len(failed)} destination(s) en échec")
+                self.update_log(f"Clonage terminé, destinations en échec : {', '.join(failed)}")
+                self.ui_call(messagebox.showwarning, "Clonage partiel", "Les destinations suivantes ont échoué :\n\n" +
+                             "\n".join(f"{device} : {result['targets'][device].get('error') or result['targets'][device]['status']}"
+                                        for device in failed))
+            elif self.is_cloning:
+                self.set_var(self.status_var, "Opération de clonage terminée avec succès !")
+                self.update_log("Opération de clonage terminée avec succès !")
+                self.ui_call(messagebox.showinfo, "Succès", "Clonage du disque terminé avec succès !"
+                             + self.describe_sampling(result))
+        except (OSError, IOError) as e:
+            error_msg = f"Erreur d’E/S lors de l’opération de clonage : {str(e)}"
+            self.set_var(self.status_var, "Échec de l’opération de clonage - Erreur d’E/S !")
+            self.update_log(error_msg)
+            log_error(error_msg)
+            self.ui_call(messagebox.showerror, "Erreur d’E/S", error_msg)
+        except (CalledProcessError, subprocess.SubprocessError) as e:
+            error_msg = f"L’exécution de la commande a échoué lors du clonage : {str(e)}"
+            self.set_var(self.status_var, "Échec de l’opération de clonage - Erreur de commande !")
+            self.update_log(error_msg)
+            log_error(error_msg)
+            self.ui_call(messagebox.showerror, "Erreur de commande", error_msg)
+        except FileNotFoundError as e:
+            error_msg = f"Fichier ou commande introuvable requis : {str(e)}"
+            self.set_var(self.status_var, "Échec de l’opération de clonage - Fichier introuvable !")
+            self.update_log(error_msg)
+            log_error(error_msg)
+            self.ui_call(messagebox.showerror, "Fichier introuvable", error_msg)
+        except PermissionError as e:
+            error_msg = f"Permission refusée lors de l’opération de clonage : {str(e)}"
+            self.set_var(self.status_var, "Échec de l’opération de clonage - Permission refusée !")
+            self.update_log(error_msg)
+            log_error(error_msg)
+            self.ui_call(messagebox.showerror, "Erreur de permission", error_msg)
+        except TimeoutExpired as e:
+            error_msg = f"Délai dépassé pour l’opération de clonage : {str(e)}"
+            self.set_var(self.status_var, "Échec de l’opération de clonage - Délai dépassé !")
+            self.update_log(error_msg)
+            log_error(error_msg)
+            self.ui_call(messagebox.showerror, "Erreur de délai", error_msg)
+        except KeyboardInterrupt:
+            error_msg = "Opération de clonage interrompue par l’utilisateur"
+            self.set_var(self.status_var, "Opération de clonage interrompue !")
+            self.update_log(error_msg)
+            log_error(error_msg)
+            self.ui_call(messagebox.showwarning, "Interrompu", error_msg)
+        except MemoryError as e:
+            error_msg = f"Mémoire insuffisante pour l’opération de clonage : {str(e)}"
+            self.set_var(self.status_var, "Échec de l’opération de clonage - Erreur mémoire !")
+            self.update_log(error_msg)
+            log_error(error_msg)
+            self.ui_call(messagebox.showerror, "Erreur mémoire", error_msg)
+        finally:
+            self.is_cloning = False
+            self.current_job = None
+            self.main_devices = set()
+            # Les travaux de la file qui attendaient ces disques peuvent partir.
+            self.scheduler.schedule()
+            self.ui_call(self.start_button.configure, state=tk.NORMAL)
+            self.ui_call(self.verify_button.configure, state=tk.NORMAL)
+            self.ui_call(self.stop_button.configure, state=tk.DISABLED)
+            self.set_var(self.progress_var, 0)
+            self.set_var(self.rate_var, "")
+
+    def stop_clone(self) -> None:
+        if self.is_cloning:
+            if messagebox.askyesno("Confirmer l’arrêt",
+                "Voulez-vous vraiment arrêter l’opération de clonage ?\n\n"
+                "Cela laissera le disque de destination dans un état incomplet.\n"
+                "Le clonage pourra être repris plus tard avec le moteur natif."):
+                self.is_cloning = False
+                self.update_log("Opération de clonage arrêtée par l’utilisateur")
+                self.status_var.set("Opération de clonage arrêtée")
+
+    def toggle_fullscreen(self) -> None:
+        is_fullscreen = self.root.attributes("-fullscreen")
+        self.root.attributes("-fullscreen", not is_fullscreen)
+
+    def exit_application(self) -> None:
+        if self.is_cloning:
+            if not messagebox.askyesno("Clonage en cours",
+                                       "Une opération de clonage est en cours ... Voulez-vous vraiment quitter ?"):
+                return
+            self.is_cloning = False
+        if self.scheduler.active():
+            if not messagebox.askyesno("Travaux en file",
+                                       "Des travaux de la file sont en attente ou en cours ... Voulez-vous vraiment les annuler et quitter ?"):
+                return
+            self.scheduler.cancel_all()
+        if self.hotplug is not None:
+            self.hotplug.stop()
+        log_info("L’application de clonage de disque a été fermée par l'utilisateur")
+        self.root.destroy()
+
+    def on_ui_thread(self) -> bool:
+        return threading.current_thread() is threading.main_thread()
+
+    def ui_call(self, fn, *args, **kwargs) -> None:
+        """Exécute fn dans le thread Tk : tout de suite depuis celui-ci, sinon au prochain passage de process_ui_events."""
+        if self.on_ui_thread():
+            fn(*args, **kwargs)
+        else:
+            self.ui_queue.put((fn, args, kwargs))
+
+    def set_var(self, var: tk.Variable, value) -> None:
+        """Met à jour une variable Tk. Depuis un thread de travail, seule la dernière valeur est appliquée au prochain
+        passage : une copie rapide ne déclenche pas un rafraîchissement de l'écran par bloc copié."""
+        if self.on_ui_thread():
+            var.set(value)
+        else:
+            with self.ui_lock:
+                self.pending_vars[id(var)] = (var, value)
+
+    def process_ui_events(self) -> None:
+        """Vidé périodiquement par la boucle Tk : variables en attente, puis appels et lignes de journal dans leur ordre."""
+        with self.ui_lock:
+            pending, self.pending_vars = self.pending_vars, {}
+        for var, value in pending.values():
+            var.set(value)
+        lines: List[str] = []
+        try:
+            while True:
+                fn, args, kwargs = self.ui_queue.get_nowait()
+                if fn is None:
+                    lines.append(args[0])
+                    continue
+                if lines:
+                    self.append_log(lines)
+                    lines = []
+                fn(*args, **kwargs)
+        except queue.Empty:
+            pass
+        if lines:
+            self.append_log(lines)
+        self.root.after(UI_POLL_MS, self.process_ui_events)
+
+    def append_log(self, lines: List[str]) -> None:
+        self.log_text.insert(tk.END, "".join(lines))
+        self.log_line_count += len(lines)
+        if self.log_line_count > MAX_LOG_LINES:
+            # Seules les dernières lignes restent affichées ; le journal complet est dans le fichier de log.
+            self.log_text.delete("1.0", f"{self.log_line_count - MAX_LOG_LINES + 1}.0")
+            self.log_line_count = MAX_LOG_LINES
+        self.log_text.see(tk.END)
+
+    def update_log(self, message: str) -> None:
+        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+        log_message = f"[{timestamp}] {message}\n"
+        if self.on_ui_thread():
+            self.append_log([log_message])
+        else:
+            self.ui_queue.put((None, (log_message,), {}))
+
+def main():
+    if os.geteuid() != 0:
+        print("Ce programme doit être lancé en tant que root !")
+        sys.exit(1)
+    root = tk.Tk()
+    app = DiskClonerGUI(root)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main()
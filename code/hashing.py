@@ -0,0 +1,29 @@
+import hashlib
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+DIGEST_SIZE = 16
+HASH_METHODS = ("blake2b", "xxhash")
+
+_zero_digests: dict[int, bytes] = {}
+
+def chunk_digest(data) -> bytes:
+    """Empreinte BLAKE2b d'un bloc de données (libère le GIL pendant le calcul)."""
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).digest()
+
+def zero_digest(length: int) -> bytes:
+    """Empreinte d'un bloc nul de la longueur donnée, mise en cache."""
+    digest = _zero_digests.get(length)
+    if digest is None:
+        digest = chunk_digest(bytes(length))
+        _zero_digests[length] = digest
+    return digest
+
+def method_digest(method: str, data) -> bytes:
+    """Empreinte selon la méthode demandée ; xxhash (XXH3-128) si le module est installé, sinon BLAKE2b."""
+    if method == "xxhash" and xxhash is not None:
+        return xxhash.xxh3_128_digest(data)
+    return chunk_digest(data)
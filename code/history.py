@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import statistics
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+from copy_engine import get_device_size
+from progress import format_bytes, format_duration
+from log_handler import log_info, log_warning
+
+HISTORY_PATH = os.environ.get("CLONEUR_HISTORY", "/var/lib/cloneur_leger/historique.sqlite")
+MIN_EARLIER_RUNS = 2
+DEGRADATION_THRESHOLD = 0.25
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    finished REAL NOT NULL,
+    status TEXT NOT NULL,
+    method TEXT NOT NULL,
+    engine TEXT,
+    block_size INTEGER,
+    verified INTEGER NOT NULL, -- 0 : aucune, 1 : complète, 2 : par échantillonnage
+    verify_status TEXT,
+    source TEXT NOT NULL,
+    source_serial TEXT,
+    source_model TEXT,
+    source_size INTEGER,
+    source_ssd INTEGER,
+    dest TEXT NOT NULL,
+    dest_serial TEXT,
+    dest_model TEXT,
+    dest_size INTEGER,
+    dest_ssd INTEGER,
+    targets INTEGER NOT NULL,
+    bytes_copied INTEGER,
+    duration REAL NOT NULL,
+    avg_rate REAL,
+    p5_rate REAL,
+    p95_rate REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_pair ON jobs (source_serial, dest_serial, method);
+"""
+
+_lock = threading.Lock()
+
+@contextmanager
+def history_db():
+    """Connexion à la base, validée puis fermée en sortie ; les travaux parallèles y écrivent chacun leur tour."""
+    with _lock:
+        os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+        conn = sqlite3.connect(HISTORY_PATH, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                conn.executescript(SCHEMA)
+                yield conn
+        finally:
+            conn.close()
+
+def describe_device(inventory, path: str) -> dict:
+    """Numéro de série (get_disk_serial, via l'inventaire), modèle, taille et type d'un disque ; un fichier image
+    est désigné par son nom."""
+    try:
+        size = get_device_size(path)
+    except OSError:
+        size = None
+    if os.path.isfile(path) or not os.path.exists(path):
+        return {"serial": f"image:{os.path.basename(path)}", "model": "image", "size": size, "ssd": None}
+    disk = inventory.lookup(os.path.basename(os.path.realpath(path)))
+    return {"serial": inventory.serial(path), "model": disk['model'] if disk else None, "size": size,
+            "ssd": inventory.is_ssd(path)}
+
+def verify_level(job) -> int:
+    """Vérification demandée, telle qu'enregistrée dans la colonne « verified »."""
+    return 0 if not job.verify else 2 if job.verify_samples else 1
+
+def percentile(values: list[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def throughput_stats(samples: list[int]) -> tuple[Optional[float], Optional[float], Optional[float]]:
+    """Débit moyen, 5e et 95e centiles à partir des octets copiés à chaque seconde. La dernière seconde, incomplète,
+    est écartée des centiles."""
+    if not samples:
+        return None, None, None
+    full = samples[:-1] if len(samples) > 1 else samples
+    return sum(samples) / len(samples), percentile(full, 0.05), percentile(full, 0.95)
+
+def record_job(job, result: dict) -> list[dict]:
+    """Enregistre une opération terminée : une ligne par destination, pour prédire et comparer couple par couple.
+    Retourne les ralentissements (voir degradation_report) qui concernent ses disques."""
+    if job.verify_only:
+        return []
+    samples = job.metrics.samples.get("copy", [])
+    avg_rate, p5_rate, p95_rate = throughput_stats(samples)
+    duration = result['duration']
+    try:
+        source = describe_device(job.inventory, job.source)
+        rows = []
+        for dest in job.dests:
+            target = result['targets'].get(dest, {})
+            bytes_copied = target.get('bytes_written') or sum(samples) or None
+            dest_info = describe_device(job.inventory, dest)
+            verify_status = None
+            if job.verify:
+                verify_status = "failed" if target.get('status') == "verify_failed" else \
+                    "ok" if target.get('status') == "ok" else None
+            rows.append((time.time(), target.get('status', result['status']), job.method, job.copy_engine,
+                         job.used_block_size, verify_level(job), verify_status, job.source, source['serial'],
+                         source['model'], source['size'], source['ssd'], dest, dest_info['serial'],
+                         dest_info['model'], dest_info['size'], dest_info['ssd'], len(job.dests), bytes_copied,
+                         duration, avg_rate or (bytes_copied / duration if bytes_copied and duration else None),
+                         p5_rate, p95_rate))
+        with history_db() as conn:
+            conn.executemany("INSERT INTO jobs (finished, status, method, engine, block_size, verified, verify_status, "
+                             "source, source_serial, source_model, source_size, source_ssd, dest, dest_serial, "
+                             "dest_model, dest_size, dest_ssd, targets, bytes_copied, duration, avg_rate, p5_rate, "
+                             "p95_rate) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             rows)
+    except (OSError, sqlite3.Error) as e:
+        log_warning(f"Impossible d’enregistrer l’opération dans l’historique : {e}")
+        return []
+    log_info(f"Opération enregistrée dans l’historique ({len(rows)} destination(s))")
+    keys = {value for row in rows for value in (row[8], row[9], row[13], row[14]) if value}
+    return [finding for finding in degradation_report() if finding['key'] in keys]
+
+def predict_duration(source: dict, dests: list[dict], method: str, verify: int) -> Optional[dict]:
+    """Durée probable d'un clonage d'après les opérations réussies comparables, de la plus proche à la plus large :
+    même couple de disques, mêmes modèles, puis mêmes types (SSD/HDD). La durée par octet source est ramenée à la
+    taille actuelle ; avec plusieurs destinations, la plus lente l'emporte. `verify` est un verify_level.
+    Retourne {seconds, runs, basis}."""
+    if not source.get('size'):
+        return None
+    levels = (("source_serial", "dest_serial", "ce couple de disques"),
+              ("source_model", "dest_model", "ces modèles de disques"),
+              ("source_ssd", "dest_ssd", "ce type de disques"))
+    estimates = []
+    try:
+        with history_db() as conn:
+            for dest in dests:
+                for source_key, dest_key, basis in levels:
+                    value = source[source_key.split("_")[1]]
+                    dest_value = dest[dest_key.split("_")[1]]
+                    if value is None or dest_value is None:
+                        continue
+                    rows = conn.execute(f"SELECT duration, source_size FROM jobs WHERE status = 'ok' AND method = ? "
+                                        f"AND verified = ? AND {source_key} = ? AND {dest_key} = ? "
+                                        f"AND source_size > 0 ORDER BY finished DESC LIMIT 20",
+                                        (method, verify, value, dest_value)).fetchall()
+                    if rows:
+                        per_byte = statistics.median(row['duration'] / row['source_size'] for row in rows)
+                        estimates.append({"seconds": per_byte * source['size'], "runs": len(rows), "basis": basis})
+                        break
+    except (OSError, sqlite3.Error) as e:
+        log_warning(f"Historique illisible : {e}")
+        return None
+    if not estimates or len(estimates) < len(dests):
+        return None
+    return max(estimates, key=lambda estimate: estimate['seconds'])
+
+def degradation_report(threshold: float = DEGRADATION_THRESHOLD, min_runs: int = MIN_EARLIER_RUNS) -> list[dict]:
+    """Disques et modèles dont le dernier clonage réussi a été nettement plus lent que la médiane des précédents
+    (de plus de `threshold`), à méthode égale. Chaque disque est jugé comme source et comme destination."""
+    findings = []
+    try:
+        with history_db() as conn:
+            rows = conn.execute("SELECT * FROM jobs WHERE status = 'ok' AND avg_rate > 0 ORDER BY finished").fetchall()
+    except (OSError, sqlite3.Error) as e:
+        log_warning(f"Historique illisible : {e}")
+        return findings
+    for kind, role in (("disque", "serial"), ("modèle", "model")):
+        for side in ("source", "dest"):
+            groups: dict[tuple, list] = {}
+            for row in rows:
+                key = row[f"{side}_{role}"]
+                if key and not key.startswith("image:") and key != "image":
+                    groups.setdefault((key, row['method']), []).append(row)
+            for (key, method), runs in groups.items():
+                if len(runs) <= min_runs:
+                    continue
+                baseline = statistics.median(run['avg_rate'] for run in runs[:-1])
+                latest = runs[-1]['avg_rate']
+                if latest < baseline * (1 - threshold):
+                    findings.append({"kind": kind, "role": "source" if side == "source" else "destination",
+                                     "key": key, "method": method, "runs": len(runs), "baseline_rate": baseline,
+                                     "latest_rate": latest, "drop": 1 - latest / baseline,
+                                     "latest": runs[-1]['finished']})
+    return findings
+
+def describe_finding(finding: dict) -> str:
+    return (f"{finding['kind'].capitalize()} {finding['key']} ({finding['role']}, {finding['method']}) : "
+            f"{format_bytes(finding['latest_rate'])}/s au dernier clonage contre {format_bytes(finding['baseline_rate'])}/s "
+            f"habituellement (-{finding['drop'] * 100:.0f} %, {finding['runs']} clonages)")
+
+def describe_prediction(prediction: dict) -> str:
+    return f"{format_duration(prediction['seconds'])} (d’après {prediction['runs']} opération(s) sur {prediction['basis']})"
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Historique des clonages : liste et détection des ralentissements "
+                                                 "(base choisie par CLONEUR_HISTORY)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    list_parser = commands.add_parser("list", help="dernières opérations en JSON")
+    list_parser.add_argument("--limit", type=int, default=20)
+    report_parser = commands.add_parser("report", help="disques ou modèles devenus plus lents")
+    report_parser.add_argument("--threshold", type=float, default=DEGRADATION_THRESHOLD * 100,
+                               help="baisse de débit signalée, en %% de la médiane des opérations précédentes")
+    args = parser.parse_args()
+    if args.command == "list":
+        with history_db() as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY finished DESC LIMIT ?", (args.limit,)).fetchall()
+        print(json.dumps([dict(row) for row in rows], ensure_ascii=False, indent=2))
+        return
+    findings = degradation_report(args.threshold / 100)
+    for finding in findings:
+        print(describe_finding(finding))
+    if not findings:
+        print("Aucun ralentissement détecté")
+    sys.exit(1 if findings else 0)
+
+if __name__ == "__main__":
+    main()
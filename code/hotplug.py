@@ -0,0 +1,128 @@
+import os
+import socket
+import struct
+import threading
+from typing import Callable, Optional
+
+from log_handler import log_info, log_warning
+
+NETLINK_KOBJECT_UEVENT = 15
+KERNEL_EVENTS_GROUP = 1
+UDEV_EVENTS_GROUP = 2
+UDEV_PREFIX = b"libudev\0"
+UDEV_CONTROL = "/run/udev/control"
+UDEV_DATA_DIR = "/run/udev/data"
+UDEV_TIMEOUT = 5.0
+UDEV_POLL = 0.05
+DEFAULT_POLL_INTERVAL = 2.0
+SYS_BLOCK_DIR = "/sys/block"
+
+def parse_uevent(message: bytes) -> dict[str, str]:
+    """Décode un uevent : message du noyau (« action@devpath » suivi de champs CLÉ=valeur séparés par des octets nuls)
+    ou message de udev (en-tête « libudev », puis les mêmes champs à partir de properties_off)."""
+    fields = {}
+    if message.startswith(UDEV_PREFIX):
+        _, properties_off, properties_len = struct.unpack_from("=III", message, 12)
+        parts = message[properties_off:properties_off + properties_len].split(b"\0")
+    else:
+        parts = message.split(b"\0")[1:]
+    for part in parts:
+        key, sep, value = part.partition(b"=")
+        if sep:
+            fields[key.decode(errors="replace")] = value.decode(errors="replace")
+    return fields
+
+class HotplugWatcher:
+    """Surveille l'apparition et la disparition des disques dans un thread d'arrière-plan, via les événements netlink
+    de udev (émis une fois sa base renseignée), ceux du noyau sans udev, ou, à défaut, en scrutant /sys/block toutes
+    les `poll_interval` secondes.
+    `callback(action, nom)` est appelé depuis ce thread avec action valant "add", "remove" ou "change"."""
+
+    def __init__(self, callback: Callable[[str, str], None], poll_interval: float = DEFAULT_POLL_INTERVAL) -> None:
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.mode: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._socket: Optional[socket.socket] = None
+
+    def start(self) -> None:
+        try:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+            # udev ne relaie un événement qu'après avoir rempli sa base (numéro de série, modèle) : rien à attendre.
+            udev = os.path.exists(UDEV_CONTROL)
+            sock.bind((0, UDEV_EVENTS_GROUP if udev else KERNEL_EVENTS_GROUP))
+            sock.settimeout(0.5)
+            self._socket = sock
+            self.mode = "udev" if udev else "netlink"
+            target = self._watch_netlink
+        except (OSError, AttributeError) as e:
+            log_warning(f"Uevents netlink indisponibles ({e}), détection des disques par scrutation de {SYS_BLOCK_DIR}")
+            self.mode = "polling"
+            target = self._watch_polling
+        self._thread = threading.Thread(target=target, daemon=True)
+        self._thread.start()
+        log_info(f"Surveillance des branchements de disques démarrée ({self.mode})")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        if self._socket is not None:
+            self._socket.close()
+
+    def _emit(self, action: str, name: str) -> None:
+        try:
+            self.callback(action, name)
+        except Exception as e:
+            log_warning(f"Erreur lors du traitement de l’événement {action} pour {name} : {e}")
+
+    def _watch_netlink(self) -> None:
+        while not self._stop.is_set():
+            try:
+                message = self._socket.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError as e:
+                if not self._stop.is_set():
+                    log_warning(f"Lecture des uevents interrompue ({e}), passage à la scrutation")
+                    self.mode = "polling"
+                    self._watch_polling()
+                return
+            fields = parse_uevent(message)
+            if fields.get("SUBSYSTEM") != "block" or fields.get("DEVTYPE") != "disk":
+                continue
+            action = fields.get("ACTION")
+            name = fields.get("DEVNAME") or os.path.basename(fields.get("DEVPATH", ""))
+            if action in ("add", "remove", "change") and name:
+                if action != "remove" and self.mode == "netlink":
+                    self._wait_udev_data(fields)
+                self._emit(action, os.path.basename(name))
+
+    def _wait_udev_data(self, fields: dict[str, str]) -> None:
+        """Événement du noyau : attend, `UDEV_TIMEOUT` secondes au plus, que udev (lancé après nous, par exemple)
+        ait écrit l'entrée du disque dans sa base. Sans base udev, l'inventaire lira sysfs directement."""
+        if not os.path.isdir(UDEV_DATA_DIR) or "MAJOR" not in fields or "MINOR" not in fields:
+            return
+        path = os.path.join(UDEV_DATA_DIR, f"b{fields['MAJOR']}:{fields['MINOR']}")
+        waited = 0.0
+        while not os.path.exists(path) and waited < UDEV_TIMEOUT:
+            if self._stop.wait(UDEV_POLL):
+                return
+            waited += UDEV_POLL
+
+    def _watch_polling(self) -> None:
+        known = self._list_block_devices()
+        while not self._stop.wait(self.poll_interval):
+            current = self._list_block_devices()
+            for name in sorted(current - known):
+                self._emit("add", name)
+            for name in sorted(known - current):
+                self._emit("remove", name)
+            known = current
+
+    def _list_block_devices(self) -> set[str]:
+        try:
+            return set(os.listdir(SYS_BLOCK_DIR))
+        except OSError:
+            return set()
@@ -0,0 +1,301 @@
+import os
+import json
+import time
+import zlib
+import stat
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from log_handler import log_info
+from copy_engine import get_device_size, merge_ranges, read_full, write_full
+from hashing import chunk_digest
+from verify_engine import DEFAULT_WORKERS
+from zero_blocks import ZeroWriter, is_zero
+
+IMAGE_EXTENSION = ".climg"
+IMAGE_MAGIC = b"CLONEIMG"
+INDEX_MAGIC = b"CLONEIDX"
+IMAGE_VERSION = 1
+TRAILER = struct.Struct("<8sQQ")
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+DEFAULT_CODEC = "zstd" if zstandard is not None else "zlib"
+COMPRESSION_LEVELS = {"zstd": 3, "zlib": 1}
+KIND_ZERO, KIND_COMPRESSED, KIND_RAW = "z", "c", "r"
+
+_local = threading.local()
+
+def compress_chunk(codec: str, data, level: int) -> bytes:
+    if codec == "zstd":
+        # Les objets zstandard ne sont pas partagés entre threads : un compresseur par thread et par niveau.
+        compressors = getattr(_local, "compressors", None)
+        if compressors is None:
+            compressors = _local.compressors = {}
+        compressor = compressors.get((codec, level))
+        if compressor is None:
+            compressor = compressors[(codec, level)] = zstandard.ZstdCompressor(level=level)
+        return compressor.compress(data)
+    return zlib.compress(data, level)
+
+def decompress_chunk(codec: str, data: bytes, length: int) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise IOError("Image compressée avec zstd mais le module zstandard n’est pas installé")
+        decompressor = getattr(_local, "decompressor", None)
+        if decompressor is None:
+            decompressor = _local.decompressor = zstandard.ZstdDecompressor()
+        return decompressor.decompress(data, max_output_size=length)
+    return zlib.decompress(data)
+
+def decode_chunk(codec: str, kind: str, payload: bytes, length: int, digest: str) -> Optional[bytes]:
+    """Décompresse un bloc stocké ; None si son contenu ne correspond pas à l'empreinte enregistrée."""
+    if kind == KIND_ZERO:
+        data = bytes(length)
+    elif kind == KIND_RAW:
+        data = payload
+    else:
+        try:
+            data = decompress_chunk(codec, payload, length)
+        except zlib.error:
+            return None
+        except Exception as e:
+            if zstandard is not None and isinstance(e, zstandard.ZstdError):
+                return None
+            raise
+    if len(data) != length or chunk_digest(data).hex() != digest:
+        return None
+    return data
+
+def is_image(path: str) -> bool:
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(IMAGE_MAGIC)) == IMAGE_MAGIC
+    except OSError:
+        return False
+
+def read_index(path: str) -> dict:
+    """Lit l'index d'une image : taille d'origine, codec et liste des blocs
+    [offset, longueur, type, position dans l'image, taille stockée, empreinte]."""
+    with open(path, "rb") as f:
+        if f.read(len(IMAGE_MAGIC)) != IMAGE_MAGIC:
+            raise IOError(f"{path} n’est pas une image de disque reconnue")
+        f.seek(-TRAILER.size, os.SEEK_END)
+        magic, index_offset, index_length = TRAILER.unpack(f.read(TRAILER.size))
+        if magic != INDEX_MAGIC:
+            raise IOError(f"Image {path} incomplète ou corrompue (index absent)")
+        f.seek(index_offset)
+        index = json.loads(zlib.decompress(f.read(index_length)))
+    if index.get("version") != IMAGE_VERSION:
+        raise IOError(f"Version d’image non supportée : {index.get('version')}")
+    return index
+
+def image_digests(index: dict) -> list[tuple[int, int, bytes]]:
+    """Empreintes des blocs d'origine, au format attendu par verify_digests."""
+    return [(offset, length, bytes.fromhex(digest)) for offset, length, _, _, _, digest in index["chunks"]]
+
+def create_image(source: str, image_path: str, ranges: Optional[list[tuple[int, int]]] = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = DEFAULT_WORKERS,
+                 codec: str = DEFAULT_CODEC, level: Optional[int] = None,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 stop_flag: Optional[Callable[[], bool]] = None) -> dict:
+    """Écrit une image compressée de la source (ou des seules plages demandées) : un bloc par tâche de compression,
+    les blocs nuls ne sont pas stockés. L'image est écrite dans un fichier temporaire renommé à la fin."""
+    if codec == "zstd" and zstandard is None:
+        raise ValueError("Le module zstandard n’est pas installé")
+    level = COMPRESSION_LEVELS[codec] if level is None else level
+    source_size = get_device_size(source)
+    ranges = merge_ranges([(0, source_size)] if ranges is None else
+                          [(o, min(n, source_size - o)) for o, n in ranges if o < source_size])
+    total = sum(length for _, length in ranges)
+    chunks = []
+    done = 0
+    position = len(IMAGE_MAGIC)
+    part_path = image_path + ".part"
+
+    def encode(offset: int, data: bytearray) -> tuple:
+        view = memoryview(data)
+        digest = chunk_digest(view).hex()
+        if is_zero(view):
+            return offset, len(data), KIND_ZERO, b"", digest
+        payload = compress_chunk(codec, view, level)
+        if len(payload) >= len(data):
+            return offset, len(data), KIND_RAW, bytes(data), digest
+        return offset, len(data), KIND_COMPRESSED, payload, digest
+
+    def store(result: tuple) -> None:
+        nonlocal done, position
+        offset, length, kind, payload, digest = result
+        if payload:
+            write_full(out_fd, memoryview(payload), position)
+        chunks.append([offset, length, kind, position, len(payload), digest])
+        position += len(payload)
+        done += length
+        if progress_callback:
+            progress_callback(done, total)
+
+    start = time.monotonic()
+    src_fd = os.open(source, os.O_RDONLY)
+    out_fd = os.open(part_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        write_full(out_fd, memoryview(IMAGE_MAGIC), 0)
+        pending: deque = deque()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for range_offset, range_length in ranges:
+                offset = range_offset
+                end = range_offset + range_length
+                while offset < end:
+                    if stop_flag and stop_flag():
+                        raise KeyboardInterrupt("Opération annulée par l’utilisateur")
+                    n = min(chunk_size, end - offset)
+                    data = bytearray(n)
+                    if read_full(src_fd, memoryview(data), offset) != n:
+                        raise IOError(f"Fin inattendue de la source {source} à l’offset {offset}")
+                    pending.append(executor.submit(encode, offset, data))
+                    # Au plus deux blocs en attente par thread : la mémoire reste bornée.
+                    while len(pending) >= 2 * max(1, workers):
+                        store(pending.popleft().result())
+                    offset += n
+            while pending:
+                store(pending.popleft().result())
+        index = {"version": IMAGE_VERSION, "source": source, "source_size": source_size, "codec": codec,
+                 "chunk_size": chunk_size, "created": time.time(), "chunks": chunks}
+        index_data = zlib.compress(json.dumps(index).encode())
+        write_full(out_fd, memoryview(index_data), position)
+        write_full(out_fd, memoryview(TRAILER.pack(INDEX_MAGIC, position, len(index_data))),
+                   position + len(index_data))
+        os.fsync(out_fd)
+    except BaseException:
+        os.close(out_fd)
+        os.remove(part_path)
+        raise
+    finally:
+        os.close(src_fd)
+    os.close(out_fd)
+    os.replace(part_path, image_path)
+    duration = time.monotonic() - start
+    image_size = os.path.getsize(image_path)
+    log_info(f"Image {image_path} créée : {total} octets de {source} -> {image_size} octets "
+             f"({codec}, {len(chunks)} blocs, {duration:.1f} s)")
+    return {"bytes_read": total, "image_size": image_size, "ratio": image_size / total if total else 0.0,
+            "codec": codec, "duration": duration}
+
+def restore_image(image_path: str, dest, workers: int = DEFAULT_WORKERS, skip_zeros=False,
+                  progress_callback: Optional[Callable[[int, int], None]] = None,
+                  stop_flag: Optional[Callable[[], bool]] = None) -> dict:
+    """Restaure une image sur une ou plusieurs destinations : la décompression et l'écriture positionnelle de chaque
+    bloc sont réparties entre les threads, chaque bloc est contrôlé par son empreinte avant d'être écrit.
+    `skip_zeros` vaut True ou l'ensemble des destinations où les blocs nuls sont libérés par discard."""
+    dests = [dest] if isinstance(dest, str) else list(dest)
+    index = read_index(image_path)
+    codec = index["codec"]
+    source_size = index["source_size"]
+    chunks = index["chunks"]
+    total = sum(chunk[1] for chunk in chunks)
+    zero_dests = set(dests) if skip_zeros is True else set(skip_zeros or ())
+    done = 0
+    lock = threading.Lock()
+
+    def advance(length: int) -> None:
+        nonlocal done
+        with lock:
+            done += length
+            current = done
+        if progress_callback:
+            progress_callback(current, total)
+
+    def restore_chunk(chunk: list, payload: bytes) -> None:
+        offset, length, kind, _, _, digest = chunk
+        data = decode_chunk(codec, kind, payload, length, digest)
+        if data is None:
+            raise IOError(f"Bloc corrompu dans l’image {image_path} à l’offset {offset}")
+        for fd in fds:
+            write_full(fd, memoryview(data), offset)
+        advance(length)
+
+    start = time.monotonic()
+    image_fd = os.open(image_path, os.O_RDONLY)
+    fds = []
+    zero_writers = []
+    try:
+        for path in dests:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+            fds.append(fd)
+            dest_size = os.lseek(fd, 0, os.SEEK_END)
+            if stat.S_ISBLK(os.fstat(fd).st_mode) and dest_size < source_size:
+                raise IOError(f"La destination {path} ({dest_size} octets) est plus petite que l’image ({source_size} octets)")
+            zero_writer = ZeroWriter(fd, path)
+            if path in zero_dests:
+                zero_writer.discard_all(source_size)
+            zero_writers.append(zero_writer)
+        log_info(f"Restauration de {image_path} ({codec}, {len(chunks)} blocs) vers {', '.join(dests)}")
+        pending: deque = deque()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for chunk in chunks:
+                if stop_flag and stop_flag():
+                    raise KeyboardInterrupt("Opération annulée par l’utilisateur")
+                offset, length, kind, position, stored, _ = chunk
+                if kind == KIND_ZERO:
+                    for zero_writer in zero_writers:
+                        zero_writer.zero(offset, length)
+                    advance(length)
+                    continue
+                pending.append(executor.submit(restore_chunk, chunk, os.pread(image_fd, stored, position)))
+                while len(pending) >= 2 * max(1, workers):
+                    pending.popleft().result()
+            while pending:
+                pending.popleft().result()
+        for fd, zero_writer in zip(fds, zero_writers):
+            zero_writer.flush()
+            if stat.S_ISREG(os.fstat(fd).st_mode) and os.fstat(fd).st_size < source_size:
+                os.ftruncate(fd, source_size)
+            os.fdatasync(fd)
+    finally:
+        os.close(image_fd)
+        for fd in fds:
+            os.close(fd)
+    duration = time.monotonic() - start
+    log_info(f"Restauration terminée : {total} octets en {duration:.1f} s")
+    return {"bytes_restored": total, "duration": duration, "digests": image_digests(index),
+            "bytes_zero": sum(zero_writer.bytes_skipped for zero_writer in zero_writers) // max(1, len(dests))}
+
+def check_image(image_path: str, workers: int = DEFAULT_WORKERS,
+                progress_callback: Optional[Callable[[int, int], None]] = None,
+                stop_flag: Optional[Callable[[], bool]] = None) -> dict:
+    """Décompresse chaque bloc de l'image et le compare à son empreinte, sans rien écrire."""
+    index = read_index(image_path)
+    codec = index["codec"]
+    chunks = index["chunks"]
+    total = sum(chunk[1] for chunk in chunks)
+    done = 0
+    lock = threading.Lock()
+    fd = os.open(image_path, os.O_RDONLY)
+
+    def check(chunk: list) -> Optional[tuple[int, int]]:
+        nonlocal done
+        if stop_flag and stop_flag():
+            raise KeyboardInterrupt("Opération annulée par l’utilisateur")
+        offset, length, kind, position, stored, digest = chunk
+        ok = decode_chunk(codec, kind, os.pread(fd, stored, position), length, digest) is not None
+        with lock:
+            done += length
+            current = done
+        if progress_callback:
+            progress_callback(current, total)
+        return None if ok else (offset, length)
+
+    start = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            mismatches = [m for m in executor.map(check, chunks) if m is not None]
+    finally:
+        os.close(fd)
+    duration = time.monotonic() - start
+    log_info(f"Contrôle de l’image {image_path} : {total} octets, {len(mismatches)} bloc(s) corrompu(s)")
+    return {"checked": total, "mismatches": mismatches, "duration": duration}
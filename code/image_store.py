@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import stat
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from log_handler import log_info, log_warning
+from copy_engine import get_device_size, merge_ranges, read_full, write_full
+from hashing import chunk_digest
+from image import (DEFAULT_CODEC, COMPRESSION_LEVELS, KIND_COMPRESSED, KIND_RAW,
+                   compress_chunk, decode_chunk, zstandard)
+from verify_engine import DEFAULT_WORKERS
+from zero_blocks import ZeroWriter, is_zero
+
+MANIFEST_EXTENSION = ".clmanifest"
+MANIFEST_FORMAT = "cloneur-manifest"
+MANIFEST_VERSION = 1
+STORE_CHUNK_SIZE = 1024 * 1024
+CHUNKS_DIR = "chunks"
+# Un bloc peut servir à des manifestes de codecs différents : son premier octet indique comment le décoder.
+# Les blocs « c » des premiers magasins sont décodés avec le codec de leur manifeste.
+CHUNK_KINDS = {"zstd": "s", "zlib": "l"}
+KIND_CODECS = {kind: codec for codec, kind in CHUNK_KINDS.items()}
+
+def is_manifest(path: str) -> bool:
+    return path.endswith(MANIFEST_EXTENSION)
+
+def store_root(manifest_path: str) -> str:
+    """Le magasin est le dossier qui contient les manifestes et le sous-dossier des blocs."""
+    return os.path.dirname(os.path.abspath(manifest_path))
+
+def chunk_path(root: str, digest: str) -> str:
+    return os.path.join(root, CHUNKS_DIR, digest[:2], digest)
+
+def read_manifest(path: str) -> dict:
+    """Lit un manifeste : taille d'origine, codec et liste des blocs [offset, longueur, empreinte ou None si nul]."""
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != MANIFEST_FORMAT or manifest.get("version") != MANIFEST_VERSION:
+        raise IOError(f"{path} n’est pas un manifeste d’image reconnu")
+    return manifest
+
+def manifest_digests(manifest: dict) -> list[tuple[int, int, bytes]]:
+    """Empreintes des blocs d'origine, au format attendu par verify_digests."""
+    digests = []
+    for offset, length, digest in manifest["chunks"]:
+        digests.append((offset, length, bytes.fromhex(digest) if digest else chunk_digest(bytes(length))))
+    return digests
+
+def _fsync_dir(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def _existing_chunks(root: str) -> set[str]:
+    """Blocs présents dans le magasin. Un fichier vide ou réduit à son en-tête (laissé par une version qui ne
+    synchronisait pas les blocs) est ignoré, pour être réécrit ; le contenu n'est contrôlé que par check_manifest."""
+    existing = set()
+    base = os.path.join(root, CHUNKS_DIR)
+    if not os.path.isdir(base):
+        return existing
+    for prefix in os.scandir(base):
+        if prefix.is_dir():
+            existing.update(entry.name for entry in os.scandir(prefix.path)
+                            if not entry.name.endswith(".tmp") and entry.stat().st_size > 1)
+    return existing
+
+def capture(source: str, manifest_path: str, ranges: Optional[list[tuple[int, int]]] = None,
+            chunk_size: int = STORE_CHUNK_SIZE, workers: int = DEFAULT_WORKERS, codec: str = DEFAULT_CODEC,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
+            stop_flag: Optional[Callable[[], bool]] = None) -> dict:
+    """Capture la source dans le magasin du manifeste : chaque bloc est haché, seuls les blocs absents du magasin
+    sont compressés et écrits ; l'image elle-même n'est qu'une liste de références. Les nouveaux blocs sont
+    synchronisés sur le disque avant l'écriture du manifeste."""
+    if codec == "zstd" and zstandard is None:
+        raise ValueError("Le module zstandard n’est pas installé")
+    level = COMPRESSION_LEVELS[codec]
+    root = store_root(manifest_path)
+    source_size = get_device_size(source)
+    ranges = merge_ranges([(0, source_size)] if ranges is None else
+                          [(o, min(n, source_size - o)) for o, n in ranges if o < source_size])
+    total = sum(length for _, length in ranges)
+    existing = _existing_chunks(root)
+    claimed: set[str] = set()
+    written_dirs: set[str] = set()
+    lock = threading.Lock()
+    chunks = []
+    done = 0
+    stats = {"chunks_new": 0, "chunks_reused": 0, "chunks_zero": 0, "bytes_stored": 0}
+
+    def store(offset: int, data: bytearray) -> tuple:
+        view = memoryview(data)
+        if is_zero(view):
+            return offset, len(data), None, 0
+        digest = chunk_digest(view).hex()
+        with lock:
+            if digest in existing or digest in claimed:
+                return offset, len(data), digest, 0
+            claimed.add(digest)
+        payload = compress_chunk(codec, view, level)
+        kind = CHUNK_KINDS[codec]
+        if len(payload) >= len(data):
+            payload, kind = bytes(data), KIND_RAW
+        path = chunk_path(root, digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(kind.encode() + payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        with lock:
+            written_dirs.add(os.path.dirname(path))
+        return offset, len(data), digest, len(payload) + 1
+
+    def collect(result: tuple) -> None:
+        nonlocal done
+        offset, length, digest, stored = result
+        chunks.append([offset, length, digest])
+        if digest is None:
+            stats["chunks_zero"] += 1
+        elif stored:
+            stats["chunks_new"] += 1
+            stats["bytes_stored"] += stored
+        else:
+            stats["chunks_reused"] += 1
+        done += length
+        if progress_callback:
+            progress_callback(done, total)
+
+    start = time.monotonic()
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        pending: deque = deque()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for range_offset, range_length in ranges:
+                offset = range_offset
+                end = range_offset + range_length
+                while offset < end:
+                    if stop_flag and stop_flag():
+                        raise KeyboardInterrupt("Opération annulée par l’utilisateur")
+                    n = min(chunk_size, end - offset)
+                    data = bytearray(n)
+                    if read_full(src_fd, memoryview(data), offset) != n:
+                        raise IOError(f"Fin inattendue de la source {source} à l’offset {offset}")
+                    pending.append(executor.submit(store, offset, data))
+                    while len(pending) >= 2 * max(1, workers):
+                        collect(pending.popleft().result())
+                    offset += n
+            while pending:
+                collect(pending.popleft().result())
+    finally:
+        os.close(src_fd)
+    manifest = {"format": MANIFEST_FORMAT, "version": MANIFEST_VERSION, "source": source,
+                "source_size": source_size, "codec": codec, "chunk_size": chunk_size,
+                "created": time.time(), "chunks": chunks}
+    # Le manifeste n'est écrit qu'une fois tous ses blocs présents dans le magasin, renommages compris.
+    for path in written_dirs:
+        _fsync_dir(path)
+    if written_dirs:
+        _fsync_dir(os.path.join(root, CHUNKS_DIR))
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, manifest_path)
+    duration = time.monotonic() - start
+    log_info(f"Capture de {source} dans {root} : {stats['chunks_new']} bloc(s) nouveau(x), "
+             f"{stats['chunks_reused']} déjà présent(s), {stats['chunks_zero']} nul(s), "
+             f"{stats['bytes_stored']} octets ajoutés en {duration:.1f} s")
+    return dict(stats, bytes_read=total, duration=duration, codec=codec)
+
+def _load_chunk(root: str, codec: str, length: int, digest: Optional[str]) -> Optional[bytes]:
+    """Contenu d'un bloc du magasin, décodé avec le codec inscrit dans son en-tête (`codec`, celui du manifeste,
+    pour les blocs d'avant cet en-tête) ; None s'il manque ou ne correspond pas à son empreinte."""
+    if digest is None:
+        return bytes(length)
+    try:
+        with open(chunk_path(root, digest), "rb") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+    kind = content[:1].decode(errors="replace")
+    if kind in KIND_CODECS:
+        codec, kind = KIND_CODECS[kind], KIND_COMPRESSED
+    elif kind not in (KIND_COMPRESSED, KIND_RAW):
+        return None
+    if kind == KIND_COMPRESSED and codec == "zstd" and zstandard is None:
+        raise IOError(f"Le bloc {digest} est compressé en zstd mais le module zstandard n’est pas installé")
+    return decode_chunk(codec, kind, content[1:], length, digest)
+
+def restore_manifest(manifest_path: str, dest, workers: int = DEFAULT_WORKERS, skip_zeros=False,
+                     progress_callback: Optional[Callable[[int, int], None]] = None,
+                     stop_flag: Optional[Callable[[], bool]] = None) -> dict:
+    """Restaure une image du magasin : lecture, décompression, contrôle d'empreinte et écriture positionnelle
+    de chaque bloc réparties entre les threads."""
+    dests = [dest] if isinstance(dest, str) else list(dest)
+    manifest = read_manifest(manifest_path)
+    root = store_root(manifest_path)
+    codec = manifest["codec"]
+    source_size = manifest["source_size"]
+    total = sum(length for _, length, _ in manifest["chunks"])
+    zero_dests = set(dests) if skip_zeros is True else set(skip_zeros or ())
+    done = 0
+    lock = threading.Lock()
+
+    def advance(length: int) -> None:
+        nonlocal done
+        with lock:
+            done += length
+            current = done
+        if progress_callback:
+            progress_callback(current, total)
+
+    def restore_chunk(offset: int, length: int, digest: str) -> None:
+        if stop_flag and stop_flag():
+            raise KeyboardInterrupt("Opération annulée par l’utilisateur")
+        data = _load_chunk(root, codec, length, digest)
+        if data is None:
+            raise IOError(f"Bloc {digest} manquant ou corrompu dans le magasin {root}")
+        for fd in fds:
+            write_full(fd, memoryview(data), offset)
+        advance(length)
+
+    start = time.monotonic()
+    fds = []
+    zero_writers = []
+    try:
+        for path in dests:
+            fd = os.open(path, os.O_WRONLY | os.O_CREAT)
+            fds.append(fd)
+            dest_size = os.lseek(fd, 0, os.SEEK_END)
+            if stat.S_ISBLK(os.fstat(fd).st_mode) and dest_size < source_size:
+                raise IOError(f"La destination {path} ({dest_size} octets) est plus petite que l’image ({source_size} octets)")
+            zero_writer = ZeroWriter(fd, path)
+            if path in zero_dests:
+                zero_writer.discard_all(source_size)
+            zero_writers.append(zero_writer)
+        log_info(f"Restauration de {manifest_path} ({len(manifest['chunks'])} blocs) vers {', '.join(dests)}")
+        pending: deque = deque()
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for offset, length, digest in manifest["chunks"]:
+                if digest is None:
+                    for zero_writer in zero_writers:
+                        zero_writer.zero(offset, length)
+                    advance(length)
+                    continue
+                pending.append(executor.submit(restore_chunk, offset, length, digest))
+                while len(pending) >= 4 * max(1, workers):
+                    pending.popleft().result()
+            while pending:
+                pending.popleft().result()
+        for fd, zero_writer in zip(fds, zero_writers):
+            zero_writer.flush()
+            if stat.S_ISREG(os.fstat(fd).st_mode) and os.fstat(fd).st_size < source_size:
+                os.ftruncate(fd, source_size)
+            os.fdatasync(fd)
+    finally:
+        for fd in fds:
+            os.close(fd)
+    duration = time.monotonic() - start
+    log_info(f"Restauration terminée : {total} octets en {duration:.1f} s")
+    return {"bytes_restored": total, "duration": duration, "digests": manifest_digests(manifest)}
+
+def check_manifest(manifest_path: str, workers: int = DEFAULT_WORKERS,
+                   progress_callback: Optional[Callable[[int, int], None]] = None,
+                   stop_flag: Optional[Callable[[], bool]] = None) -> dict:
+    """Vérifie que chaque bloc référencé est présent dans le magasin et correspond à son empreinte."""
+    manifest = read_manifest(manifest_path)
+    root = store_root(manifest_path)
+    codec = manifest["codec"]
+    chunks = [chunk for chunk in manifest["chunks"] if chunk[2] is not None]
+    total = sum(length for _, length, _ in chunks)
+    done = 0
+    lock = threading.Lock()
+
+    def check(chunk: list) -> Optional[tuple[int, int]]:
+        nonlocal done
+        if stop_flag and stop_flag():
+            raise KeyboardInterrupt("Opération annulée par l’utilisateur")
+        offset, length, digest = chunk
+        ok = _load_chunk(root, codec, length, digest) is not None
+        with lock:
+            done += length
+            current = done
+        if progress_callback:
+            progress_callback(current, total)
+        return None if ok else (offset, length)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        mismatches = [m for m in executor.map(check, chunks) if m is not None]
+    duration = time.monotonic() - start
+    log_info(f"Contrôle du manifeste {manifest_path} : {len(chunks)} bloc(s), {len(mismatches)} manquant(s) ou corrompu(s)")
+    return {"checked": total, "mismatches": mismatches, "duration": duration}
+
+def prune_store(root: str) -> dict:
+    """Supprime les blocs qui ne sont plus référencés par aucun manifeste du magasin."""
+    referenced = set()
+    for entry in os.scandir(root):
+        if entry.is_file() and is_manifest(entry.name):
+            try:
+                referenced.update(digest for _, _, digest in read_manifest(entry.path)["chunks"] if digest)
+            except (OSError, ValueError) as e:
+                # Un manifeste illisible pourrait référencer n'importe quel bloc : on ne supprime rien.
+                log_warning(f"Manifeste illisible {entry.path}, nettoyage du magasin annulé : {e}")
+                return {"removed": 0, "bytes_freed": 0}
+    removed = 0
+    freed = 0
+    for digest in _existing_chunks(root) - referenced:
+        path = chunk_path(root, digest)
+        freed += os.path.getsize(path)
+        os.remove(path)
+        removed += 1
+    log_info(f"Nettoyage du magasin {root} : {removed} bloc(s) supprimé(s), {freed} octets libérés")
+    return {"removed": removed, "bytes_freed": freed}
@@ -0,0 +1,220 @@
+import os
+import json
+import threading
+import subprocess
+from typing import Optional
+
+from log_handler import log_error, log_info
+from utils import get_base_disk, get_disk_serial, is_ssd
+
+UDEV_DATA_DIR = "/run/udev/data"
+SYS_BLOCK_DIR = "/sys/block"
+LIVE_MOUNT_KEYWORDS = ("/run/live", "/lib/live", "/live/", "/cdrom")
+LIVE_ROOT_DEVICES = ("rootfs", "overlay", "aufs", "/dev/root")
+
+def _human_size(size: int) -> str:
+    """Taille au format de lsblk (1024, une décimale si nécessaire) : 512M, 465.8G."""
+    value = float(size)
+    unit = 0
+    while value >= 1024 and unit < 6:
+        value /= 1024
+        unit += 1
+    return f"{value:.1f}".rstrip("0").rstrip(".") + "BKMGTPE"[unit]
+
+def _read_sysfs(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _read_udev_properties(name: str) -> Optional[dict[str, str]]:
+    """Lit les propriétés udev d'un périphérique directement dans la base /run/udev/data, sans lancer udevadm."""
+    dev = _read_sysfs(os.path.join(SYS_BLOCK_DIR, name, "dev"))
+    if not dev:
+        return None
+    properties = {}
+    try:
+        with open(os.path.join(UDEV_DATA_DIR, f"b{dev}"), "r", errors="replace") as f:
+            for line in f:
+                if line.startswith("E:") and "=" in line:
+                    key, value = line[2:].rstrip("\n").split("=", 1)
+                    properties[key] = value
+    except OSError:
+        return None
+    return properties
+
+def _serial_from_udev(name: str, properties: dict[str, str]) -> Optional[str]:
+    """Même priorité que get_disk_serial : WWN, puis numéro de série, puis modèle suffixé du nom."""
+    for key in ("ID_WWN", "ID_SERIAL_SHORT"):
+        value = properties.get(key, "").split()
+        if value:
+            return value[0]
+    model = properties.get("ID_MODEL", "").split()
+    if model:
+        return f"{model[0]}_{name}"
+    return None
+
+def _read_mounts() -> list[tuple[str, str]]:
+    mounts = []
+    try:
+        with open("/proc/mounts", "r") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 2:
+                    mounts.append((parts[0], parts[1].replace("\\040", " ")))
+    except OSError as e:
+        log_error(f"Impossible de lire /proc/mounts : {e}")
+    return mounts
+
+class DiskInventory:
+    """Instantané de tous les disques construit en un seul appel à lsblk, complété par des lectures directes de sysfs
+    et de la base udev. Toutes les recherches (liste, numéro de série, type SSD, disques actifs) sont servies depuis
+    cet instantané jusqu'au prochain `refresh`."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._disks: Optional[list[dict]] = None
+        self._by_name: dict[str, dict] = {}
+        self._active: set[str] = set()
+
+    def refresh(self) -> list[dict]:
+        tree = self._lsblk()
+        parents: dict[str, str] = {}
+        disks = []
+        for node in tree:
+            self._index_parents(node, None, parents)
+            disks.append(self._describe(node))
+        active = self._find_active(parents)
+        for disk in disks:
+            disk["active"] = disk["name"] in active
+        with self._lock:
+            self._disks = disks
+            self._by_name = {disk["name"]: disk for disk in disks}
+            self._active = active
+        log_info(f"Inventaire des disques : {len(disks)} disque(s), actif(s) : {sorted(active)}")
+        return [dict(disk) for disk in disks]
+
+    def probe(self, name: str) -> Optional[dict]:
+        """Met à jour l'instantané pour un seul disque (branché ou modifié) sans relancer l'inventaire complet.
+        Renvoie sa description, ou None s'il n'est plus présent."""
+        if not os.path.exists(os.path.join(SYS_BLOCK_DIR, name)):
+            return None
+        tree = self._lsblk([f"/dev/{name}"])
+        if not tree or tree[0].get("type") != "disk":
+            return None
+        if self._disks is None:
+            self.refresh()
+        parents: dict[str, str] = {}
+        self._index_parents(tree[0], None, parents)
+        disk = self._describe(tree[0])
+        disk["active"] = disk["name"] in self._find_active(parents)
+        with self._lock:
+            previous = self._by_name.get(disk["name"])
+            if previous is not None:
+                self._disks[self._disks.index(previous)] = disk
+            else:
+                self._disks.append(disk)
+            self._by_name[disk["name"]] = disk
+            if disk["active"]:
+                self._active.add(disk["name"])
+            else:
+                self._active.discard(disk["name"])
+        log_info(f"Inventaire des disques : {disk['device']} {'mis à jour' if previous else 'ajouté'}")
+        return dict(disk)
+
+    def forget(self, name: str) -> bool:
+        """Retire un disque débranché de l'instantané. Renvoie False s'il n'y figurait pas."""
+        with self._lock:
+            disk = self._by_name.pop(name, None)
+            if disk is None:
+                return False
+            self._disks.remove(disk)
+            self._active.discard(name)
+        log_info(f"Inventaire des disques : {disk['device']} retiré")
+        return True
+
+    def _lsblk(self, devices: Optional[list[str]] = None) -> list[dict]:
+        try:
+            output = subprocess.run(["lsblk", "-J", "-b", "-o", "NAME,KNAME,PKNAME,TYPE,SIZE,MODEL,ROTA,TRAN"]
+                                    + (devices or []),
+                                    check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE).stdout
+            return json.loads(output).get("blockdevices", [])
+        except FileNotFoundError as e:
+            log_error(f"Erreur : Commande introuvable : {str(e)}")
+        except subprocess.CalledProcessError as e:
+            log_error(f"Erreur lors de l’exécution de lsblk : {str(e)}")
+        except ValueError as e:
+            log_error(f"Erreur lors de l’analyse de la sortie de lsblk : {str(e)}")
+        return []
+
+    def _index_parents(self, node: dict, parent: Optional[str], parents: dict[str, str]) -> None:
+        name = node.get("kname") or node.get("name")
+        if parent is not None:
+            parents[name] = parent
+        for child in node.get("children", []):
+            self._index_parents(child, name, parents)
+
+    def _describe(self, node: dict) -> dict:
+        name = node.get("kname") or node.get("name")
+        size = int(node.get("size") or 0)
+        model = (node.get("model") or "").strip() or "Inconnu"
+        rotational = _read_sysfs(os.path.join(SYS_BLOCK_DIR, name, "queue", "rotational"))
+        properties = _read_udev_properties(name)
+        serial = _serial_from_udev(name, properties) if properties is not None else None
+        return {"device": f"/dev/{name}", "name": name, "size": _human_size(size), "size_bytes": size,
+                "model": model, "type": node.get("type"), "transport": node.get("tran"),
+                "ssd": rotational == "0", "serial": serial}
+
+    def _find_active(self, parents: dict[str, str]) -> set[str]:
+        """Disques hébergeant la racine ou le support du système live, selon les mêmes règles que get_active_disk."""
+        mounts = _read_mounts()
+        root_device = next((device for device, mount_point in mounts if mount_point == "/"), None)
+        live_root = not root_device or root_device in LIVE_ROOT_DEVICES
+        active = set()
+        for device, mount_point in mounts:
+            if not device.startswith("/dev/"):
+                continue
+            system = mount_point == "/" or any(keyword in mount_point for keyword in LIVE_MOUNT_KEYWORDS)
+            mounted = live_root and any(place in mount_point for place in ("/media", "/mnt", "/run"))
+            if not system and not mounted:
+                continue
+            name = os.path.basename(os.path.realpath(device))
+            while name in parents:
+                name = parents[name]
+            active.add(get_base_disk(name))
+        return active
+
+    @property
+    def disks(self) -> list[dict]:
+        if self._disks is None:
+            self.refresh()
+        return [dict(disk) for disk in self._disks]
+
+    def active_disks(self) -> set[str]:
+        if self._disks is None:
+            self.refresh()
+        return set(self._active)
+
+    def lookup(self, device: str) -> Optional[dict]:
+        if self._disks is None:
+            self.refresh()
+        return self._by_name.get(device.replace("/dev/", ""))
+
+    def serial(self, device: str) -> str:
+        """Numéro de série servi depuis l'instantané ; udevadm n'est interrogé que si la base udev ne le fournit pas."""
+        disk = self.lookup(device)
+        if disk is not None and disk["serial"]:
+            return disk["serial"]
+        serial = get_disk_serial(device.replace("/dev/", ""))
+        if disk is not None:
+            with self._lock:
+                disk["serial"] = serial
+        return serial
+
+    def is_ssd(self, device: str) -> bool:
+        name = device.replace("/dev/", "")
+        disk = self.lookup(name) or self.lookup(get_base_disk(name))
+        if disk is not None:
+            return disk["ssd"]
+        return is_ssd(get_base_disk(name))
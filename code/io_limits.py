@@ -0,0 +1,161 @@
+import os
+import stat
+import time
+import threading
+import subprocess
+from typing import Callable, Optional
+
+from log_handler import log_info, log_warning
+
+IO_PRIORITIES = ("normal", "best-effort", "idle")
+IONICE_ARGS = {"best-effort": ["-c", "2", "-n", "7"], "idle": ["-c", "3"]}
+SYS_CLASS_BLOCK = "/sys/class/block"
+CGROUP_ROOT = "/sys/fs/cgroup"
+CGROUP_NAME = "cloneurleger"
+MAX_BURST = 1.0
+SLEEP_SLICE = 0.25
+
+_cgroup_lock = threading.Lock()
+_cgroup_state: dict = {}
+
+class RateLimiter:
+    """Plafond de débit partagé par les threads d'un travail (seau à jetons, une seconde de rafale au plus).
+    `rate_mbps` vaut 0 pour ne rien limiter ; `set_rate` s'applique immédiatement, y compris pendant une copie."""
+
+    def __init__(self, rate_mbps: float = 0) -> None:
+        self.lock = threading.Lock()
+        self.rate = 0.0
+        self.next_time = time.monotonic()
+        self.set_rate(rate_mbps)
+
+    @property
+    def rate_mbps(self) -> float:
+        return self.rate / 1e6
+
+    def set_rate(self, rate_mbps: float) -> None:
+        with self.lock:
+            self.rate = max(0.0, float(rate_mbps)) * 1e6
+            # La dette accumulée à l'ancien débit est oubliée : un plafond relevé prend effet sans attendre.
+            self.next_time = time.monotonic()
+
+    def consume(self, n: int, stop_flag: Optional[Callable[[], bool]] = None) -> float:
+        """Compte `n` octets et attend le temps nécessaire pour rester sous le plafond ; retourne l'attente."""
+        with self.lock:
+            if self.rate <= 0:
+                return 0.0
+            now = time.monotonic()
+            self.next_time = max(self.next_time, now - MAX_BURST) + n / self.rate
+        slept = False
+        while not (stop_flag and stop_flag()):
+            with self.lock:
+                delay = self.next_time - time.monotonic() if self.rate > 0 else 0.0
+            if delay <= 0:
+                break
+            time.sleep(min(delay, SLEEP_SLICE))
+            slept = True
+        return time.monotonic() - now if slept else 0.0
+
+class ThrottledIO:
+    """Moteur d'E/S (SyncIO, DeepQueueIO) dont les lectures sont soumises à un RateLimiter. Seules les lectures sont
+    comptées : une copie écrit ce qu'elle lit, et le plafond ne dépend pas du nombre de destinations."""
+
+    def __init__(self, io, limiter: RateLimiter, stop_flag: Optional[Callable[[], bool]] = None,
+                 metrics=None, phase: str = "copy") -> None:
+        self.io = io
+        self.depth = io.depth
+        self.limiter = limiter
+        self.stop_flag = stop_flag
+        self.metrics = metrics
+        self.phase = phase
+
+    def read(self, fd: int, view: memoryview, offset: int) -> int:
+        n = self.io.read(fd, view, offset)
+        waited = self.limiter.consume(n, self.stop_flag)
+        if self.metrics is not None and waited > 0:
+            self.metrics.add_stage(self.phase, "throttle", waited)
+        return n
+
+    def write(self, fd: int, view: memoryview, offset: int) -> None:
+        self.io.write(fd, view, offset)
+
+    def close(self) -> None:
+        self.io.close()
+
+def set_io_priority(priority: str) -> bool:
+    """Classe de priorité d'E/S du thread appelant ("best-effort" au plus bas niveau, ou "idle"). Les threads et les
+    commandes (dd) lancés ensuite par ce thread en héritent. Seuls les ordonnanceurs BFQ et mq-deadline en tiennent
+    compte ; sans effet pour "normal"."""
+    if priority not in IO_PRIORITIES:
+        raise ValueError(f"Priorité d’E/S inconnue : {priority}")
+    if priority == "normal":
+        return True
+    try:
+        subprocess.run(["ionice"] + IONICE_ARGS[priority] + ["-p", str(threading.get_native_id())],
+                       check=True, capture_output=True, timeout=10)
+    except (OSError, subprocess.SubprocessError) as e:
+        log_warning(f"Impossible d’appliquer la priorité d’E/S {priority} : {e}")
+        return False
+    return True
+
+def device_number(path: str) -> Optional[str]:
+    """« majeur:mineur » du disque portant `path` (io.max n'accepte que des disques entiers) ; None pour un fichier."""
+    try:
+        if not stat.S_ISBLK(os.stat(path).st_mode):
+            return None
+    except OSError:
+        return None
+    sys_dir = os.path.realpath(os.path.join(SYS_CLASS_BLOCK, os.path.basename(os.path.realpath(path))))
+    if os.path.exists(os.path.join(sys_dir, "partition")):
+        sys_dir = os.path.dirname(sys_dir)
+    try:
+        with open(os.path.join(sys_dir, "dev"), "r") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def join_io_cgroup() -> Optional[str]:
+    """Place le processus dans un cgroup v2 dédié dont le contrôleur io est actif, une fois pour toutes, et en
+    retourne le chemin ; None si le système n'offre pas de cgroup v2 avec le contrôleur io."""
+    with _cgroup_lock:
+        if "path" in _cgroup_state:
+            return _cgroup_state['path']
+        path = None
+        try:
+            with open(os.path.join(CGROUP_ROOT, "cgroup.controllers"), "r") as f:
+                available = "io" in f.read().split()
+            if available:
+                with open(os.path.join(CGROUP_ROOT, "cgroup.subtree_control"), "w") as f:
+                    f.write("+io")
+                path = os.path.join(CGROUP_ROOT, CGROUP_NAME)
+                os.makedirs(path, exist_ok=True)
+                with open(os.path.join(path, "cgroup.procs"), "w") as f:
+                    f.write(str(os.getpid()))
+                log_info(f"Processus placé dans le cgroup {path} (limites io.max)")
+            else:
+                log_info("Contrôleur io du cgroup v2 indisponible : plafond appliqué par le moteur de copie seulement")
+        except OSError as e:
+            log_info(f"cgroup v2 indisponible ({e}) : plafond appliqué par le moteur de copie seulement")
+            path = None
+        _cgroup_state['path'] = path
+        return path
+
+def set_cgroup_limit(devices: list[str], rate_mbps: float) -> list[str]:
+    """Écrit les limites io.max (lecture et écriture) des disques portant `devices` ; 0 les lève. Retourne les
+    périphériques effectivement limités : ni les fichiers image, ni un système sans cgroup v2."""
+    numbers = {device: device_number(device) for device in devices}
+    numbers = {device: number for device, number in numbers.items() if number is not None}
+    if not numbers:
+        return []
+    path = join_io_cgroup()
+    if path is None:
+        return []
+    value = f"{int(rate_mbps * 1e6)}" if rate_mbps > 0 else "max"
+    applied = []
+    for device, number in numbers.items():
+        try:
+            with open(os.path.join(path, "io.max"), "w") as f:
+                f.write(f"{number} rbps={value} wbps={value}")
+            applied.append(device)
+        except OSError as e:
+            log_warning(f"Limite io.max refusée pour {device} ({number}) : {e}")
+    return applied
@@ -2,526 +2,200 @@
 
 import os
 import sys
+import json
 import time
-import subprocess
+import signal
+import argparse
 import threading
-import tkinter as tk
-from tkinter import ttk, messagebox
-from typing import Optional, Dict, List, Set
-from subprocess import CalledProcessError, TimeoutExpired
-
-from utils import get_disk_list, get_base_disk, get_active_disk, get_disk_serial, is_ssd, run_command, run_command_with_progress
-from log_handler import log_info, log_error
-
-class DiskClonerGUI:
-    def __init__(self, root: tk.Tk) -> None:
-        self.root = root
-        self.root.title("Clonage Disque Sécurisé")
-        self.root.geometry("800x600")
-        self.root.attributes("-fullscreen", True)
-
-        self.source_disk_var = tk.StringVar()
-        self.dest_disk_var = tk.StringVar()
-        self.clone_method_var = tk.StringVar(value="full")
-        self.verify_clone_var = tk.BooleanVar(value=True)
-
-        self.disks: List[Dict[str, str]] = []
-        self.active_disks: Set[str] = set()
-        self.is_cloning = False
-
-        if os.geteuid() != 0:
-            messagebox.showerror("Erreur", "Ce programme doit être lancé en tant que root !")
-            root.destroy()
-            sys.exit(1)
-
-        self.create_widgets()
-        self.refresh_disks()
-
-    def create_widgets(self) -> None:
-        main_frame = ttk.Frame(self.root, padding="10")
-        main_frame.pack(fill=tk.BOTH, expand=True)
-
-        title_label = ttk.Label(main_frame, text="Clonage Disque Sécurisé", font=("Arial", 16, "bold"))
-        title_label.pack(pady=10)
-
-        selection_frame = ttk.Frame(main_frame)
-        selection_frame.pack(fill=tk.BOTH, expand=True, pady=10)
-
-        source_frame = ttk.LabelFrame(selection_frame, text="Disque Source (Cloner depuis)")
-        source_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
-
-        source_list_frame = ttk.Frame(source_frame)
-        source_list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-
-        self.source_listbox = tk.Listbox(source_list_frame, selectmode=tk.SINGLE, height=8)
-        source_scrollbar = ttk.Scrollbar(source_list_frame, orient=tk.VERTICAL, command=self.source_listbox.yview)
-        self.source_listbox.configure(yscrollcommand=source_scrollbar.set)
-        self.source_listbox.bind('<ButtonRelease-1>', self.on_source_select)
-        self.source_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        source_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        self.source_info_var = tk.StringVar(value="Aucun disque source sélectionné")
-        source_info_label = ttk.Label(source_frame, textvariable=self.source_info_var,
-            wraplength=300, justify=tk.LEFT)
-        source_info_label.pack(pady=5)
-
-        dest_frame = ttk.LabelFrame(selection_frame, text="Disque Destination (Cloner vers)")
-        dest_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5)
-
-        dest_list_frame = ttk.Frame(dest_frame)
-        dest_list_frame.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
-
-        self.dest_listbox = tk.Listbox(dest_list_frame, selectmode=tk.SINGLE, height=8)
-        dest_scrollbar = ttk.Scrollbar(dest_list_frame, orient=tk.VERTICAL, command=self.dest_listbox.yview)
-        self.dest_listbox.configure(yscrollcommand=dest_scrollbar.set)
-        self.dest_listbox.bind('<ButtonRelease-1>', self.on_dest_select)
-        self.dest_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        dest_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        self.dest_info_var = tk.StringVar(value="Aucun disque de destination sélectionné")
-        dest_info_label = ttk.Label(dest_frame, textvariable=self.dest_info_var,
-            wraplength=300, justify=tk.LEFT)
-        dest_info_label.pack(pady=5)
-
-        self.source_warning_var = tk.StringVar()
-        source_warning_label = ttk.Label(source_frame, textvariable=self.source_warning_var,
-            foreground="red", wraplength=300)
-        source_warning_label.pack(pady=2)
-        self.dest_warning_var = tk.StringVar()
-        dest_warning_label = ttk.Label(dest_frame, textvariable=self.dest_warning_var,
-            foreground="red", wraplength=300)
-        dest_warning_label.pack(pady=2)
-
-        options_frame = ttk.LabelFrame(main_frame, text="Options de clonage")
-        options_frame.pack(fill=tk.X, pady=10)
-
-        method_frame = ttk.Frame(options_frame)
-        method_frame.pack(fill=tk.X, padx=10, pady=5)
-        ttk.Label(method_frame, text="Méthode de clonage :").pack(side=tk.LEFT, padx=5)
-        ttk.Radiobutton(method_frame, text="Clonage Complet (bit-à-bit)",
-                value="full", variable=self.clone_method_var).pack(side=tk.LEFT, padx=10)
-        ttk.Radiobutton(method_frame, text="Clonage Intelligent (seulement les secteurs utilisés)",
-                value="smart", variable=self.clone_method_var).pack(side=tk.LEFT, padx=10)
-
-        verify_frame = ttk.Frame(options_frame)
-        verify_frame.pack(fill=tk.X, padx=10, pady=5)
-        ttk.Checkbutton(verify_frame, text="Vérifier le clone après la fin",
-            variable=self.verify_clone_var).pack(side=tk.LEFT, padx=5)
-
-        control_frame = ttk.Frame(options_frame)
-        control_frame.pack(fill=tk.X, padx=10, pady=10)
-
-        ttk.Button(control_frame, text="Rafraîchir les disques",
-            command=self.refresh_disks).pack(side=tk.LEFT, padx=5)
-        self.start_button = ttk.Button(control_frame, text="Démarrer le clonage",
-            command=self.start_clone)
-        self.start_button.pack(side=tk.LEFT, padx=5)
-        self.stop_button = ttk.Button(control_frame, text="Arrêter le clonage",
-            command=self.stop_clone, state=tk.DISABLED)
-        self.stop_button.pack(side=tk.LEFT, padx=5)
-        ttk.Button(control_frame, text="Quitter le mode plein écran",
-            command=self.toggle_fullscreen).pack(side=tk.RIGHT, padx=5)
-        ttk.Button(control_frame, text="Quitter",
-            command=self.exit_application).pack(side=tk.RIGHT, padx=5)
-
-        progress_frame = ttk.LabelFrame(main_frame, text="Progression")
-        progress_frame.pack(fill=tk.X, pady=10)
-        self.progress_var = tk.DoubleVar()
-        self.progress = ttk.Progressbar(progress_frame, variable=self.progress_var,
-            maximum=100, mode='determinate')
-        self.progress.pack(fill=tk.X, padx=10, pady=5)
-        self.status_var = tk.StringVar(value="Prêt")
-        status_label = ttk.Label(progress_frame, textvariable=self.status_var)
-        status_label.pack(pady=5)
-
-        log_frame = ttk.LabelFrame(main_frame, text="Journal")
-        log_frame.pack(fill=tk.BOTH, expand=True, pady=10)
-        self.log_text = tk.Text(log_frame, height=8, wrap=tk.WORD)
-        log_scrollbar = ttk.Scrollbar(log_frame, command=self.log_text.yview)
-        self.log_text.configure(yscrollcommand=log_scrollbar.set)
-        self.log_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
-        log_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-
-        self.root.protocol("WM_DELETE_WINDOW", self.exit_application)
-
-    def refresh_disks(self) -> None:
-        self.update_log("Rafraîchissement de la liste des disques...")
-        self.source_listbox.delete(0, tk.END)
-        self.dest_listbox.delete(0, tk.END)
-        self.source_disk_var.set("")
-        self.dest_disk_var.set("")
-
-        self.disks = get_disk_list()
-        active_disk_list = get_active_disk()
-        if active_disk_list:
-            self.active_disks = {get_base_disk(disk) for disk in active_disk_list}
-            log_info(f"Disques actifs détectés : {self.active_disks}")
-        else:
-            self.active_disks = set()
-
-        if not self.disks:
-            self.update_log("Aucun disque trouvé.")
-            self.source_warning_var.set("Aucun disque disponible")
-            self.dest_warning_var.set("Aucun disque disponible")
-            return
-
-        for disk in self.disks:
-            device_name = disk['device'].replace('/dev/', '')
-            base_device = get_base_disk(device_name)
-            try:
-                disk_serial = get_disk_serial(device_name)
-                is_device_ssd = is_ssd(device_name)
-                ssd_indicator = " (Électronique)" if is_device_ssd else " (Mécanique)"
-                is_active = base_device in self.active_disks
-                active_indicator = " [ACTIF - INDISPONIBLE]" if is_active else ""
-                disk_info = f"{disk_serial}{ssd_indicator} - {disk['size']}{active_indicator}"
-                self.source_listbox.insert(tk.END, disk_info)
-                if is_active:
-                    self.source_listbox.itemconfig(tk.END, {'fg': 'red'})
-                self.dest_listbox.insert(tk.END, disk_info)
-                if is_active:
-                    self.dest_listbox.itemconfig(tk.END, {'fg': 'red'})
-            except (OSError, IOError) as e:
-                self.update_log(f"Erreur d'E/S lors de la récupération des infos pour {device_name} : {str(e)}")
-            except (CalledProcessError, subprocess.SubprocessError) as e:
-                self.update_log(f"Erreur de commande lors de la récupération des infos pour {device_name} : {str(e)}")
-            except (ValueError, TypeError) as e:
-                self.update_log(f"Erreur de données lors de la récupération des infos pour {device_name} : {str(e)}")
-            except FileNotFoundError as e:
-                self.update_log(f"Fichier introuvable pour {device_name} : {str(e)}")
-            except PermissionError as e:
-                self.update_log(f"Problème de permission pour {device_name} : {str(e)}")
-
-        if self.active_disks:
-            warning_msg = f"ATTENTION : Les disques système actifs ({', '.join(self.active_disks)}) ne peuvent pas être sélectionnés"
-            self.source_warning_var.set(warning_msg)
-            self.dest_warning_var.set(warning_msg)
-        else:
-            self.source_warning_var.set("")
-            self.dest_warning_var.set("")
-
-        self.update_source_dest_info()
-        self.update_log(f"{len(self.disks)} disque(s) trouvé(s)")
-
-    def on_source_select(self, event) -> None:
-        selection = self.source_listbox.curselection()
-        if selection:
-            index = selection[0]
-            if index < len(self.disks):
-                disk = self.disks[index]
-                device_name = disk['device'].replace('/dev/', '')
-                base_device = get_base_disk(device_name)
-                if base_device in self.active_disks:
-                    messagebox.showwarning("Sélection invalide", "Impossible de sélectionner un disque système actif comme source !")
-                    self.source_listbox.selection_clear(0, tk.END)
-                    return
-                self.source_disk_var.set(disk['device'])
-                self.update_source_dest_info()
-                self.update_dest_availability()
-
-    def on_dest_select(self, event) -> None:
-        selection = self.dest_listbox.curselection()
-        if selection:
-            index = selection[0]
-            if index < len(self.disks):
-                disk = self.disks[index]
-                device_name = disk['device'].replace('/dev/', '')
-                base_device = get_base_disk(device_name)
-                if base_device in self.active_disks:
-                    messagebox.showwarning("Sélection invalide", "Impossible de sélectionner un disque système actif comme destination !")
-                    self.dest_listbox.selection_clear(0, tk.END)
-                    return
-                if disk['device'] == self.source_disk_var.get():
-                    messagebox.showwarning("Sélection invalide", "La source et la destination ne peuvent pas être le même disque !")
-                    self.dest_listbox.selection_clear(0, tk.END)
-                    return
-                self.dest_disk_var.set(disk['device'])
-                self.update_source_dest_info()
-
-    def update_dest_availability(self) -> None:
-        source_device = self.source_disk_var.get()
-        if not source_device:
-            return
-        for i, disk in enumerate(self.disks):
-            if disk['device'] == source_device:
-                current_text = self.dest_listbox.get(i)
-                if "[SOURCE - INDISPONIBLE]" not in current_text:
-                    new_text = current_text.replace("[ACTIF - INDISPONIBLE]", "").strip()
-                    new_text += " [SOURCE - INDISPONIBLE]"
-                    self.dest_listbox.delete(i)
-                    self.dest_listbox.insert(i, new_text)
-                    self.dest_listbox.itemconfig(i, {'fg': 'orange'})
-                break
-
-    def update_source_dest_info(self) -> None:
-        source_device = self.source_disk_var.get()
-        dest_device = self.dest_disk_var.get()
-        if source_device:
-            source_disk = next((d for d in self.disks if d['device'] == source_device), None)
-            if source_disk:
-                device_name = source_device.replace('/dev/', '')
-                try:
-                    disk_serial = get_disk_serial(device_name)
-                    is_device_ssd = is_ssd(device_name)
-                    disk_type = "SSD" if is_device_ssd else "HDD"
-                    info = f" Sélectionné : {disk_serial}\nType : {disk_type}\nTaille : {source_disk['size']}\nModèle : {source_disk['model']}"
-                    self.source_info_var.set(info)
-                except (OSError, IOError) as e:
-                    self.source_info_var.set(f"Sélectionné : {source_device}\nErreur d’E/S lors de la récupération des détails : {str(e)}")
-                except (CalledProcessError, subprocess.SubprocessError) as e:
-                    self.source_info_var.set(f"Sélectionné : {source_device}\nErreur de commande lors de la récupération des détails : {str(e)}")
-                except (ValueError, TypeError) as e:
-                    self.source_info_var.set(f"Sélectionné : {source_device}\nErreur de données lors de la récupération des détails : {str(e)}")
-                except FileNotFoundError as e:
-                    self.source_info_var.set(f"Sélectionné : {source_device}\nFichier introuvable : {str(e)}")
-                except PermissionError as e:
-                    self.source_info_var.set(f"Sélectionné : {source_device}\nPermission refusée : {str(e)}")
-            else:
-                self.source_info_var.set("Aucun disque source sélectionné")
-        else:
-            self.source_info_var.set("Aucun disque source sélectionné")
-        if dest_device:
-            dest_disk = next((d for d in self.disks if d['device'] == dest_device), None)
-            if dest_disk:
-                device_name = dest_device.replace('/dev/', '')
-                try:
-                    disk_serial = get_disk_serial(device_name)
-                    is_device_ssd = is_ssd(device_name)
-                    disk_type = "SSD" if is_device_ssd else "HDD"
-                    info = f"Sélectionné : {disk_serial}\nType : {disk_type}\nTaille : {dest_disk['size']}\nModèle : {dest_disk['model']}"
-                    self.dest_info_var.set(info)
-                except (OSError, IOError) as e:
-                    self.dest_info_var.set(f"Sélectionné : {dest_device}\nErreur d’E/S lors de la récupération des détails : {str(e)}")
-                except (CalledProcessError, subprocess.SubprocessError) as e:
-                    self.dest_info_var.set(f"Sélectionné : {dest_device}\nErreur de commande lors de la récupération des détails : {str(e)}")
-                except (ValueError, TypeError) as e:
-                    self.dest_info_var.set(f"Sélectionné : {dest_device}\nErreur de données lors de la récupération des détails : {str(e)}")
-                except FileNotFoundError as e:
-                    self.dest_info_var.set(f"Sélectionné : {dest_device}\nFichier introuvable : {str(e)}")
-                except PermissionError as e:
-                    self.dest_info_var.set(f"Sélectionné : {dest_device}\nPermission refusée : {str(e)}")
-            else:
-                self.dest_info_var.set("Aucun disque de destination sélectionné")
+import subprocess
+from typing import Optional
+
+from utils import get_base_disk
+from inventory import DiskInventory
+from clone_job import CloneJob, is_image_path
+from partitions import read_partition_table
+from scheduler import DEFAULT_MAX_JOBS, JobScheduler
+
+PROGRESS_INTERVAL = 1.0
+JOB_SPEC_KEYS = {"source", "targets", "method", "verify", "verify_only", "image", "engine", "direct_io",
+                 "skip_zeros", "block_size", "buffer_count", "calibrate", "io_backend", "queue_depth",
+                 "verify_workers", "verify_method", "verify_samples", "resume", "partitions", "io_priority",
+                 "rate_limit"}
+
+EMIT_LOCK = threading.Lock()
+
+def emit(event: dict) -> None:
+    """Une ligne JSON par événement sur la sortie standard ; le journal texte reste sur la sortie d'erreur.
+    Les travaux parallèles écrivent depuis leurs threads : les lignes ne doivent pas s'entremêler."""
+    line = json.dumps(event, ensure_ascii=False)
+    with EMIT_LOCK:
+        print(line, flush=True)
+
+def check_job_spec(spec) -> dict:
+    if not isinstance(spec, dict):
+        raise ValueError("Chaque description de travail doit être un objet JSON")
+    unknown = set(spec) - JOB_SPEC_KEYS
+    if unknown:
+        raise ValueError(f"Clé(s) inconnue(s) dans la description de travail : {', '.join(sorted(unknown))}")
+    if isinstance(spec.get("targets"), str):
+        spec["targets"] = [spec["targets"]]
+    for key in ("block_size", "buffer_count"):
+        if spec.get(key) == "auto":
+            del spec[key]
+    return spec
+
+def load_job_specs(path: str) -> list[dict]:
+    """Lit une description de travail JSON, ou une liste de descriptions exécutées en parallèle, depuis un fichier ou
+    l'entrée standard ("-") :
+    {"source": "/dev/sda", "targets": ["/dev/sdb"], "method": "full", "verify": true, "block_size": 8388608, ...}
+    block_size et buffer_count absents ou "auto" : choisis d'après les périphériques (calibrate : lecture d'essai) ;
+    io_backend vaut "auto" (file profonde entre SSD), "sync" ou "deep", avec queue_depth requêtes en vol ;
+    avec "method": "partitions", "partitions" liste les numéros à copier (voir « cloneurleger partitions ») ;
+    io_priority vaut "normal", "best-effort" ou "idle", rate_limit plafonne le débit en Mo/s (0 : aucun) ;
+    verify_samples > 0 remplace la vérification complète par ce nombre de tranches de 1 Mio tirées au hasard."""
+    try:
+        if path == "-":
+            specs = json.load(sys.stdin)
         else:
-            self.dest_info_var.set("Aucun disque de destination sélectionné")
-
-    def start_clone(self) -> None:
-        source_device = self.source_disk_var.get()
-        dest_device = self.dest_disk_var.get()
-        if not source_device or not dest_device:
-            messagebox.showwarning("Sélection requise", "Veuillez sélectionner à la fois le disque source et le disque de destination !")
-            return
-        source_disk = next((d for d in self.disks if d['device'] == source_device), None)
-        dest_disk = next((d for d in self.disks if d['device'] == dest_device), None)
-        if not source_disk or not dest_disk:
-            messagebox.showerror("Erreur", "Impossible de trouver les informations du disque !")
-            return
-        try:
-            source_serial = get_disk_serial(source_device.replace('/dev/', ''))
-            dest_serial = get_disk_serial(dest_device.replace('/dev/', ''))
-        except (OSError, IOError, CalledProcessError, subprocess.SubprocessError,
-                FileNotFoundError, PermissionError):
-            source_serial = source_device
-            dest_serial = dest_device
-
-        clone_method = "Clonage complet (bit-à-bit)" if self.clone_method_var.get() == "full" else "Clonage intelligent (seulement les secteurs utilisés)"
-        verify_text = "avec vérification" if self.verify_clone_var.get() else "sans vérification"
-        confirm_msg = (f"ATTENTION : Ceci va complètement écraser le disque de destination !\n\n"
-                       f"Source : {source_serial} ({source_disk['size']})\n"
-                       f"Destination : {dest_serial} ({dest_disk['size']})\n\n"
-                       f"Méthode : {clone_method} {verify_text}\n\n"
-                       f"TOUTES LES DONNÉES SUR LE DISQUE DE DESTINATION SERONT PERDUES !\n\n"
-                       f"Êtes-vous sûr de vouloir continuer ?")
-        if not messagebox.askyesno("Confirmer l’opération de clonage", confirm_msg):
-            return
-        if not messagebox.askyesno("AVERTISSEMENT FINAL",
-                                   "Ceci est votre dernier avertissement !\n\n"
-                                   "Le disque de destination sera complètement écrasé.\n\n"
-                                   "Voulez-vous continuer ?"):
-            return
-        self.is_cloning = True
-        self.start_button.configure(state=tk.DISABLED)
-        self.stop_button.configure(state=tk.NORMAL)
-        self.progress_var.set(0)
-        clone_thread = threading.Thread(target=self.clone_disk_thread,
-            args=(source_device, dest_device), daemon=True)
-        clone_thread.start()
-
-    def clone_disk_thread(self, source_device: str, dest_device: str) -> None:
-        try:
-            method = self.clone_method_var.get()
-            verify = self.verify_clone_var.get()
-            self.update_log(f"Démarrage de l’opération de clonage : {source_device} -> {dest_device}")
-            self.status_var.set("Initialisation de l’opération de clonage ...")
-            if method == "full":
-                self.full_clone(source_device, dest_device)
-            else:
-                self.smart_clone(source_device, dest_device)
-            if verify and self.is_cloning:
-                self.verify_clone(source_device, dest_device)
-            if self.is_cloning:
-                self.status_var.set("Opération de clonage terminée avec succès !")
-                self.update_log("Opération de clonage terminée avec succès !")
-                messagebox.showinfo("Succès", "Clonage du disque terminé avec succès !")
-        except (OSError, IOError) as e:
-            error_msg = f"Erreur d’E/S lors de l’opération de clonage : {str(e)}"
-            self.status_var.set("Échec de l’opération de clonage - Erreur d’E/S !")
-            self.update_log(error_msg)
-            log_error(error_msg)
-            messagebox.showerror("Erreur d’E/S", error_msg)
-        except (CalledProcessError, subprocess.SubprocessError) as e:
-            error_msg = f"L’exécution de la commande a échoué lors du clonage : {str(e)}"
-            self.status_var.set("Échec de l’opération de clonage - Erreur de commande !")
-            self.update_log(error_msg)
-            log_error(error_msg)
-            messagebox.showerror("Erreur de commande", error_msg)
-        except FileNotFoundError as e:
-            error_msg = f"Fichier ou commande introuvable requis : {str(e)}"
-            self.status_var.set("Échec de l’opération de clonage - Fichier introuvable !")
-            self.update_log(error_msg)
-            log_error(error_msg)
-            messagebox.showerror("Fichier introuvable", error_msg)
-        except PermissionError as e:
-            error_msg = f"Permission refusée lors de l’opération de clonage : {str(e)}"
-            self.status_var.set("Échec de l’opération de clonage - Permission refusée !")
-            self.update_log(error_msg)
-            log_error(error_msg)
-            messagebox.showerror("Erreur de permission", error_msg)
-        except TimeoutExpired as e:
-            error_msg = f"Délai dépassé pour l’opération de clonage : {str(e)}"
-            self.status_var.set("Échec de l’opération de clonage - Délai dépassé !")
-            self.update_log(error_msg)
-            log_error(error_msg)
-            messagebox.showerror("Erreur de délai", error_msg)
-        except KeyboardInterrupt:
-            error_msg = "Opération de clonage interrompue par l’utilisateur"
-            self.status_var.set("Opération de clonage interrompue !")
-            self.update_log(error_msg)
-            log_error(error_msg)
-            messagebox.showwarning("Interrompu", error_msg)
-        except MemoryError as e:
-            error_msg = f"Mémoire insuffisante pour l’opération de clonage : {str(e)}"
-            self.status_var.set("Échec de l’opération de clonage - Erreur mémoire !")
-            self.update_log(error_msg)
-            log_error(error_msg)
-            messagebox.showerror("Erreur mémoire", error_msg)
-        finally:
-            self.is_cloning = False
-            self.start_button.configure(state=tk.NORMAL)
-            self.stop_button.configure(state=tk.DISABLED)
-            self.progress_var.set(0)
-
-    def full_clone(self, source: str, dest: str) -> None:
-        self.update_log("Démarrage du clonage complet (bit-à-bit)...")
-        self.status_var.set("Clonage complet en cours...")
-        block_size = "1M"
-        cmd = [
-            "dd",
-            f"if={source}",
-            f"of={dest}",
-            f"bs={block_size}",
-            "conv=fdatasync",
-            "status=progress"
-        ]
-        def progress_callback():
-            current_progress = self.progress_var.get()
-            if current_progress < 90:
-                self.progress_var.set(current_progress + 1)
-        def stop_flag():
-            return not self.is_cloning
-        try:
-            run_command_with_progress(cmd, progress_callback, stop_flag)
-            self.progress_var.set(100)
-            self.update_log("Clonage complet terminé avec succès")
-        except (CalledProcessError, subprocess.SubprocessError) as e:
-            raise subprocess.SubprocessError(f"Commande de clonage complet échouée : {str(e)}")
-        except (OSError, IOError) as e:
-            raise IOError(f"Erreur d’E/S lors du clonage complet : {str(e)}")
-        except FileNotFoundError as e:
-            raise FileNotFoundError(f"Commande dd introuvable : {str(e)}")
-        except PermissionError as e:
-            raise PermissionError(f"Permission refusée lors du clonage complet : {str(e)}")
-        except TimeoutExpired as e:
-            raise TimeoutExpired(cmd, None, f"Délai dépassé lors du clonage complet : {str(e)}")
-
-    def smart_clone(self, source: str, dest: str) -> None:
-        self.update_log("Démarrage du clonage intelligent (copie consciente du système de fichiers)...")
-        self.status_var.set("Clonage intelligent en cours...")
-        self.update_log("Note : Le clonage intelligent n’est pas encore totalement implémenté, utilisation de dd...")
-        self.full_clone(source, dest)
-
-    def verify_clone(self, source: str, dest: str) -> None:
-        if not self.is_cloning:
-            return
-        self.update_log("Démarrage de la vérification du clone...")
-        self.status_var.set("Vérification du clone en cours...")
-        self.progress_var.set(0)
-        cmd = [
-            "cmp",
-            source,
-            dest
-        ]
-        def progress_callback():
-            current_progress = self.progress_var.get()
-            if current_progress < 90:
-                self.progress_var.set(current_progress + 2)
-        def stop_flag():
-            return not self.is_cloning
-        try:
-            run_command_with_progress(cmd, progress_callback, stop_flag)
-            self.progress_var.set(100)
-            self.update_log("Vérification du clone terminée avec succès - les disques sont identiques")
-        except CalledProcessError as e:
-            if e.returncode == 1:
-                self.update_log("ATTENTION : Échec de la vérification du clone - les disques diffèrent !")
-                messagebox.showwarning("Vérification échouée", "Échec de la vérification du clone ! Les disques ne sont pas identiques.")
-            else:
-                raise CalledProcessError(e.returncode, cmd, f"Échec de la commande de vérification : {e.stderr}")
-        except (OSError, IOError) as e:
-            raise IOError(f"Erreur d’E/S lors de la vérification : {str(e)}")
-        except FileNotFoundError as e:
-            raise FileNotFoundError(f"Commande cmp introuvable : {str(e)}")
-        except PermissionError as e:
-            raise PermissionError(f"Permission refusée lors de la vérification : {str(e)}")
-        except TimeoutExpired as e:
-            raise TimeoutExpired(cmd, None, f"Délai dépassé lors de la vérification : {str(e)}")
-
-    def stop_clone(self) -> None:
-        if self.is_cloning:
-            if messagebox.askyesno("Confirmer l’arrêt",
-                "Voulez-vous vraiment arrêter l’opération de clonage ?\n\n"
-                "Cela laissera le disque de destination dans un état incomplet."):
-                self.is_cloning = False
-                self.update_log("Opération de clonage arrêtée par l’utilisateur")
-                self.status_var.set("Opération de clonage arrêtée")
-
-    def toggle_fullscreen(self) -> None:
-        is_fullscreen = self.root.attributes("-fullscreen")
-        self.root.attributes("-fullscreen", not is_fullscreen)
-
-    def exit_application(self) -> None:
-        if self.is_cloning:
-            if not messagebox.askyesno("Clonage en cours",
-                                       "Une opération de clonage est en cours ... Voulez-vous vraiment quitter ?"):
+            with open(path, "r", encoding="utf-8") as f:
+                specs = json.load(f)
+    except OSError as e:
+        raise ValueError(f"Description de travail illisible : {e}")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Description de travail invalide : {e}")
+    if not isinstance(specs, list):
+        specs = [specs]
+    if not specs:
+        raise ValueError("La liste des travaux est vide")
+    return [check_job_spec(spec) for spec in specs]
+
+def check_targets(inventory: DiskInventory, source: str, targets: list[str], image_dest: bool) -> None:
+    """Mêmes refus que l'interface : ni le disque système actif, ni un disque absent de l'inventaire."""
+    active = inventory.active_disks()
+    devices = [path for path in [source] + ([] if image_dest else targets) if not is_image_path(path)]
+    for device in devices:
+        name = os.path.basename(os.path.realpath(device))
+        if inventory.lookup(name) is None:
+            raise ValueError(f"{device} n’est pas un disque connu (voir « cloneurleger list »)")
+        if get_base_disk(name) in active:
+            raise ValueError(f"{device} est un disque système actif et ne peut pas être utilisé")
+
+def list_disks() -> int:
+    emit({"event": "disks", "disks": DiskInventory().refresh()})
+    return 0
+
+def list_partitions(device: str) -> int:
+    try:
+        table = read_partition_table(device)
+    except OSError as e:
+        emit({"event": "error", "message": f"Lecture de la table de partitions impossible : {e}"})
+        return 1
+    if table is None:
+        emit({"event": "error", "message": f"Aucune table de partitions reconnue sur {device}"})
+        return 1
+    emit({"event": "partitions", "device": device, "scheme": table['scheme'], "disk_size": table['disk_size'],
+          "partitions": table['partitions']})
+    return 0
+
+def build_job(spec: dict, inventory: DiskInventory, event_callback, stop_flag) -> CloneJob:
+    source = spec.get("source", "")
+    targets = spec.get("targets", [])
+    image_dest = spec.get("image", len(targets) == 1 and is_image_path(targets[0]))
+    check_targets(inventory, source, targets, image_dest)
+    return CloneJob(source, targets, method=spec.get("method", "full"), verify=spec.get("verify", True),
+                    verify_only=spec.get("verify_only", False), image_dest=image_dest,
+                    copy_engine=spec.get("engine", "native"), direct=spec.get("direct_io", False),
+                    skip_zeros=spec.get("skip_zeros", True), verify_method=spec.get("verify_method", "compare"),
+                    verify_samples=spec.get("verify_samples", 0), resume=spec.get("resume", False),
+                    calibrate=spec.get("calibrate", False), io_backend=spec.get("io_backend", "auto"),
+                    partitions=spec.get("partitions"),
+                    io_priority=spec.get("io_priority", "normal"), rate_limit=spec.get("rate_limit", 0),
+                    inventory=inventory, event_callback=event_callback, stop_flag=stop_flag,
+                    **{key: spec[key] for key in ("block_size", "buffer_count", "queue_depth", "verify_workers")
+                       if key in spec})
+
+def make_event_callback(job_id: Optional[int] = None):
+    last_sent: dict[tuple, tuple] = {}
+    def event_callback(event: dict) -> None:
+        # Au plus une ligne d'avancement par seconde et par opération ou destination, sauf changement d'état.
+        if event['event'] in ("progress", "target") and (event['percent'] or 0) < 100:
+            key = (event['event'], event.get('label') or event.get('device'))
+            now = time.monotonic()
+            sent_at, status = last_sent.get(key, (0.0, None))
+            if now - sent_at < PROGRESS_INTERVAL and event.get('status') == status:
                 return
-            self.is_cloning = False
-        log_info("L’application de clonage de disque a été fermée par l'utilisateur")
-        self.root.destroy()
-
-    def update_log(self, message: str) -> None:
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-        log_message = f"[{timestamp}] {message}\n"
-        self.log_text.insert(tk.END, log_message)
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
-
-def main():
+            last_sent[key] = (now, event.get('status'))
+        emit(event if job_id is None else {"job": job_id, **event})
+    return event_callback
+
+def run_job(spec_path: str, assume_yes: bool, max_jobs: int = DEFAULT_MAX_JOBS) -> int:
+    stop = threading.Event()
+    try:
+        specs = load_job_specs(spec_path)
+        inventory = DiskInventory()
+        jobs = [build_job(spec, inventory, make_event_callback(None if len(specs) == 1 else index), stop.is_set)
+                for index, spec in enumerate(specs, 1)]
+    except (ValueError, TypeError) as e:
+        emit({"event": "error", "message": str(e)})
+        return 2
+    if any(not job.verify_only for job in jobs) and not assume_yes:
+        emit({"event": "error", "message": "Les destinations seront écrasées : relancer avec --yes pour confirmer"})
+        return 2
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    if len(jobs) > 1:
+        return run_jobs(jobs, stop, max_jobs)
+    job = jobs[0]
+    try:
+        result = job.run()
+    except KeyboardInterrupt:
+        result = {"status": "stopped", "targets": {device: {"status": "stopped"} for device in job.dests},
+                  "failed": list(job.dests), "duration": None, "metrics": job.metrics_path}
+    except (OSError, IOError, subprocess.SubprocessError, MemoryError) as e:
+        emit({"event": "error", "message": str(e)})
+        return 1
+    emit({"event": "result", **result})
+    return {"ok": 0, "failed": 1}.get(result['status'], 130)
+
+def run_jobs(jobs: list[CloneJob], stop: threading.Event, max_jobs: int) -> int:
+    """Plusieurs travaux à la fois, répartis par JobScheduler selon leurs contrôleurs ; numérotés dans l'ordre du fichier."""
+    scheduler = JobScheduler(max_jobs=max_jobs, status_callback=lambda snapshot: emit({"event": "job", **snapshot}))
+    for job in jobs:
+        scheduler.submit(job)
+    while not scheduler.wait(timeout=0.5):
+        if stop.is_set():
+            scheduler.cancel_all()
+    snapshots = scheduler.snapshot()
+    statuses = {entry['status'] for entry in snapshots}
+    status = "failed" if statuses & {"failed", "error"} else "stopped" if "stopped" in statuses else "ok"
+    emit({"event": "result", "status": status, "jobs": snapshots})
+    return {"ok": 0, "failed": 1}.get(status, 130)
+
+def main(argv: Optional[list[str]] = None) -> None:
+    parser = argparse.ArgumentParser(prog="cloneurleger", description="Clonage de disques, avec ou sans interface graphique")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("gui", help="interface graphique (par défaut)")
+    commands.add_parser("list", help="liste les disques en JSON")
+    partitions_parser = commands.add_parser("partitions", help="liste les partitions d’un disque en JSON")
+    partitions_parser.add_argument("device")
+    run_parser = commands.add_parser("run", help="exécute une description de travail JSON")
+    run_parser.add_argument("job", help="fichier JSON, ou - pour l’entrée standard")
+    run_parser.add_argument("--yes", action="store_true", help="confirme l’écrasement des destinations")
+    run_parser.add_argument("--max-jobs", type=int, default=DEFAULT_MAX_JOBS,
+                            help="travaux simultanés au plus, pour une liste de descriptions")
+    args = parser.parse_args(argv)
+    if args.command == "list":
+        sys.exit(list_disks())
+    if args.command == "partitions":
+        sys.exit(list_partitions(args.device))
     if os.geteuid() != 0:
         print("Ce programme doit être lancé en tant que root !")
         sys.exit(1)
-    root = tk.Tk()
-    app = DiskClonerGUI(root)
-    root.mainloop()
+    if args.command == "run":
+        sys.exit(run_job(args.job, args.yes, args.max_jobs))
+    # Tk n'est chargé que pour l'interface : le mode sans écran démarre sans lui.
+    from gui import main as gui_main
+    gui_main()
 
 if __name__ == "__main__":
     main()
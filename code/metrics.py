@@ -0,0 +1,236 @@
+import os
+import re
+import json
+import time
+import threading
+from typing import Optional
+
+from log_handler import log_info, log_warning
+
+METRICS_DIR = os.environ.get("CLONEUR_METRICS_DIR", "/var/lib/cloneur_leger/mesures")
+TEXTFILE_DIR = os.environ.get("CLONEUR_TEXTFILE_DIR", "/var/lib/prometheus/node-exporter")
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+# Étapes dont le temps est passé à travailler ; les autres sont des attentes entre threads du pipeline.
+WORK_STAGES = ("read", "write", "hash", "fsync")
+STAGES = WORK_STAGES + ("buffer_wait", "queue_wait", "throttle")
+STAGE_LABELS = {"read": "lecture", "write": "écriture", "hash": "empreintes/comparaison", "fsync": "synchronisation",
+                "buffer_wait": "attente de tampons libres", "queue_wait": "attente de données",
+                "throttle": "plafond de débit"}
+PHASE_LABELS = {"copy": "copie", "verify": "vérification"}
+
+class Histogram:
+    """Histogramme cumulatif à seaux fixes, au format attendu par Prometheus."""
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip([f"{b:g}" for b in self.buckets] + ["+Inf"], self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def to_dict(self) -> dict:
+        return {"buckets": dict(self.cumulative()), "sum": self.sum, "count": self.count}
+
+class JobMetrics:
+    """Mesures d'une opération, par phase ("copy", "verify") : temps cumulé par étape (lecture, écriture,
+    empreintes/comparaison, synchronisation, attentes du pipeline), histogrammes de latence des requêtes d'E/S et
+    octets traités à chaque seconde. Alimenté depuis tous les threads des moteurs."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.start = time.monotonic()
+        self.stages: dict[str, dict[str, float]] = {}
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.samples: dict[str, list[int]] = {}
+        self.streams: dict[tuple[str, str], int] = {}
+        self.status = "running"
+        self.finished: Optional[float] = None
+
+    def add_stage(self, phase: str, stage: str, seconds: float) -> None:
+        with self.lock:
+            stages = self.stages.setdefault(phase, {})
+            stages[stage] = stages.get(stage, 0.0) + seconds
+
+    def observe_io(self, phase: str, op: str, seconds: float) -> None:
+        """Une requête d'E/S : sa latence et son temps, compté dans l'étape du même nom."""
+        with self.lock:
+            histogram = self.latency.get((phase, op))
+            if histogram is None:
+                histogram = self.latency[(phase, op)] = Histogram()
+            histogram.observe(seconds)
+            stages = self.stages.setdefault(phase, {})
+            stages[op] = stages.get(op, 0.0) + seconds
+
+    def add_bytes(self, phase: str, n: int) -> None:
+        second = int(time.monotonic() - self.start)
+        with self.lock:
+            samples = self.samples.setdefault(phase, [])
+            if len(samples) <= second:
+                samples.extend([0] * (second + 1 - len(samples)))
+            samples[second] += n
+
+    def set_streams(self, phase: str, stage: str, count: int) -> None:
+        """Nombre de threads travaillant en parallèle sur une étape (une écriture par destination)."""
+        with self.lock:
+            self.streams[(phase, stage)] = max(1, count)
+
+    def finish(self, status: str) -> None:
+        self.status = status
+        self.finished = time.time()
+
+    def bound(self, phase: str) -> Optional[str]:
+        """Étape limitante d'une phase : celle dont un thread a passé le plus de temps à travailler, ou le plafond de
+        débit s'il a retenu la lecture plus longtemps encore."""
+        with self.lock:
+            stages = self.stages.get(phase, {})
+            busy = {stage: stages[stage] / self.streams.get((phase, stage), 1)
+                    for stage in ("read", "write", "hash", "throttle") if stages.get(stage)}
+        return max(busy, key=busy.get) if busy else None
+
+    def summary(self, phase: str) -> str:
+        """Une ligne de journal : temps par étape et étape limitante."""
+        with self.lock:
+            stages = dict(self.stages.get(phase, {}))
+        parts = ", ".join(f"{STAGE_LABELS[stage]} {stages[stage]:.1f} s" for stage in STAGES if stages.get(stage))
+        bound = self.bound(phase)
+        text = f"Mesures de la {PHASE_LABELS.get(phase, phase)} : {parts or 'aucune'}"
+        return f"{text} - limitée par : {STAGE_LABELS[bound]}" if bound else text
+
+    def phases(self) -> list[str]:
+        with self.lock:
+            return sorted(set(self.stages) | set(self.samples))
+
+    def to_dict(self) -> dict:
+        phases = {}
+        with self.lock:
+            for phase in sorted(set(self.stages) | set(self.samples)):
+                samples = list(self.samples.get(phase, []))
+                phases[phase] = {
+                    "stages": dict(self.stages.get(phase, {})),
+                    "latency": {op: histogram.to_dict() for (p, op), histogram in self.latency.items() if p == phase},
+                    "throughput": samples,
+                    "bytes": sum(samples),
+                }
+        for phase in phases:
+            phases[phase]['bound'] = self.bound(phase)
+        return {"job": self.name, "status": self.status, "started": self.started, "finished": self.finished,
+                "duration": (self.finished or time.time()) - self.started, "phases": phases}
+
+    def prometheus(self) -> str:
+        """Mesures au format texte de Prometheus, pour le collecteur « textfile » de node_exporter."""
+        data = self.to_dict()
+        # « job » est réservé par Prometheus au nom de la cible : l'opération est désignée par « clone ».
+        clone = _label(self.name)
+        lines = ["# HELP cloneurleger_job_running 1 tant que l'opération est en cours.",
+                 "# TYPE cloneurleger_job_running gauge",
+                 f'cloneurleger_job_running{{clone="{clone}"}} {int(data["status"] == "running")}',
+                 "# HELP cloneurleger_job_success 1 si l'opération s'est terminée sans échec.",
+                 "# TYPE cloneurleger_job_success gauge",
+                 f'cloneurleger_job_success{{clone="{clone}"}} {int(data["status"] == "ok")}',
+                 "# HELP cloneurleger_job_duration_seconds Durée de l'opération.",
+                 "# TYPE cloneurleger_job_duration_seconds gauge",
+                 f'cloneurleger_job_duration_seconds{{clone="{clone}"}} {data["duration"]:.3f}',
+                 "# HELP cloneurleger_bytes_total Octets traités par phase.",
+                 "# TYPE cloneurleger_bytes_total counter"]
+        for phase, values in data['phases'].items():
+            lines.append(f'cloneurleger_bytes_total{{clone="{clone}",phase="{phase}"}} {values["bytes"]}')
+        lines += ["# HELP cloneurleger_throughput_bytes_per_second Débit de la dernière seconde complète.",
+                  "# TYPE cloneurleger_throughput_bytes_per_second gauge"]
+        for phase, values in data['phases'].items():
+            samples = values['throughput']
+            last = samples[-2] if len(samples) > 1 else (samples[-1] if samples else 0)
+            lines.append(f'cloneurleger_throughput_bytes_per_second{{clone="{clone}",phase="{phase}"}} {last}')
+        lines += ["# HELP cloneurleger_stage_seconds_total Temps cumulé par étape (somme sur les threads).",
+                  "# TYPE cloneurleger_stage_seconds_total counter"]
+        for phase, values in data['phases'].items():
+            for stage, seconds in values['stages'].items():
+                lines.append(f'cloneurleger_stage_seconds_total{{clone="{clone}",phase="{phase}",stage="{stage}"}} '
+                             f'{seconds:.6f}')
+        lines += ["# HELP cloneurleger_io_latency_seconds Latence des requêtes d'E/S.",
+                  "# TYPE cloneurleger_io_latency_seconds histogram"]
+        for phase, values in data['phases'].items():
+            for op, histogram in values['latency'].items():
+                labels = f'clone="{clone}",phase="{phase}",op="{op}"'
+                for bound, count in histogram['buckets'].items():
+                    lines.append(f'cloneurleger_io_latency_seconds_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'cloneurleger_io_latency_seconds_sum{{{labels}}} {histogram["sum"]:.6f}')
+                lines.append(f'cloneurleger_io_latency_seconds_count{{{labels}}} {histogram["count"]}')
+        return "\n".join(lines) + "\n"
+
+class MeasuredIO:
+    """Moteur d'E/S (SyncIO, DeepQueueIO) dont chaque requête est chronométrée dans un JobMetrics."""
+
+    def __init__(self, io, metrics: JobMetrics, phase: str) -> None:
+        self.io = io
+        self.depth = io.depth
+        self.metrics = metrics
+        self.phase = phase
+
+    def read(self, fd: int, view: memoryview, offset: int) -> int:
+        start = time.perf_counter()
+        n = self.io.read(fd, view, offset)
+        self.metrics.observe_io(self.phase, "read", time.perf_counter() - start)
+        return n
+
+    def write(self, fd: int, view: memoryview, offset: int) -> None:
+        start = time.perf_counter()
+        self.io.write(fd, view, offset)
+        self.metrics.observe_io(self.phase, "write", time.perf_counter() - start)
+
+    def close(self) -> None:
+        self.io.close()
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")
+
+def metrics_key(source: str, dests: list[str]) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]", "_", "_".join(os.path.basename(path) for path in [source] + dests))
+
+def _write_atomic(path: str, text: str) -> None:
+    # node_exporter ne doit jamais lire un fichier à moitié écrit.
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def write_textfile(metrics: JobMetrics, key: str) -> Optional[str]:
+    """Écrit les mesures pour node_exporter, si son répertoire « textfile » existe ; le fichier d'un couple
+    source/destinations est réécrit à chaque mise à jour."""
+    if not os.path.isdir(TEXTFILE_DIR):
+        return None
+    path = os.path.join(TEXTFILE_DIR, f"cloneurleger_{key}.prom")
+    try:
+        _write_atomic(path, metrics.prometheus())
+    except OSError as e:
+        log_warning(f"Impossible d’écrire les mesures Prometheus {path} : {e}")
+        return None
+    return path
+
+def export_metrics(metrics: JobMetrics, key: str) -> Optional[str]:
+    """Enregistre les mesures d'une opération terminée en JSON (un fichier par opération) et pour Prometheus ;
+    retourne le chemin du fichier JSON."""
+    write_textfile(metrics, key)
+    path = os.path.join(METRICS_DIR, time.strftime("%Y%m%d-%H%M%S", time.localtime(metrics.started)) + f"_{key}.json")
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write_atomic(path, json.dumps(metrics.to_dict(), ensure_ascii=False))
+    except OSError as e:
+        log_warning(f"Impossible d’enregistrer les mesures {path} : {e}")
+        return None
+    log_info(f"Mesures de l’opération enregistrées : {path}")
+    return path
@@ -0,0 +1,324 @@
+import os
+import stat
+import fcntl
+import struct
+import uuid
+import zlib
+from typing import Optional
+
+from log_handler import log_warning
+
+BLKSSZGET = 0x1268
+DEFAULT_SECTOR_SIZE = 512
+EXTENDED_TYPES = {0x05, 0x0F, 0x85}
+GPT_PROTECTIVE_TYPE = 0xEE
+GPT_SIGNATURE = b"EFI PART"
+BOOT_AREA_LIMIT = 4 * 1024 * 1024
+
+def get_sector_size(fd: int) -> int:
+    """Retourne la taille de secteur logique d'un périphérique (512 pour un fichier)."""
+    if not stat.S_ISBLK(os.fstat(fd).st_mode):
+        return DEFAULT_SECTOR_SIZE
+    try:
+        buf = fcntl.ioctl(fd, BLKSSZGET, struct.pack("i", 0))
+        return struct.unpack("i", buf)[0]
+    except OSError:
+        return DEFAULT_SECTOR_SIZE
+
+def _read_mbr_entries(sector: bytes) -> list[tuple[int, int, int, int]]:
+    """Entrées non vides d'un MBR ou d'un EBR : (emplacement 1-4, type, premier secteur, nombre de secteurs)."""
+    entries = []
+    for i in range(4):
+        entry = sector[446 + i * 16:446 + (i + 1) * 16]
+        part_type = entry[4]
+        start_lba, num_sectors = struct.unpack_from("<II", entry, 8)
+        if part_type and num_sectors:
+            entries.append((i + 1, part_type, start_lba, num_sectors))
+    return entries
+
+def _parse_mbr(fd: int, mbr: bytes, sector_size: int) -> dict:
+    partitions = []
+    table_ranges = [(0, sector_size)]
+    # Comme le noyau : les primaires portent le numéro de leur emplacement (1-4, même si un précédent est vide),
+    # les logiques sont numérotées à partir de 5.
+    for number, part_type, start_lba, num_sectors in _read_mbr_entries(mbr):
+        if part_type in EXTENDED_TYPES:
+            ext_start = start_lba
+            ebr_lba = start_lba
+            logical_number = 5
+            seen = set()
+            while ebr_lba not in seen:
+                seen.add(ebr_lba)
+                ebr = os.pread(fd, sector_size, ebr_lba * sector_size)
+                if len(ebr) < 512 or ebr[510:512] != b"\x55\xaa":
+                    break
+                table_ranges.append((ebr_lba * sector_size, sector_size))
+                entries = _read_mbr_entries(ebr)
+                next_lba = None
+                for _, l_type, l_start, l_size in entries:
+                    if l_type in EXTENDED_TYPES:
+                        next_lba = ext_start + l_start
+                    else:
+                        partitions.append({
+                            "number": logical_number,
+                            "start": (ebr_lba + l_start) * sector_size,
+                            "size": l_size * sector_size,
+                            "type": f"0x{l_type:02x}",
+                            "name": "",
+                        })
+                        logical_number += 1
+                if next_lba is None:
+                    break
+                ebr_lba = next_lba
+        else:
+            partitions.append({
+                "number": number,
+                "start": start_lba * sector_size,
+                "size": num_sectors * sector_size,
+                "type": f"0x{part_type:02x}",
+                "name": "",
+            })
+    return {"scheme": "mbr", "sector_size": sector_size, "partitions": partitions,
+            "table_ranges": table_ranges}
+
+def _parse_gpt(fd: int, sector_size: int, disk_size: int) -> Optional[dict]:
+    header = os.pread(fd, sector_size, sector_size)
+    if header[:8] != GPT_SIGNATURE:
+        return None
+    header_size, = struct.unpack_from("<I", header, 12)
+    alternate_lba, first_usable, last_usable = struct.unpack_from("<QQQ", header, 32)
+    entries_lba, num_entries, entry_size = struct.unpack_from("<QII", header, 72)
+    entries_bytes = num_entries * entry_size
+    entries = os.pread(fd, entries_bytes, entries_lba * sector_size)
+    partitions = []
+    for i in range(num_entries):
+        entry = entries[i * entry_size:(i + 1) * entry_size]
+        if len(entry) < 128 or entry[:16] == b"\x00" * 16:
+            continue
+        first_lba, last_lba = struct.unpack_from("<QQ", entry, 32)
+        name = entry[56:128].decode("utf-16-le", errors="replace").rstrip("\x00")
+        partitions.append({
+            "number": i + 1,
+            "start": first_lba * sector_size,
+            "size": (last_lba - first_lba + 1) * sector_size,
+            "type": str(uuid.UUID(bytes_le=bytes(entry[:16]))),
+            "name": name,
+        })
+    entries_span = -(-entries_bytes // sector_size) * sector_size
+    table_ranges = [(0, (entries_lba * sector_size) + entries_span)]
+    if alternate_lba * sector_size < disk_size:
+        backup_start = alternate_lba * sector_size - entries_span
+        table_ranges.append((backup_start, entries_span + sector_size))
+    else:
+        log_warning("En-tête GPT de secours hors du disque : table probablement corrompue")
+    return {"scheme": "gpt", "sector_size": sector_size, "partitions": partitions,
+            "table_ranges": table_ranges, "header_size": header_size,
+            "first_usable": first_usable * sector_size, "last_usable": last_usable * sector_size,
+            "entries_lba": entries_lba, "num_entries": num_entries, "entry_size": entry_size}
+
+def read_partition_table(device: str) -> Optional[dict]:
+    """Lit la table de partitions MBR ou GPT d'un disque. Retourne None si aucune table n'est reconnue."""
+    fd = os.open(device, os.O_RDONLY)
+    try:
+        sector_size = get_sector_size(fd)
+        disk_size = os.lseek(fd, 0, os.SEEK_END)
+        mbr = os.pread(fd, sector_size, 0)
+        if len(mbr) < 512 or mbr[510:512] != b"\x55\xaa":
+            return None
+        primary = _read_mbr_entries(mbr)
+        if any(part_type == GPT_PROTECTIVE_TYPE for _, part_type, _, _ in primary):
+            table = _parse_gpt(fd, sector_size, disk_size)
+            if table is not None:
+                table["disk_size"] = disk_size
+                return table
+            log_warning(f"MBR protecteur sans en-tête GPT valide sur {device}")
+            return None
+        table = _parse_mbr(fd, mbr, sector_size)
+        table["disk_size"] = disk_size
+        return table
+    finally:
+        os.close(fd)
+
+def select_partitions(table: dict, numbers: list[int]) -> list[dict]:
+    """Partitions de la table correspondant aux numéros demandés, dans l'ordre du disque."""
+    known = {part["number"]: part for part in table["partitions"]}
+    unknown = sorted(set(numbers) - set(known))
+    if unknown:
+        raise ValueError(f"Partition(s) inexistante(s) sur la source : {', '.join(map(str, unknown))}")
+    if not numbers:
+        raise ValueError("Aucune partition sélectionnée")
+    return sorted((known[number] for number in set(numbers)), key=lambda part: part["start"])
+
+def boot_area_size(table: dict) -> int:
+    """Zone recopiée telle quelle avant la première partition (MBR, chargeur d'amorçage, GPT primaire), bornée."""
+    first = min((part["start"] for part in table["partitions"]), default=table["sector_size"])
+    offset, length = table["table_ranges"][0]
+    table_end = offset + length
+    return max(table_end, min(first, BOOT_AREA_LIMIT))
+
+def required_size(table: dict, numbers: list[int]) -> int:
+    """Taille minimale d'une destination recevant les partitions choisies (et, en GPT, la table de secours)."""
+    end = max(part["start"] + part["size"] for part in select_partitions(table, numbers))
+    end = max(end, boot_area_size(table))
+    if table["scheme"] == "gpt":
+        entries_span = -(-table["num_entries"] * table["entry_size"] // table["sector_size"]) * table["sector_size"]
+        end += entries_span + table["sector_size"]
+    return end
+
+def _gpt_header(header: bytes, my_lba: int, alternate_lba: int, last_usable: int, entries_lba: int,
+                entries_crc: int) -> bytes:
+    header_size, = struct.unpack_from("<I", header, 12)
+    new = bytearray(header[:header_size])
+    struct.pack_into("<QQ", new, 24, my_lba, alternate_lba)
+    struct.pack_into("<Q", new, 48, last_usable)
+    struct.pack_into("<Q", new, 72, entries_lba)
+    struct.pack_into("<I", new, 88, entries_crc)
+    struct.pack_into("<I", new, 16, 0)
+    struct.pack_into("<I", new, 16, zlib.crc32(new) & 0xFFFFFFFF)
+    return bytes(new)
+
+def _pad(data: bytes, sector_size: int) -> bytes:
+    return data + b"\x00" * (-len(data) % sector_size)
+
+def _write_gpt(src_fd: int, dest_fd: int, table: dict, numbers: set[int], dest_size: int) -> None:
+    sector_size = table["sector_size"]
+    header = os.pread(src_fd, sector_size, sector_size)
+    entries_bytes = table["num_entries"] * table["entry_size"]
+    entries = bytearray(os.pread(src_fd, entries_bytes, table["entries_lba"] * sector_size))
+    for index in range(table["num_entries"]):
+        if index + 1 not in numbers:
+            entries[index * table["entry_size"]:(index + 1) * table["entry_size"]] = b"\x00" * table["entry_size"]
+    entries_sectors = -(-entries_bytes // sector_size)
+    last_lba = dest_size // sector_size - 1
+    backup_entries_lba = last_lba - entries_sectors
+    last_usable = backup_entries_lba - 1
+    for part in table["partitions"]:
+        if part["number"] in numbers and (part["start"] + part["size"]) // sector_size - 1 > last_usable:
+            raise ValueError(f"La partition {part['number']} dépasse la zone utilisable de la destination")
+    entries_crc = zlib.crc32(entries) & 0xFFFFFFFF
+    primary = _gpt_header(header, 1, last_lba, last_usable, table["entries_lba"], entries_crc)
+    backup = _gpt_header(header, last_lba, 1, last_usable, backup_entries_lba, entries_crc)
+    # Le MBR protecteur couvre tout le disque de destination (au plus 2^32 - 1 secteurs).
+    mbr = bytearray(os.pread(src_fd, sector_size, 0))
+    for i in range(4):
+        if mbr[446 + i * 16 + 4] == GPT_PROTECTIVE_TYPE:
+            struct.pack_into("<I", mbr, 446 + i * 16 + 12, min(last_lba, 0xFFFFFFFF))
+    os.pwrite(dest_fd, bytes(mbr), 0)
+    os.pwrite(dest_fd, _pad(primary, sector_size), sector_size)
+    os.pwrite(dest_fd, _pad(bytes(entries), sector_size), table["entries_lba"] * sector_size)
+    os.pwrite(dest_fd, _pad(bytes(entries), sector_size), backup_entries_lba * sector_size)
+    os.pwrite(dest_fd, _pad(backup, sector_size), last_lba * sector_size)
+
+def _write_mbr(src_fd: int, dest_fd: int, table: dict, numbers: set[int]) -> dict[int, int]:
+    """Écrit le MBR réduit aux partitions choisies et retourne la numérotation {numéro source: numéro destination}."""
+    sector_size = table["sector_size"]
+    mbr = bytearray(os.pread(src_fd, sector_size, 0))
+    keep_logical = any(number >= 5 for number in numbers)
+    numbering = {}
+    for i in range(4):
+        number = i + 1
+        entry = 446 + i * 16
+        part_type = mbr[entry + 4]
+        num_sectors, = struct.unpack_from("<I", mbr, entry + 12)
+        if not part_type or not num_sectors:
+            continue
+        keep = keep_logical if part_type in EXTENDED_TYPES else number in numbers
+        if not keep:
+            mbr[entry:entry + 16] = b"\x00" * 16
+        elif part_type in EXTENDED_TYPES:
+            ext_start, = struct.unpack_from("<I", mbr, entry + 8)
+            ext_start, ext_end, logicals = _write_ebr_chain(src_fd, dest_fd, ext_start, sector_size, numbers)
+            # La partition étendue va du premier EBR gardé à la dernière logique gardée.
+            struct.pack_into("<II", mbr, entry + 8, ext_start, ext_end - ext_start)
+            numbering.update(logicals)
+        else:
+            numbering[number] = number
+    os.pwrite(dest_fd, bytes(mbr), 0)
+    return numbering
+
+def _write_ebr_chain(src_fd: int, dest_fd: int, ext_start: int, sector_size: int,
+                     numbers: set[int]) -> tuple[int, int, dict[int, int]]:
+    """Recopie la chaîne des EBR en n'y gardant que ceux des partitions logiques choisies : chaque EBR gardé pointe
+    sur le suivant gardé, relativement au début de la partition étendue, qui devient le premier EBR gardé.
+    Le noyau numérote les logiques dans l'ordre de la chaîne à partir de 5 : celles qui suivent une logique écartée
+    changent donc de numéro. Retourne (début, fin de la partition étendue en secteurs, {numéro source: numéro
+    destination})."""
+    chain = []
+    ebr_lba = ext_start
+    logical_number = 5
+    seen = set()
+    while ebr_lba not in seen:
+        seen.add(ebr_lba)
+        ebr = bytearray(os.pread(src_fd, sector_size, ebr_lba * sector_size))
+        if len(ebr) < 512 or ebr[510:512] != b"\x55\xaa":
+            break
+        next_lba = None
+        link = None
+        kept_end = None
+        kept = []
+        for i in range(4):
+            entry = 446 + i * 16
+            part_type = ebr[entry + 4]
+            start_lba, num_sectors = struct.unpack_from("<II", ebr, entry + 8)
+            if not part_type or not num_sectors:
+                continue
+            if part_type in EXTENDED_TYPES:
+                next_lba = ext_start + start_lba
+                link = entry
+                continue
+            if logical_number in numbers:
+                kept_end = ebr_lba + start_lba + num_sectors
+                kept.append(logical_number)
+            else:
+                ebr[entry:entry + 16] = b"\x00" * 16
+            logical_number += 1
+        if kept:
+            chain.append((ebr_lba, ebr, link, kept_end, kept))
+        if next_lba is None:
+            break
+        ebr_lba = next_lba
+    new_start = chain[0][0]
+    numbering = {}
+    for index, (ebr_lba, ebr, link, _, kept) in enumerate(chain):
+        for number in kept:
+            numbering[number] = 5 + len(numbering)
+        if index + 1 < len(chain):
+            next_lba, _, _, next_end, _ = chain[index + 1]
+            struct.pack_into("<II", ebr, link + 8, next_lba - new_start, next_end - next_lba)
+        elif link is not None:
+            ebr[link:link + 16] = b"\x00" * 16
+        os.pwrite(dest_fd, bytes(ebr), ebr_lba * sector_size)
+    return new_start, chain[-1][3], numbering
+
+def write_partition_table(source: str, dest: str, numbers: list[int]) -> dict:
+    """Recopie sur `dest` la zone d'amorçage de `source` puis une table de partitions réduite aux partitions choisies.
+    En GPT, les en-têtes primaire et de secours sont recalculés pour la taille de la destination. Le rapport donne
+    la numérotation sur la destination ({numéro source: numéro destination}), qui diffère pour les logiques MBR
+    placées après une logique écartée."""
+    table = read_partition_table(source)
+    if table is None:
+        raise ValueError(f"Aucune table de partitions reconnue sur {source}")
+    selected = {part["number"] for part in select_partitions(table, numbers)}
+    src_fd = os.open(source, os.O_RDONLY)
+    try:
+        dest_fd = os.open(dest, os.O_WRONLY)
+        try:
+            if get_sector_size(dest_fd) != table["sector_size"]:
+                raise ValueError(f"Taille de secteur différente entre {source} et {dest}")
+            dest_size = os.lseek(dest_fd, 0, os.SEEK_END)
+            boot_area = boot_area_size(table)
+            if dest_size < required_size(table, numbers):
+                raise ValueError(f"Les partitions choisies ne tiennent pas sur {dest} ({dest_size} octets)")
+            os.pwrite(dest_fd, os.pread(src_fd, boot_area, 0), 0)
+            if table["scheme"] == "gpt":
+                _write_gpt(src_fd, dest_fd, table, selected, dest_size)
+                numbering = {number: number for number in selected}
+            else:
+                numbering = _write_mbr(src_fd, dest_fd, table, selected)
+            os.fsync(dest_fd)
+        finally:
+            os.close(dest_fd)
+    finally:
+        os.close(src_fd)
+    return {"scheme": table["scheme"], "partitions": sorted(selected), "boot_area": boot_area,
+            "dest_size": dest_size, "numbering": numbering}
@@ -0,0 +1,82 @@
+import time
+import threading
+from collections import deque
+from typing import Optional
+
+from log_handler import log_info
+
+DEFAULT_LOG_INTERVAL = 30.0
+RATE_WINDOW = 5.0
+
+def format_bytes(n: float) -> str:
+    for unit in ("o", "Ko", "Mo", "Go", "To"):
+        if abs(n) < 1000 or unit == "To":
+            return f"{n:.1f} {unit}" if unit != "o" else f"{int(n)} o"
+        n /= 1000
+    return f"{n:.1f} To"
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "--:--:--"
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+class ProgressTracker:
+    """Suit les octets traités d'une opération : pourcentage, débit instantané et moyen, temps restant.
+    Un résumé est écrit dans le journal toutes les `log_interval` secondes."""
+
+    def __init__(self, total: int, label: str, log_interval: float = DEFAULT_LOG_INTERVAL) -> None:
+        self.total = total
+        self.label = label
+        self.log_interval = log_interval
+        self.start = time.monotonic()
+        self.bytes_done = 0
+        self._samples: deque = deque([(self.start, 0)])
+        self._last_log = self.start
+        self._lock = threading.Lock()
+
+    def update(self, bytes_done: int, total: Optional[int] = None) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            if total:
+                self.total = total
+            self.bytes_done = bytes_done
+            self._samples.append((now, bytes_done))
+            while len(self._samples) > 2 and now - self._samples[0][0] > RATE_WINDOW:
+                self._samples.popleft()
+            snapshot = self._snapshot(now)
+            should_log = now - self._last_log >= self.log_interval
+            if should_log:
+                self._last_log = now
+        if should_log:
+            log_info(f"{self.label} : {self.describe(snapshot)}")
+        return snapshot
+
+    def _snapshot(self, now: float) -> dict:
+        elapsed = now - self.start
+        first_time, first_bytes = self._samples[0]
+        window = now - first_time
+        instant = (self.bytes_done - first_bytes) / window if window > 0 else 0.0
+        average = self.bytes_done / elapsed if elapsed > 0 else 0.0
+        remaining = max(0, self.total - self.bytes_done)
+        rate = instant or average
+        eta = remaining / rate if rate > 0 else None
+        percent = self.bytes_done * 100 / self.total if self.total else 0.0
+        return {"bytes_done": self.bytes_done, "total": self.total, "percent": min(100.0, percent),
+                "instant_rate": instant, "average_rate": average, "elapsed": elapsed, "eta": eta}
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._snapshot(time.monotonic())
+
+    @staticmethod
+    def describe(snapshot: dict) -> str:
+        return (f"{format_bytes(snapshot['bytes_done'])} / {format_bytes(snapshot['total'])} "
+                f"({snapshot['percent']:.1f} %) - {format_bytes(snapshot['instant_rate'])}/s "
+                f"(moy. {format_bytes(snapshot['average_rate'])}/s) - reste {format_duration(snapshot['eta'])}")
+
+    def finish(self) -> dict:
+        snapshot = self.snapshot()
+        log_info(f"{self.label} terminé : {format_bytes(snapshot['bytes_done'])} en "
+                 f"{format_duration(snapshot['elapsed'])} (moy. {format_bytes(snapshot['average_rate'])}/s)")
+        return snapshot
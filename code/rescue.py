@@ -0,0 +1,177 @@
+import os
+import mmap
+import stat
+import time
+from typing import Callable, Optional
+
+from log_handler import log_info, log_warning
+from copy_engine import DEFAULT_BLOCK_SIZE, get_device_size, merge_ranges, open_device, read_full, write_full
+from partitions import get_sector_size
+
+DEFAULT_RETRIES = 2
+SPLIT_FACTOR = 16
+MAX_SKIP_BLOCKS = 16
+FILL_PATTERN = b"CLONEUR-ILLISIB\n"
+BAD_MAP_DIR = "/var/log"
+
+def bad_map_path(serial: str) -> str:
+    return os.path.join(BAD_MAP_DIR, f"cloneur_secteurs_illisibles_{serial}_{time.strftime('%Y%m%d-%H%M%S')}.txt")
+
+class RescueEngine:
+    """Copie de sauvetage d'un disque défaillant, en trois passes :
+    1. lecture par grands blocs des zones saines ; après une erreur, la zone suivante est sautée (saut doublé à chaque
+       échec consécutif) pour s'éloigner au plus vite de la zone abîmée ;
+    2. relecture des zones en attente avec des blocs de plus en plus petits, jusqu'au secteur ;
+    3. `retries` nouvelles tentatives par secteur encore illisible.
+    Les secteurs définitivement illisibles sont remplis avec FILL_PATTERN et consignés dans la carte `map_path`."""
+
+    def __init__(self, source: str, dest, block_size: int = DEFAULT_BLOCK_SIZE, retries: int = DEFAULT_RETRIES,
+                 direct: bool = True, progress_callback: Optional[Callable[[int, int], None]] = None,
+                 stop_flag: Optional[Callable[[], bool]] = None, map_path: Optional[str] = None) -> None:
+        self.source = source
+        self.dests = [dest] if isinstance(dest, str) else list(dest)
+        self.block_size = block_size
+        self.retries = max(0, retries)
+        self.direct = direct
+        self.progress_callback = progress_callback
+        self.stop_flag = stop_flag
+        self.map_path = map_path
+        self.total = 0
+        self.bytes_rescued = 0
+        self.bytes_lost = 0
+        self.read_errors = 0
+        self.bad_ranges: list[tuple[int, int]] = []
+
+    def _check_stop(self) -> None:
+        if self.stop_flag and self.stop_flag():
+            raise KeyboardInterrupt("Opération annulée par l’utilisateur")
+
+    def _progress(self) -> None:
+        if self.progress_callback:
+            self.progress_callback(self.bytes_rescued + self.bytes_lost, self.total)
+
+    def _read(self, fd: int, view: memoryview, offset: int, length: int) -> bool:
+        """Lit `length` octets ; False si le support renvoie une erreur de lecture."""
+        try:
+            n = read_full(fd, view[:length], offset)
+        except OSError:
+            self.read_errors += 1
+            return False
+        if n < length:
+            raise IOError(f"Fin inattendue de la source {self.source} à l’offset {offset + n}")
+        return True
+
+    def _write(self, fds: list[int], view: memoryview, offset: int) -> None:
+        for fd in fds:
+            write_full(fd, view, offset)
+
+    def _copy_pass(self, src_fd: int, fds: list[int], buffer: memoryview) -> list[tuple[int, int]]:
+        pending = []
+        offset = 0
+        skip = self.block_size
+        while offset < self.total:
+            self._check_stop()
+            n = min(self.block_size, self.total - offset)
+            if self._read(src_fd, buffer, offset, n):
+                self._write(fds, buffer[:n], offset)
+                self.bytes_rescued += n
+                skip = self.block_size
+                offset += n
+            else:
+                n = min(skip, self.total - offset)
+                pending.append((offset, n))
+                log_warning(f"Sauvetage : erreur de lecture vers l’offset {offset}, {n} octets reportés")
+                skip = min(skip * 2, self.block_size * MAX_SKIP_BLOCKS)
+                offset += n
+            self._progress()
+        return merge_ranges(pending)
+
+    def _split_pass(self, src_fd: int, fds: list[int], buffer: memoryview, pending: list[tuple[int, int]],
+                    size: int, attempts: int = 1) -> list[tuple[int, int]]:
+        """Relit les zones en attente par morceaux de `size` octets et retourne celles qui restent illisibles."""
+        failed = []
+        for start, length in pending:
+            offset = start
+            end = start + length
+            while offset < end:
+                self._check_stop()
+                n = min(size, end - offset)
+                for _ in range(attempts):
+                    if self._read(src_fd, buffer, offset, n):
+                        self._write(fds, buffer[:n], offset)
+                        self.bytes_rescued += n
+                        self._progress()
+                        break
+                else:
+                    failed.append((offset, n))
+                offset += n
+        return merge_ranges(failed)
+
+    def _fill(self, fds: list[int], buffer: memoryview, sector_size: int) -> None:
+        pattern = FILL_PATTERN * (len(buffer) // len(FILL_PATTERN))
+        buffer[:len(pattern)] = pattern
+        for start, length in self.bad_ranges:
+            offset = start
+            end = start + length
+            while offset < end:
+                n = min(len(pattern) // sector_size * sector_size, end - offset)
+                self._write(fds, buffer[:n], offset)
+                offset += n
+            self.bytes_lost += length
+            self._progress()
+
+    def write_map(self) -> None:
+        if not self.map_path:
+            return
+        pending = self.bytes_rescued + self.bytes_lost < self.total
+        with open(self.map_path, "w", encoding="utf-8") as f:
+            f.write(f"# Source : {self.source}\n# Taille : {self.total} octets\n")
+            f.write(f"# Récupérés : {self.bytes_rescued} octets, perdus : {self.bytes_lost} octets"
+                    f"{' (sauvetage interrompu)' if pending else ''}\n")
+            f.write("# offset longueur (octets) des zones illisibles, remplies avec le motif "
+                    f"{FILL_PATTERN!r}\n")
+            for offset, length in self.bad_ranges:
+                f.write(f"{offset} {length}\n")
+
+    def run(self) -> dict:
+        self.total = get_device_size(self.source)
+        src_fd, direct = open_device(self.source, os.O_RDONLY, self.direct)
+        fds = []
+        start = time.monotonic()
+        try:
+            sector_size = get_sector_size(src_fd)
+            for path in self.dests:
+                fds.append(os.open(path, os.O_WRONLY | os.O_CREAT))
+                dest_size = os.lseek(fds[-1], 0, os.SEEK_END)
+                if stat.S_ISBLK(os.fstat(fds[-1]).st_mode) and dest_size < self.total:
+                    raise IOError(f"La destination {path} ({dest_size} octets) est plus petite que la source ({self.total} octets)")
+            buffer = memoryview(mmap.mmap(-1, self.block_size))
+            log_info(f"Sauvetage : {self.source} -> {', '.join(self.dests)}, {self.total} octets, "
+                     f"blocs de {self.block_size // 1024} Kio, secteurs de {sector_size} octets, O_DIRECT={direct}")
+            pending = self._copy_pass(src_fd, fds, buffer)
+            size = self.block_size // SPLIT_FACTOR
+            while pending and size > sector_size:
+                log_info(f"Sauvetage : relecture de {sum(n for _, n in pending)} octets par blocs de {size} octets")
+                pending = self._split_pass(src_fd, fds, buffer, pending, size)
+                size //= SPLIT_FACTOR
+            if pending:
+                log_info(f"Sauvetage : relecture secteur par secteur de {sum(n for _, n in pending)} octets "
+                         f"({self.retries + 1} tentative(s))")
+                pending = self._split_pass(src_fd, fds, buffer, pending, sector_size, self.retries + 1)
+            self.bad_ranges = pending
+            self._fill(fds, buffer, sector_size)
+            for fd in fds:
+                os.fdatasync(fd)
+        finally:
+            os.close(src_fd)
+            for fd in fds:
+                os.close(fd)
+            try:
+                self.write_map()
+            except OSError as e:
+                log_warning(f"Impossible d’écrire la carte des secteurs illisibles {self.map_path} : {e}")
+        duration = time.monotonic() - start
+        log_info(f"Sauvetage terminé : {self.bytes_rescued} octets récupérés, {self.bytes_lost} octets perdus "
+                 f"en {len(self.bad_ranges)} zone(s), {self.read_errors} erreur(s) de lecture, {duration:.0f} s")
+        return {"bytes_rescued": self.bytes_rescued, "bytes_lost": self.bytes_lost, "bad_ranges": self.bad_ranges,
+                "read_errors": self.read_errors, "total": self.total, "duration": duration, "map_path": self.map_path}
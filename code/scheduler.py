@@ -0,0 +1,194 @@
+import os
+import re
+import stat
+import time
+import itertools
+import threading
+import subprocess
+from typing import Callable, Optional
+
+from log_handler import log_info, log_error
+
+SYS_CLASS_BLOCK = "/sys/class/block"
+DEFAULT_MAX_JOBS = 4
+DEFAULT_PER_LINK = 1
+USB_DEVICE = re.compile(r"^\d+-\d+(\.\d+)*$")
+ATA_PORT = re.compile(r"^ata\d+$")
+PCI_FUNCTION = re.compile(r"^[0-9a-f]{4}:[0-9a-f]{2}:[0-9a-f]{2}\.[0-7]$")
+FINAL_STATES = ("ok", "failed", "stopped", "error")
+
+def device_link(path: str) -> Optional[str]:
+    """Lien partagé par lequel passe un périphérique, d'après son chemin sysfs : hub USB, port SATA (un multiplicateur
+    de ports y place plusieurs disques) ou contrôleur PCI (HBA). None pour un fichier ou un périphérique virtuel."""
+    try:
+        if not stat.S_ISBLK(os.stat(path).st_mode):
+            return None
+    except OSError:
+        return None
+    name = os.path.basename(os.path.realpath(path))
+    parts = os.path.realpath(os.path.join(SYS_CLASS_BLOCK, name)).split("/")
+    usb = [index for index, part in enumerate(parts) if USB_DEVICE.match(part)]
+    if usb:
+        # Le parent du périphérique USB est son hub (ou le hub racine du contrôleur) : tous ses ports en partagent le débit.
+        return "usb:" + "/".join(parts[:usb[-1]])
+    ata = [part for part in parts if ATA_PORT.match(part)]
+    if ata:
+        return f"ata:{ata[-1]}"
+    pci = [part for part in parts if PCI_FUNCTION.match(part)]
+    if pci:
+        return f"pci:{pci[-1]}"
+    return None
+
+class JobScheduler:
+    """File de travaux de clonage exécutés en parallèle. Un travail démarre dès qu'aucun de ses périphériques n'est
+    utilisé par un autre et que chacun de ses liens (hub USB, port SATA, HBA) porte moins de `per_link` travaux ;
+    sinon il attend sans retenir les suivants, qui partent s'ils passent par d'autres contrôleurs.
+    `status_callback(instantané)` est appelé depuis n'importe quel thread à chaque changement d'état d'un travail ;
+    `busy_devices()` signale les périphériques occupés hors de la file (le clonage lancé directement par l'interface)."""
+
+    def __init__(self, max_jobs: int = DEFAULT_MAX_JOBS, per_link: int = DEFAULT_PER_LINK,
+                 status_callback: Optional[Callable[[dict], None]] = None,
+                 busy_devices: Optional[Callable[[], set]] = None,
+                 link_resolver: Callable[[str], Optional[str]] = device_link) -> None:
+        self.max_jobs = max(1, max_jobs)
+        self.per_link = max(1, per_link)
+        self.status_callback = status_callback
+        self.busy_devices = busy_devices or set
+        self.link_resolver = link_resolver
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.entries: dict[int, dict] = {}
+        self.ids = itertools.count(1)
+
+    def submit(self, job) -> int:
+        """Ajoute un CloneJob à la file et retourne son numéro. Son `stop_flag` est complété par l'annulation."""
+        cancel = threading.Event()
+        previous = job.stop_flag
+        job.stop_flag = lambda: cancel.is_set() or previous()
+        devices = {os.path.realpath(path) for path in [job.source] + job.dests}
+        links = {link for link in map(self.link_resolver, [job.source] + job.dests) if link is not None}
+        with self.lock:
+            job_id = next(self.ids)
+            entry = {"id": job_id, "job": job, "devices": devices, "links": links, "status": "queued",
+                     "result": None, "error": None, "cancel": cancel, "submitted": time.time(),
+                     "started": None, "finished": None}
+            self.entries[job_id] = entry
+            snapshot = self._snapshot(entry)
+        log_info(f"Travail {job_id} en file : {job.source} -> {', '.join(job.dests)} "
+                 f"(liens : {', '.join(sorted(links)) or 'aucun'})")
+        self._notify([snapshot])
+        self.schedule()
+        return job_id
+
+    def _snapshot(self, entry: dict) -> dict:
+        job = entry['job']
+        return {"id": entry['id'], "source": job.source, "targets": list(job.dests), "method": job.method,
+                "status": entry['status'], "links": sorted(entry['links']), "result": entry['result'],
+                "error": entry['error'], "started": entry['started'], "finished": entry['finished']}
+
+    def _notify(self, snapshots: list[dict]) -> None:
+        if self.status_callback is not None:
+            for snapshot in snapshots:
+                self.status_callback(snapshot)
+
+    def schedule(self) -> None:
+        """Démarre les travaux en attente qui peuvent l'être ; à rappeler quand un périphérique externe se libère."""
+        started = []
+        with self.lock:
+            running = [entry for entry in self.entries.values() if entry['status'] == "running"]
+            busy = set().union(*(entry['devices'] for entry in running))
+            busy |= {os.path.realpath(device) for device in self.busy_devices()}
+            link_use: dict[str, int] = {}
+            for entry in running:
+                for link in entry['links']:
+                    link_use[link] = link_use.get(link, 0) + 1
+            for entry in sorted(self.entries.values(), key=lambda e: e['id']):
+                if len(running) >= self.max_jobs:
+                    break
+                if entry['status'] != "queued":
+                    continue
+                if entry['devices'] & busy or any(link_use.get(link, 0) >= self.per_link for link in entry['links']):
+                    continue
+                entry['status'] = "running"
+                entry['started'] = time.time()
+                running.append(entry)
+                busy |= entry['devices']
+                for link in entry['links']:
+                    link_use[link] = link_use.get(link, 0) + 1
+                started.append(entry)
+            snapshots = [self._snapshot(entry) for entry in started]
+        self._notify(snapshots)
+        for entry in started:
+            threading.Thread(target=self._run, args=(entry,), daemon=True).start()
+
+    def _run(self, entry: dict) -> None:
+        job = entry['job']
+        status = "error"
+        result = None
+        error = None
+        try:
+            result = job.run()
+            status = result['status']
+        except KeyboardInterrupt:
+            status = "stopped"
+        except (OSError, IOError, subprocess.SubprocessError, MemoryError) as e:
+            error = str(e)
+            log_error(f"Travail {entry['id']} en échec : {error}")
+        except Exception as e:
+            # Toute autre erreur doit aussi amener le travail à un état final : sinon wait() ne rendrait jamais la main.
+            error = f"{type(e).__name__} : {e}"
+            log_error(f"Travail {entry['id']} en erreur inattendue : {error}")
+        log_info(f"Travail {entry['id']} terminé : {status}")
+        # L'état final est signalé avant d'être visible de wait() : l'appelant le reçoit avant la fin de l'attente.
+        with self.lock:
+            snapshot = {**self._snapshot(entry), "status": status, "result": result, "error": error,
+                        "finished": time.time()}
+        self._notify([snapshot])
+        with self.changed:
+            entry.update(status=status, result=result, error=error, finished=snapshot['finished'])
+            self.changed.notify_all()
+        self.schedule()
+
+    def cancel(self, job_id: int) -> None:
+        """Arrête un travail en cours, ou le retire de la file s'il n'a pas encore démarré."""
+        with self.changed:
+            entry = self.entries.get(job_id)
+            if entry is None or entry['status'] in FINAL_STATES:
+                return
+            entry['cancel'].set()
+            snapshot = None
+            if entry['status'] == "queued":
+                entry['status'] = "stopped"
+                entry['finished'] = time.time()
+                snapshot = self._snapshot(entry)
+                self.changed.notify_all()
+        if snapshot is not None:
+            self._notify([snapshot])
+
+    def job(self, job_id: int):
+        """CloneJob d'un travail encore en attente ou en cours, None sinon."""
+        with self.lock:
+            entry = self.entries.get(job_id)
+            return entry['job'] if entry is not None and entry['status'] not in FINAL_STATES else None
+
+    def cancel_all(self) -> None:
+        for job_id in list(self.entries):
+            self.cancel(job_id)
+
+    def active(self) -> bool:
+        with self.lock:
+            return any(entry['status'] in ("queued", "running") for entry in self.entries.values())
+
+    def running_devices(self) -> set[str]:
+        with self.lock:
+            return set().union(*(entry['devices'] for entry in self.entries.values() if entry['status'] == "running"))
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin de tous les travaux ; False si `timeout` expire avant."""
+        with self.changed:
+            return self.changed.wait_for(lambda: not any(entry['status'] in ("queued", "running")
+                                                         for entry in self.entries.values()), timeout)
+
+    def snapshot(self) -> list[dict]:
+        with self.lock:
+            return [self._snapshot(entry) for entry in sorted(self.entries.values(), key=lambda e: e['id'])]
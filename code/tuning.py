@@ -0,0 +1,132 @@
+import os
+import mmap
+import stat
+import time
+from typing import Optional
+
+from copy_engine import ALIGNMENT, DEFAULT_BLOCK_SIZE, DEFAULT_BUFFER_COUNT, get_device_size, open_device, read_full
+from verify_engine import drop_page_cache
+from progress import format_bytes
+
+SYS_CLASS_BLOCK = "/sys/class/block"
+MIN_BLOCK_SIZE = 1024 * 1024
+MAX_BLOCK_SIZE = 16 * 1024 * 1024
+ROTATIONAL_BLOCK_SIZE = 8 * 1024 * 1024
+SSD_MIN_BLOCK_SIZE = 4 * 1024 * 1024
+USB_MAX_BLOCK_SIZE = 4 * 1024 * 1024
+REQUESTS_PER_BLOCK = 8
+MAX_BUFFER_MEMORY = 256 * 1024 * 1024
+SSD_BUFFER_COUNT = 8
+USB_BUFFER_COUNT = 2
+CALIBRATION_SIZES = (1024 * 1024, 4 * 1024 * 1024, 16 * 1024 * 1024)
+CALIBRATION_TIME = 0.5
+CALIBRATION_MARGIN = 0.05
+
+def _read_int(path: str) -> int:
+    try:
+        with open(path, "r") as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return 0
+
+def queue_limits(path: str) -> Optional[dict]:
+    """Attributs de file d'attente sysfs du disque portant `path` (celui du disque parent pour une partition).
+    None pour un fichier ordinaire ou un périphérique sans entrée sysfs."""
+    try:
+        if not stat.S_ISBLK(os.stat(path).st_mode):
+            return None
+    except OSError:
+        return None
+    name = os.path.basename(os.path.realpath(path))
+    sys_dir = os.path.realpath(os.path.join(SYS_CLASS_BLOCK, name))
+    if os.path.exists(os.path.join(sys_dir, "partition")):
+        sys_dir = os.path.dirname(sys_dir)
+    queue = os.path.join(sys_dir, "queue")
+    if not os.path.isdir(queue):
+        return None
+    return {"device": os.path.basename(sys_dir),
+            "rotational": _read_int(os.path.join(queue, "rotational")) == 1,
+            "optimal_io_size": _read_int(os.path.join(queue, "optimal_io_size")),
+            "max_sectors_kb": _read_int(os.path.join(queue, "max_sectors_kb")),
+            "physical_block_size": _read_int(os.path.join(queue, "physical_block_size")),
+            "logical_block_size": _read_int(os.path.join(queue, "logical_block_size")),
+            "nr_requests": _read_int(os.path.join(queue, "nr_requests")),
+            "usb": "/usb" in sys_dir}
+
+def _round_up_pow2(value: int) -> int:
+    return 1 << max(0, value - 1).bit_length()
+
+def calibrate_read(path: str, sizes: tuple[int, ...] = CALIBRATION_SIZES,
+                   duration: float = CALIBRATION_TIME) -> dict[int, float]:
+    """Débit de lecture séquentielle mesuré pour chaque taille de bloc, pendant `duration` secondes au plus.
+    Seule la source est lue : une écriture d'essai abîmerait ce que la reprise ou l'incrémental supposent intact."""
+    device_size = get_device_size(path)
+    fd, direct = open_device(path, os.O_RDONLY, True)
+    buf = mmap.mmap(-1, max(sizes))
+    rates = {}
+    try:
+        for size in sizes:
+            if not direct:
+                drop_page_cache(fd)
+            view = memoryview(buf)[:size]
+            offset = 0
+            start = time.monotonic()
+            elapsed = 0.0
+            while elapsed < duration and offset + size <= device_size:
+                n = read_full(fd, view, offset)
+                if n <= 0:
+                    break
+                offset += n
+                elapsed = time.monotonic() - start
+            view.release()
+            rates[size] = offset / elapsed if elapsed > 0 else 0.0
+    finally:
+        buf.close()
+        os.close(fd)
+    return rates
+
+def choose_io_params(source: str, dests: list[str], calibrate: bool = False) -> dict:
+    """Choisit la taille des tampons et le nombre de tampons en vol pour un couple source/destinations à partir des
+    attributs sysfs (rotational, optimal_io_size, max_sectors_kb, physical_block_size), éventuellement affinée par
+    une lecture d'essai de la source. Renvoie {block_size, buffer_count, reason, limits, calibration}."""
+    limits = {path: queue_limits(path) for path in [source] + list(dests)}
+    known = [value for value in limits.values() if value is not None]
+    if not known:
+        return {"block_size": DEFAULT_BLOCK_SIZE, "buffer_count": DEFAULT_BUFFER_COUNT,
+                "reason": "aucun attribut sysfs (fichiers ordinaires) : valeurs par défaut",
+                "limits": limits, "calibration": None}
+    alignment = max([ALIGNMENT] + [value['physical_block_size'] for value in known]
+                    + [value['logical_block_size'] for value in known])
+    # Un tampon couvre plusieurs requêtes de taille maximale, que le noyau peut alors enchaîner sans attente.
+    request = max(max(value['max_sectors_kb'] * 1024, value['optimal_io_size']) for value in known)
+    block_size = min(MAX_BLOCK_SIZE, max(MIN_BLOCK_SIZE, _round_up_pow2(request * REQUESTS_PER_BLOCK)))
+    usb = any(value['usb'] for value in known)
+    rotational = any(value['rotational'] for value in known)
+    if usb:
+        block_size = min(block_size, USB_MAX_BLOCK_SIZE)
+        buffer_count = USB_BUFFER_COUNT
+        reason = "périphérique USB : tampons modérés, peu de requêtes en vol"
+    elif rotational:
+        block_size = max(block_size, ROTATIONAL_BLOCK_SIZE)
+        buffer_count = DEFAULT_BUFFER_COUNT
+        reason = "disque mécanique : grands tampons séquentiels"
+    else:
+        block_size = max(block_size, SSD_MIN_BLOCK_SIZE)
+        buffer_count = SSD_BUFFER_COUNT
+        reason = "supports électroniques : davantage de tampons en vol"
+    block_size = (block_size + alignment - 1) // alignment * alignment
+    calibration = None
+    if calibrate and limits[source] is not None:
+        try:
+            calibration = calibrate_read(source, tuple(sorted(set(CALIBRATION_SIZES) | {block_size})))
+        except OSError as e:
+            reason += f", calibrage impossible ({e})"
+        if calibration:
+            best = max(calibration, key=calibration.get)
+            # La mesure est courte : l'heuristique n'est remplacée que par un gain net.
+            if calibration[best] > calibration.get(block_size, 0.0) * (1 + CALIBRATION_MARGIN):
+                block_size = (best + alignment - 1) // alignment * alignment
+                reason += f", bloc de {format_bytes(block_size)} retenu par calibrage ({format_bytes(calibration[best])}/s)"
+    buffer_count = max(2, min(buffer_count, MAX_BUFFER_MEMORY // block_size))
+    return {"block_size": block_size, "buffer_count": buffer_count, "reason": reason, "limits": limits,
+            "calibration": calibration}
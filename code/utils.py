@@ -2,6 +2,8 @@ import subprocess
 import sys
 import re
 import time
+import threading
+from typing import Optional
 from log_handler import log_error, log_info, log_warning
 from pathlib import Path
 
@@ -26,11 +28,28 @@ def run_command(command_list: list[str], raise_on_error: bool = True) -> str:
         print("\nOpération interrompue par l’utilisateur (Ctrl+C)")
         sys.exit(130)
 
-def run_command_with_progress(command_list: list[str], progress_callback=None, stop_flag=None) -> str:
-    """Exécute une commande avec suivi de la progression et possibilité d'annulation"""
+def run_command_with_progress(command_list: list[str], progress_callback=None, stop_flag=None, output_callback=None) -> str:
+    """Exécute une commande avec suivi de la progression et possibilité d'annulation.
+    Si `output_callback` est fourni, chaque ligne de la sortie d'erreur (séparée par \\r ou \\n) lui est transmise au fil de l'eau."""
     try:
         process = subprocess.Popen(command_list, stdout=subprocess.PIPE,
                                    stderr=subprocess.PIPE, text=True)
+        stderr_lines = []
+        def read_stderr():
+            line = ""
+            for char in iter(lambda: process.stderr.read(1), ""):
+                if char in "\r\n":
+                    if line:
+                        stderr_lines.append(line)
+                        if output_callback:
+                            output_callback(line)
+                    line = ""
+                else:
+                    line += char
+            if line:
+                stderr_lines.append(line)
+        stderr_thread = threading.Thread(target=read_stderr, daemon=True)
+        stderr_thread.start()
         while process.poll() is None:
             if stop_flag and stop_flag():
                 process.terminate()
@@ -39,7 +58,9 @@ def run_command_with_progress(command_list: list[str], progress_callback=None, s
             if progress_callback:
                 progress_callback()
             time.sleep(1)
-        stdout, stderr = process.communicate()
+        stdout = process.stdout.read()
+        stderr_thread.join()
+        stderr = "\n".join(stderr_lines[-20:])
         if process.returncode != 0:
             raise subprocess.CalledProcessError(process.returncode, command_list, stdout, stderr)
         return stdout.strip()
@@ -55,6 +76,11 @@ def run_command_with_progress(command_list: list[str], progress_callback=None, s
         log_error("Opération interrompue par l’utilisateur")
         raise
 
+def parse_dd_progress(line: str) -> Optional[int]:
+    """Extrait le nombre d'octets copiés d'une ligne `status=progress` de dd."""
+    match = re.match(r'\s*(\d+) (?:bytes|octets)', line)
+    return int(match.group(1)) if match else None
+
 def get_disk_list() -> list[dict]:
     """Retourne une liste des disques disponibles sous forme de dictionnaire."""
     try:
@@ -0,0 +1,320 @@
+import os
+import sys
+import mmap
+import time
+import bisect
+import random
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from log_handler import log_info, log_warning
+from copy_engine import ALIGNMENT, DEFAULT_BLOCK_SIZE, DEFAULT_QUEUE_DEPTH, IO_BACKENDS, align_ranges, align_up, get_device_size, make_io, merge_ranges, open_device
+from partitions import read_partition_table
+from progress import format_bytes
+from hashing import HASH_METHODS, chunk_digest, method_digest
+from io_limits import RateLimiter
+from metrics import JobMetrics
+
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+DEFAULT_RANGE_SIZE = 256 * 1024 * 1024
+VERIFY_METHODS = ("compare",) + HASH_METHODS
+DEFAULT_SAMPLES = 1000
+SAMPLE_SIZE = 1024 * 1024
+EDGE_SIZE = 1024 * 1024
+CONFIDENCE = 0.95
+
+def drop_page_cache(fd: int) -> None:
+    """Évince le cache de pages d'un descripteur pour que la relecture atteigne réellement le support."""
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError as e:
+        log_warning(f"Impossible de vider le cache de pages : {e}")
+
+def open_for_verify(path: str) -> int:
+    fd, direct = open_device(path, os.O_RDONLY, True)
+    if not direct:
+        drop_page_cache(fd)
+    return fd
+
+def split_ranges(ranges: list[tuple[int, int]], range_size: int) -> list[tuple[int, int]]:
+    """Découpe des plages en tranches d'au plus `range_size` octets, réparties ensuite entre les threads."""
+    pieces = []
+    for offset, length in ranges:
+        end = offset + length
+        while offset < end:
+            n = min(range_size, end - offset)
+            pieces.append((offset, n))
+            offset += n
+    return pieces
+
+class _Progress:
+    def __init__(self, total: int, callback: Optional[Callable[[int, int], None]]) -> None:
+        self.total = total
+        self.done = 0
+        self.callback = callback
+        self.lock = threading.Lock()
+
+    def add(self, n: int) -> None:
+        with self.lock:
+            self.done += n
+            done = self.done
+        if self.callback:
+            self.callback(done, self.total)
+
+def _thread_buffers(local: threading.local, count: int, size: int) -> list:
+    buffers = getattr(local, "buffers", None)
+    if buffers is None:
+        buffers = [memoryview(mmap.mmap(-1, size)) for _ in range(count)]
+        local.buffers = buffers
+    return buffers
+
+def verify_digests(dest: str, digests: list[tuple[int, int, bytes]], workers: int = DEFAULT_WORKERS,
+                   progress_callback: Optional[Callable[[int, int], None]] = None,
+                   stop_flag: Optional[Callable[[], bool]] = None, io_backend: str = "sync",
+                   queue_depth: int = DEFAULT_QUEUE_DEPTH, limiter: Optional[RateLimiter] = None,
+                   metrics: Optional[JobMetrics] = None) -> dict:
+    """Relit la destination en contournant le cache et compare chaque bloc à l'empreinte calculée pendant la copie.
+    Avec `io_backend="deep"`, les lectures des threads partagent une file de `queue_depth` requêtes en vol ;
+    `limiter` plafonne le débit des relectures, `metrics` reçoit leurs mesures en phase "verify"."""
+    total = sum(length for _, length, _ in digests)
+    largest = align_up(max((length for _, length, _ in digests), default=ALIGNMENT))
+    progress = _Progress(total, progress_callback)
+    local = threading.local()
+    io = make_io(io_backend, queue_depth, limiter, stop_flag, metrics, "verify")
+    fd = open_for_verify(dest)
+
+    def check(item: tuple[int, int, bytes]) -> Optional[tuple[int, int]]:
+        offset, length, digest = item
+        if stop_flag and stop_flag():
+            raise KeyboardInterrupt("Opération annulée par l’utilisateur")
+        buffer = _thread_buffers(local, 1, largest)[0]
+        n = min(io.read(fd, buffer[:align_up(length)], offset), length)
+        progress.add(length)
+        start = time.perf_counter()
+        same = n == length and chunk_digest(buffer[:length]) == digest
+        if metrics is not None:
+            metrics.add_stage("verify", "hash", time.perf_counter() - start)
+            metrics.add_bytes("verify", n)
+        return None if same else (offset, length)
+
+    start = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            mismatches = [m for m in executor.map(check, digests) if m is not None]
+    finally:
+        io.close()
+        os.close(fd)
+    duration = time.monotonic() - start
+    log_info(f"Vérification par empreintes de {dest} : {progress.done} octets relus, "
+             f"{len(mismatches)} bloc(s) différent(s)")
+    return {"checked": progress.done, "mismatches": mismatches, "duration": duration}
+
+def parallel_verify(source: str, dest: str, workers: int = DEFAULT_WORKERS,
+                    ranges: Optional[list[tuple[int, int]]] = None, method: str = "compare",
+                    range_size: int = DEFAULT_RANGE_SIZE, block_size: int = DEFAULT_BLOCK_SIZE,
+                    progress_callback: Optional[Callable[[int, int], None]] = None,
+                    stop_flag: Optional[Callable[[], bool]] = None, io_backend: str = "sync",
+                    queue_depth: int = DEFAULT_QUEUE_DEPTH, limiter: Optional[RateLimiter] = None,
+                    metrics: Optional[JobMetrics] = None) -> dict:
+    """Compare deux périphériques par tranches réparties sur plusieurs threads.
+    `method` vaut "compare" (comparaison directe des tampons), "blake2b" ou "xxhash" (empreintes par bloc) ;
+    `io_backend` vaut "sync" ou "deep" (file de `queue_depth` requêtes en vol par périphérique) ;
+    `limiter` plafonne le débit cumulé des lectures des deux périphériques ; `metrics` reçoit les mesures en phase
+    "verify"."""
+    if method not in VERIFY_METHODS:
+        raise ValueError(f"Méthode de vérification inconnue : {method}")
+    if ranges is None:
+        ranges = [(0, get_device_size(source))]
+    pieces = split_ranges(ranges, range_size)
+    progress = _Progress(sum(length for _, length in pieces), progress_callback)
+    local = threading.local()
+    src_fd = open_for_verify(source)
+    try:
+        dst_fd = open_for_verify(dest)
+    except OSError:
+        os.close(src_fd)
+        raise
+    src_io = make_io(io_backend, queue_depth, limiter, stop_flag, metrics, "verify")
+    dst_io = make_io(io_backend, queue_depth, limiter, stop_flag, metrics, "verify")
+
+    def check(piece: tuple[int, int]) -> dict:
+        offset, length = piece
+        src_buf, dst_buf = _thread_buffers(local, 2, block_size)
+        bad_chunks = []
+        short = False
+        position = offset
+        end = offset + length
+        while position < end:
+            if stop_flag and stop_flag():
+                raise KeyboardInterrupt("Opération annulée par l’utilisateur")
+            n = min(block_size, end - position)
+            read_len = align_up(n)
+            src_n = min(src_io.read(src_fd, src_buf[:read_len], position), n)
+            dst_n = min(dst_io.read(dst_fd, dst_buf[:read_len], position), n)
+            if src_n != n or dst_n != n:
+                short = True
+            compare_start = time.perf_counter()
+            if method == "compare":
+                same = src_buf[:src_n].tobytes() == dst_buf[:dst_n].tobytes()
+            else:
+                same = method_digest(method, src_buf[:src_n]) == method_digest(method, dst_buf[:dst_n])
+            if metrics is not None:
+                metrics.add_stage("verify", "hash", time.perf_counter() - compare_start)
+                metrics.add_bytes("verify", n)
+            if not same:
+                bad_chunks.append(position)
+            progress.add(n)
+            position += n
+        return {"offset": offset, "length": length,
+                "status": "mismatch" if bad_chunks or short else "ok",
+                "mismatched_chunks": bad_chunks, "truncated": short}
+
+    start = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = list(executor.map(check, pieces))
+    finally:
+        src_io.close()
+        dst_io.close()
+        os.close(src_fd)
+        os.close(dst_fd)
+    duration = time.monotonic() - start
+    mismatches = [r for r in results if r["status"] != "ok"]
+    log_info(f"Vérification parallèle {source} / {dest} ({method}, {workers} thread(s), E/S {io_backend}) : "
+             f"{progress.done} octets comparés en {duration:.1f} s, {len(mismatches)} tranche(s) différente(s)")
+    return {"checked": progress.done, "duration": duration, "method": method, "workers": workers,
+            "ranges": results, "mismatches": mismatches}
+
+def fixed_regions(path: str, size: int) -> list[tuple[int, int]]:
+    """Zones toujours relues par un échantillonnage : premier et dernier Mio, table de partitions (GPT primaire et
+    de secours, MBR et chaîne d'EBR)."""
+    regions = [(0, min(EDGE_SIZE, size)), (max(0, size - EDGE_SIZE), min(EDGE_SIZE, size))]
+    try:
+        table = read_partition_table(path)
+    except OSError as e:
+        log_warning(f"Table de partitions de {path} illisible, seules les extrémités seront relues : {e}")
+        table = None
+    if table is not None:
+        regions.extend(table['table_ranges'])
+    return regions
+
+def _intersect(regions: list[tuple[int, int]], ranges: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    result = []
+    for offset, length in regions:
+        for start, span in ranges:
+            low, high = max(offset, start), min(offset + length, start + span)
+            if low < high:
+                result.append((low, high - low))
+    return result
+
+def pick_samples(ranges: list[tuple[int, int]], count: int, sample_size: int,
+                 rng: random.Random) -> tuple[list[tuple[int, int]], int]:
+    """Tire sans remise `count` tranches de `sample_size` octets parmi celles qui pavent `ranges` ; retourne les
+    tranches et leur nombre total. Les index sont tirés sans construire la liste des tranches d'un grand disque."""
+    ranges = merge_ranges(ranges)
+    firsts = []
+    population = 0
+    for _, length in ranges:
+        firsts.append(population)
+        population += -(-length // sample_size)
+    samples = []
+    for index in sorted(rng.sample(range(population), min(count, population))):
+        which = bisect.bisect_right(firsts, index) - 1
+        offset, length = ranges[which]
+        start = offset + (index - firsts[which]) * sample_size
+        samples.append((start, min(sample_size, offset + length - start)))
+    return samples, population
+
+def sampling_confidence(sampled: int, population: int, confidence: float = CONFIDENCE) -> float:
+    """Proportion de tranches différentes qu'un tirage sans écart laisse passer au plus, avec la confiance donnée :
+    une proportion f échappe à `sampled` tirages avec une probabilité d'au plus (1 - f) ** sampled."""
+    if sampled >= population:
+        return 0.0
+    if sampled <= 0:
+        return 1.0
+    return 1 - (1 - confidence) ** (1 / sampled)
+
+def sample_verify(source: str, dest: str, samples: int = DEFAULT_SAMPLES, sample_size: int = SAMPLE_SIZE,
+                  ranges: Optional[list[tuple[int, int]]] = None, seed: Optional[int] = None, **options) -> dict:
+    """Vérification statistique : compare source et destination sur `samples` tranches tirées au hasard dans
+    `ranges` (tout le disque par défaut), plus les zones de fixed_regions qui s'y trouvent. Les autres options sont
+    celles de parallel_verify. Le rapport de parallel_verify est complété par la couverture, la proportion de
+    tranches différentes qui aurait pu échapper au tirage (`undetected`, avec une confiance de `confidence`) et la
+    graine, qui permet de rejouer le même tirage."""
+    size = get_device_size(source)
+    if ranges is None:
+        ranges = [(0, size)]
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 32)
+    chosen, population = pick_samples(ranges, samples, sample_size, random.Random(seed))
+    # Les plages relues restent alignées pour les lectures directes (les EBR sont sur des secteurs de 512 octets).
+    checked = align_ranges(chosen + _intersect(fixed_regions(source, size), ranges), size)
+    total = sum(length for _, length in merge_ranges(ranges))
+    report = parallel_verify(source, dest, ranges=checked, range_size=sample_size, **options)
+    undetected = sampling_confidence(len(chosen), population)
+    report.update(samples=len(chosen), population=population, seed=seed, confidence=CONFIDENCE,
+                  coverage=report['checked'] / total if total else 1.0, undetected=undetected)
+    log_info(f"Échantillonnage {source} / {dest} : {describe_sampling(report)}")
+    return report
+
+def sample_digests(digests: list[tuple[int, int, bytes]], samples: int = DEFAULT_SAMPLES,
+                   seed: Optional[int] = None,
+                   fixed: Optional[list[tuple[int, int]]] = None) -> tuple[list[tuple[int, int, bytes]], int]:
+    """Tirage d'empreintes pour verify_digests : `samples` blocs au hasard, plus le premier, le dernier et tous ceux
+    qui recouvrent les zones `fixed` (voir fixed_regions : tables de partitions, EBR compris), comme sample_verify.
+    Retourne les blocs retenus et la graine."""
+    if seed is None:
+        seed = random.SystemRandom().randrange(2 ** 32)
+    ordered = sorted(digests)
+    chosen = set(random.Random(seed).sample(range(len(ordered)), min(samples, len(ordered))))
+    chosen |= {0, len(ordered) - 1} if ordered else set()
+    offsets = [offset for offset, _, _ in ordered]
+    for start, length in fixed or []:
+        index = max(0, bisect.bisect_right(offsets, start) - 1)
+        while index < len(ordered) and ordered[index][0] < start + length:
+            if ordered[index][0] + ordered[index][1] > start:
+                chosen.add(index)
+            index += 1
+    return [ordered[index] for index in sorted(chosen)], seed
+
+def describe_sampling(report: dict) -> str:
+    text = (f"{report['samples']} tranche(s) tirée(s) sur {report['population']}, {format_bytes(report['checked'])} relus "
+            f"(couverture {report['coverage'] * 100:.2f} %)")
+    if not report['undetected']:
+        return f"{text} : vérification exhaustive"
+    return (f"{text} : avec une confiance de {report['confidence'] * 100:.0f} %, moins de "
+            f"{report['undetected'] * 100:.2g} % des tranches diffèrent (graine {report['seed']})")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vérification parallèle de deux disques ou images")
+    parser.add_argument("source")
+    parser.add_argument("dest")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--method", choices=VERIFY_METHODS, default="compare")
+    parser.add_argument("--io", choices=IO_BACKENDS, default="sync", help="moteur d’E/S (deep : file profonde)")
+    parser.add_argument("--queue-depth", type=int, default=DEFAULT_QUEUE_DEPTH)
+    parser.add_argument("--max-rate", type=float, default=0, help="débit de lecture maximal en Mo/s (0 : illimité)")
+    parser.add_argument("--range-size", type=int, default=DEFAULT_RANGE_SIZE // (1024 * 1024),
+                        help="taille des tranches en Mio")
+    parser.add_argument("--samples", type=int, default=0,
+                        help="vérification par échantillonnage : nombre de tranches de 1 Mio tirées (0 : tout comparer)")
+    parser.add_argument("--seed", type=int, help="graine du tirage, pour rejouer un échantillonnage")
+    args = parser.parse_args()
+    options = {"workers": args.workers, "method": args.method, "io_backend": args.io, "queue_depth": args.queue_depth,
+               "limiter": RateLimiter(args.max_rate) if args.max_rate > 0 else None}
+    if args.samples > 0:
+        report = sample_verify(args.source, args.dest, samples=args.samples, seed=args.seed, **options)
+        print(describe_sampling(report))
+    else:
+        report = parallel_verify(args.source, args.dest, range_size=args.range_size * 1024 * 1024, **options)
+    for result in report["mismatches"]:
+        print(f"Tranche différente : offset {result['offset']}, {result['length']} octets, "
+              f"blocs {result['mismatched_chunks'][:10]}")
+    print(f"{report['checked']} octets comparés en {report['duration']:.1f} s : "
+          f"{'IDENTIQUES' if not report['mismatches'] else 'DIFFÉRENTS'}")
+    sys.exit(1 if report["mismatches"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+import mmap
+import errno
+import ctypes
+import ctypes.util
+from typing import Optional
+
+from log_handler import log_info, log_warning
+
+ZERO_GRANULARITY = 1024 * 1024
+ZERO_PROBE = 64
+FALLOC_FL_KEEP_SIZE = 0x01
+FALLOC_FL_PUNCH_HOLE = 0x02
+
+_ZERO_BLOCK = bytes(ZERO_GRANULARITY)
+_ZERO_ALIGNED = memoryview(mmap.mmap(-1, ZERO_GRANULARITY))
+_libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+_libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+
+def is_zero(view: memoryview) -> bool:
+    """Indique si un tampon ne contient que des zéros (rejet rapide sur les premiers octets, puis memcmp)."""
+    n = len(view)
+    probe = min(ZERO_PROBE, n)
+    if view[:probe].tobytes() != _ZERO_BLOCK[:probe] or view[n - probe:].tobytes() != _ZERO_BLOCK[:probe]:
+        return False
+    if n == ZERO_GRANULARITY:
+        return view.tobytes() == _ZERO_BLOCK
+    return view.tobytes() == bytes(n)
+
+def zero_segments(view: memoryview, granularity: int = ZERO_GRANULARITY) -> list[tuple[int, int, bool]]:
+    """Découpe un tampon en segments (début, longueur, nul) fusionnés, testés par tranches de `granularity`."""
+    segments: list[list] = []
+    for start in range(0, len(view), granularity):
+        end = min(start + granularity, len(view))
+        zero = is_zero(view[start:end])
+        if segments and segments[-1][2] == zero:
+            segments[-1][1] += end - start
+        else:
+            segments.append([start, end - start, zero])
+    return [(start, length, zero) for start, length, zero in segments]
+
+def punch_hole(fd: int, offset: int, length: int) -> bool:
+    """Libère une plage en garantissant la relecture de zéros (discard sur SSD, trou sur fichier).
+    Retourne False si le périphérique ne le permet pas."""
+    if _libc.fallocate(fd, FALLOC_FL_PUNCH_HOLE | FALLOC_FL_KEEP_SIZE, offset, length) == 0:
+        return True
+    err = ctypes.get_errno()
+    if err in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENODEV):
+        return False
+    raise OSError(err, os.strerror(err))
+
+class ZeroWriter:
+    """Remplace l'écriture des plages nulles par des discards regroupés, avec repli sur l'écriture de zéros."""
+
+    def __init__(self, fd: int, device: str) -> None:
+        self.fd = fd
+        self.device = device
+        self.trimmed = False
+        self.punch_supported = True
+        self.bytes_skipped = 0
+        self._pending: Optional[list[int]] = None
+
+    def discard_all(self, length: int) -> None:
+        """Tente un discard unique de toute la zone à copier ; les blocs nuls n'auront alors plus besoin d'être traités."""
+        try:
+            self.trimmed = punch_hole(self.fd, 0, length)
+        except OSError as e:
+            log_warning(f"Discard global impossible sur {self.device} : {e}")
+            self.trimmed = False
+        if self.trimmed:
+            log_info(f"Discard global de {length} octets effectué sur {self.device}")
+        else:
+            log_info(f"Discard global non supporté par {self.device}, discard plage par plage")
+
+    def zero(self, offset: int, length: int) -> None:
+        self.bytes_skipped += length
+        if self.trimmed:
+            return
+        if self._pending and self._pending[0] + self._pending[1] == offset:
+            self._pending[1] += length
+            return
+        self.flush()
+        self._pending = [offset, length]
+
+    def flush(self) -> None:
+        if not self._pending:
+            return
+        offset, length = self._pending
+        self._pending = None
+        if self.punch_supported:
+            if punch_hole(self.fd, offset, length):
+                return
+            self.punch_supported = False
+            log_warning(f"Discard non supporté par {self.device}, écriture explicite des zéros")
+        end = offset + length
+        while offset < end:
+            n = min(ZERO_GRANULARITY, end - offset)
+            written = os.pwritev(self.fd, [_ZERO_ALIGNED[:n]], offset)
+            if written == 0:
+                raise IOError(f"Écriture impossible à l’offset {offset}")
+            offset += written
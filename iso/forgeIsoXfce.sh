@@ -102,6 +102,9 @@ chmod +x config/includes.chroot/usr/local/bin/*
 # Create symbolic link 'de' -> main.py
 ln -s /usr/local/bin/main.py config/includes.chroot/usr/local/bin/de
 
+# Create symbolic link 'cloneurleger' -> main.py (headless mode: cloneurleger list / cloneurleger run job.json)
+ln -s /usr/local/bin/main.py config/includes.chroot/usr/local/bin/cloneurleger
+
 # Allow sudo without password
 echo "Configuring sudo to be passwordless..."
 mkdir -p config/includes.chroot/etc/sudoers.d/
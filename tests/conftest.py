@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Les modules de l'application sont à plat dans code/, sans paquet.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code"))
@@ -0,0 +1,63 @@
+import struct
+
+from partitions import read_partition_table, write_partition_table
+
+SECTOR = 512
+DISK_SECTORS = 131072
+EXT_START = 12288
+
+def _entry(part_type: int, start: int, size: int) -> bytes:
+    return bytes([0, 0, 0, 0, part_type, 0, 0, 0]) + struct.pack("<II", start, size)
+
+def _sector(entries: dict[int, bytes]) -> bytes:
+    sector = bytearray(SECTOR)
+    for slot, entry in entries.items():
+        sector[446 + slot * 16:446 + (slot + 1) * 16] = entry
+    sector[510:512] = b"\x55\xaa"
+    return bytes(sector)
+
+def _make_disk(path) -> None:
+    """Slot 1 vide, primaire en slot 2, étendue en slot 3 avec les logiques 5, 6 et 7 (un EBR tous les 8192 secteurs)."""
+    with open(path, "wb") as f:
+        f.truncate(DISK_SECTORS * SECTOR)
+        f.write(_sector({1: _entry(0x83, 2048, 8192), 2: _entry(0x05, EXT_START, 3 * 8192)}))
+        for index in range(3):
+            ebr = EXT_START + index * 8192
+            entries = {0: _entry(0x83, 2048, 4096)}
+            if index < 2:
+                entries[1] = _entry(0x05, (index + 1) * 8192, 8192)
+            f.seek(ebr * SECTOR)
+            f.write(_sector(entries))
+
+def _extended(path) -> tuple[int, int]:
+    with open(path, "rb") as f:
+        return struct.unpack_from("<II", f.read(SECTOR), 446 + 2 * 16 + 8)
+
+def test_primary_numbered_by_slot(tmp_path):
+    source = tmp_path / "source.img"
+    _make_disk(source)
+    numbers = [(part["number"], part["start"] // SECTOR) for part in read_partition_table(str(source))["partitions"]]
+    assert numbers == [(2, 2048), (5, EXT_START + 2048), (6, EXT_START + 8192 + 2048), (7, EXT_START + 16384 + 2048)]
+
+def test_unselected_logicals_unlinked(tmp_path):
+    source, dest = tmp_path / "source.img", tmp_path / "dest.img"
+    _make_disk(source)
+    with open(dest, "wb") as f:
+        f.truncate(DISK_SECTORS * SECTOR)
+    report = write_partition_table(str(source), str(dest), [6])
+    assert report["numbering"] == {6: 5}
+    assert _extended(dest) == (EXT_START + 8192, 2048 + 4096)
+    partitions = read_partition_table(str(dest))["partitions"]
+    assert [(part["number"], part["start"] // SECTOR) for part in partitions] == [(5, EXT_START + 8192 + 2048)]
+
+def test_kept_logicals_relinked(tmp_path):
+    source, dest = tmp_path / "source.img", tmp_path / "dest.img"
+    _make_disk(source)
+    with open(dest, "wb") as f:
+        f.truncate(DISK_SECTORS * SECTOR)
+    report = write_partition_table(str(source), str(dest), [2, 5, 7])
+    assert report["numbering"] == {2: 2, 5: 5, 7: 6}
+    assert _extended(dest) == (EXT_START, 16384 + 2048 + 4096)
+    partitions = read_partition_table(str(dest))["partitions"]
+    assert [(part["number"], part["start"] // SECTOR) for part in partitions] == [
+        (2, 2048), (5, EXT_START + 2048), (6, EXT_START + 16384 + 2048)]
@@ -0,0 +1,33 @@
+import struct
+
+from verify_engine import fixed_regions, sample_digests
+
+SECTOR = 512
+BLOCK = 1024 * 1024
+DISK_SIZE = 64 * BLOCK
+EBR_LBA = 40000
+
+def _sector(entries: dict[int, tuple[int, int, int]]) -> bytes:
+    sector = bytearray(SECTOR)
+    for slot, (part_type, start, size) in entries.items():
+        sector[446 + slot * 16 + 4] = part_type
+        struct.pack_into("<II", sector, 446 + slot * 16 + 8, start, size)
+    sector[510:512] = b"\x55\xaa"
+    return bytes(sector)
+
+def test_ebr_block_always_sampled(tmp_path):
+    disk = tmp_path / "disk.img"
+    with open(disk, "wb") as f:
+        f.truncate(DISK_SIZE)
+        f.write(_sector({0: (0x05, EBR_LBA, 40000)}))
+        f.seek(EBR_LBA * SECTOR)
+        f.write(_sector({0: (0x83, 2048, 4096)}))
+    fixed = fixed_regions(str(disk), DISK_SIZE)
+    assert (EBR_LBA * SECTOR, SECTOR) in fixed
+    digests = [(offset, BLOCK, bytes(16)) for offset in range(0, DISK_SIZE, BLOCK)]
+    ebr_block = EBR_LBA * SECTOR // BLOCK * BLOCK
+    for seed in range(50):
+        chosen, _ = sample_digests(digests, samples=1, seed=seed, fixed=fixed)
+        offsets = {offset for offset, _, _ in chosen}
+        assert {0, ebr_block, DISK_SIZE - BLOCK} <= offsets
+        assert len(offsets) <= 4